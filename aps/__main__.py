@@ -19,6 +19,13 @@ def update_db():
         loaders.load_masters(dbase, app.folder('MASTER_DIR'))
 
 
+# Rebuild index of stored spool files
+def index_stored_spool():
+    root = app.folder('STORED_SPOOL') or str(Path().home())
+    if loaders.load_stored_spool(app.get_dbase(), root, rebuild=True):
+        print(f'Index of stored spool files in {root} rebuilt')
+
+
 def make_config(args):
     config = Config(args.ac_code, args.path)
     config.exec()
@@ -41,6 +48,8 @@ def main():
     group.add_argument('-V', '--version', help='display version', action='store_true', required=False)
     group.add_argument('-m', '--make_config', help='make config file', action='store_true', required=False)
     group.add_argument('-u', '--update_db', help='update database', action='store_true', required=False)
+    group.add_argument('-i', '--index_spool', help='rebuild index of stored spool files', action='store_true',
+                       required=False)
 
     args, _ = parser.parse_known_args()
     if args.version:
@@ -57,6 +66,12 @@ def main():
         parser.add_argument('-c', '--config', help='config file', required=False)
         test_init(parser.parse_args())
         update_db()
+    elif args.index_spool:
+        parser = argparse.ArgumentParser(description='Rebuild index of stored spool files')
+        parser.add_argument('-i', '--index_spool', action='store_true', required=True)
+        parser.add_argument('-c', '--config', help='config file', required=False)
+        test_init(parser.parse_args())
+        index_stored_spool()
     else:
         parser = argparse.ArgumentParser(description='APS application')
         parser.add_argument('-c', '--config', help='config file', required=False)
@@ -68,6 +83,10 @@ def main():
         parser.add_argument('-S', '--submit', help='procedure to execute in batch mode', nargs='+', required=False)
         parser.add_argument('-editor', help='toggle editor view', action='store_true', required=False)
         parser.add_argument('-notes', help='toggle correlator note usage', action='store_true', required=False)
+        parser.add_argument('--max-obs-chunk', help='maximum number of observations read at once from vgosDB',
+                            type=int, default=None, required=False)
+        parser.add_argument('--no-spool-cache', help='do not use cache of decoded spool files', action='store_true',
+                            required=False)
         parser.add_argument('param', help='initials or session or db_name', default='', nargs='?')
 
         args = test_init(parser.parse_args())
@@ -23,7 +23,7 @@ from aps.aps.submit import submit_files
 from aps.vgosdb import VGOSdb
 from aps.vgosdb.nusolve import get_nuSolve_info
 from aps.vgosdb.correlator import CorrelatorReport
-from aps.schedule import get_schedule
+from aps.schedule import get_schedule, schedule_changed
 
 
 logger = logging.getLogger()
@@ -280,6 +280,11 @@ class APS:
             schedule = None
         else:
             schedule.stations['removed'] = self.session.removed
+            try:
+                if schedule_changed(self.session, schedule):
+                    logger.info(f'new schedule {os.path.basename(schedule.path)} {schedule.fingerprint.hex()}')
+            except Exception as err:
+                logger.warning(f'could not store schedule fingerprint. {str(err)}')
 
         self.vgosdb.statistics()
 
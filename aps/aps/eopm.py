@@ -4,9 +4,9 @@ import math
 from pathlib import Path
 
 from aps.utils import app, to_float
-from aps.utils.files import remove
+from aps.utils.files import remove, find_file
 from aps.aps import solve
-from aps.aps.spool import read_spool
+from aps.aps.spool import read_spool, EOB_FIELDS
 from aps.aps.eop import EOP
 from aps.aps.eob import eob_to_eops
 
@@ -32,7 +32,7 @@ class EOPM(EOP):
 
     # Get baseline and station lists
     def get_baselines(self, session, vgosdb):
-        if not (spl := session.file_path('spl')).exists():
+        if not (spl := find_file(session.file_path('spl'))).exists():
             self.add_error(f'Could not find {spl.name}')
             return [], []
         if not (spool := read_spool(path=spl, db_name=vgosdb.name)):
@@ -95,7 +95,7 @@ class EOPM(EOP):
             return False, None
 
         # Read spool file
-        if not (spool := read_spool(initials=self.initials, db_name=vgosdb.name)):
+        if not (spool := read_spool(initials=self.initials, db_name=vgosdb.name, fields=EOB_FIELDS)):
             self.add_error(f'Error reading spool file SPLF{self.initials}')
             return False, None
         # Replace RMS for UT1 values if vgos session:
@@ -1,6 +1,6 @@
 import traceback
 
-from aps.aps.spool import read_spool
+from aps.aps.spool import read_spool, EOB_FIELDS
 from aps.aps.eop import EOP
 from aps.aps.eob import eob_to_eops
 from aps.aps import solve
@@ -42,7 +42,7 @@ class EOPS(EOP):
                 return False
 
             # Read spool file
-            if not (spool := read_spool(initials=self.initials, db_name=vgosdb.name)):
+            if not (spool := read_spool(initials=self.initials, db_name=vgosdb.name, fields=EOB_FIELDS)):
                 self.add_error(f'Error reading spool file SPLF{self.initials}')
                 return False
             # Update EOPB_XY_FILE and EOPB_FILE
@@ -1,4 +1,3 @@
-from datetime import timedelta
 from io import StringIO
 from collections import defaultdict
 
@@ -247,47 +246,16 @@ class INTreport(STDreport):
         super().__init__()
         self.correlated_sources = defaultdict(lambda:0)
 
-    def is_corr(self, start, stop, time_list):
-        for t in time_list:
-            if start <= t <= stop:
-                return True
-        return False
-
     def get_correlated_data(self, sched, vgosdb):
         if not sched:
             return []
 
-        # Make a dictionary of scans using baseline-source as Key
-        corr = defaultdict(list)
-        for index, bl, src, utc, qc_x, qc_s, fc_x, fc_s, flg in vgosdb.get_all_obs():
-            # Store time of each scan
-            key = f'{bl[0]}:{bl[1]}:{src}'
-            corr[key].append(utc)
-            # Store number of correlated scans for each source
-            self.correlated_sources[src] += 1
-
-        removed = set(sched.missed) | set(vgosdb.deselected_st)
-        not_corr = []
+        # Store number of correlated scans for each source
+        for name, nbr in vgosdb.get_source_statistics().items():
+            self.correlated_sources[name] += nbr
         # Extract list of uncorrelated scans.
-        for index, obs in enumerate(sched.obs_list):
-            fr = obs['fr']
-            fr_name = sched.stations['codes'][fr]['name']
-            if fr_name not in vgosdb.station_list or fr_name in removed:
-                continue
-            to = obs['to']
-            to_name = sched.stations['codes'][to]['name']
-            if to_name not in vgosdb.station_list or to_name in removed:
-                continue
-
-            scan = obs['scan']
-            duration = min(scan['station_codes'][fr]['duration'], scan['station_codes'][to]['duration'])
-            start = scan['start']
-            stop = start + timedelta(seconds=duration)
-            if (key := f'{fr_name}:{to_name}:{obs["scan"]["source"]}') not in corr:
-                key = f'{to_name}:{fr_name}:{obs["scan"]["source"]}'
-            if key not in corr or not self.is_corr(start, stop, corr[key]):
-                not_corr.append(f'{obs["scan"]["source"]:8s} at {start.strftime("%H:%M:%S")}')
-        return not_corr
+        return [f'{obs["scan"]["source"]:8s} at {obs["scan"]["start"].strftime("%H:%M:%S")}'
+                for obs in vgosdb.get_not_correlated(sched)]
 
     def write_comments(self, title, comments, in_line=None, sched=None, vgosdb=None, spool=None):
         write_empty = not title.startswith('Parameterization')
@@ -346,23 +314,21 @@ class INTreport(STDreport):
         stats = run.stats['session']
         recovered = self.get_total_recoverable(sched, vgosdb, spool)
         sta_clk, sta_atm, clk_brk, sta_coord, bl_clk = defaultdict(list), [], defaultdict(list), defaultdict(list), []
-        for info in run.parameters:
-            if 'fr' in info.groupdict():
-                bl_clk.append(f'{info["fr"].strip()} {info["to"].strip()}')
-            else:
-                code = info['code']
-                sta = info['sta'].strip()
-                if code == 'AT':
-                    sta_atm.append(sta)
-                elif code == 'CL':
-                    if (index := info['id']) not in sta_clk[sta]:
-                        sta_clk[sta].append(index)
-                    elif sta not in clk_brk:
-                        clk_brk[sta].append(f'{info["time"].split()[-1]} UT at {sta}')
-                elif code == 'BR' and info['id'] == '0':
-                    clk_brk[sta].append(f'{info["time"].split()[-1]} UT at {sta}')
-                elif code in 'XYZ':
-                    sta_coord[sta].append(code)
+        for param in run.parameters:
+            sta, code = param.station, param.code
+            if code == 'BL':
+                bl_clk.append(f'{sta} {param.remote}')
+            elif code == 'AT':
+                sta_atm.append(sta)
+            elif code == 'CL':
+                if param.id not in sta_clk[sta]:
+                    sta_clk[sta].append(param.id)
+                elif sta not in clk_brk:
+                    clk_brk[sta].append(f'{param.epoch.split()[-1]} UT at {sta}')
+            elif code == 'BR' and param.id == 0:
+                clk_brk[sta].append(f'{param.epoch.split()[-1]} UT at {sta}')
+            elif code in 'XYZ':
+                sta_coord[sta].append(code)
 
         nbr_parameters = len(run.parameters) + 1  # UT1
         scheduled = str(sched.scheduled_obs) if sched else '?'*len(str(vgosdb.correlated))
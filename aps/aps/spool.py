@@ -1,24 +1,257 @@
 import re
 import os
+import io
+import mmap
+import pickle
+import hashlib
 from pathlib import Path
-import glob
-from collections import OrderedDict
+from contextlib import contextmanager
+from sys import intern
+from array import array
+from collections import OrderedDict, namedtuple
+from itertools import dropwhile, takewhile
+from collections.abc import Sequence, Mapping
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 
 from aps.utils import app, to_float, to_int
-from aps.utils.files import TEXTfile
+from aps.ivsdb import loaders
+from aps.utils.files import TEXTfile, is_compressed, open_binary, open_text, find_file, uncompressed_name
 from aps.utils.utctime import utc, MJD
 
 # Regex to decode specific line. Valid for POST2005 and PRE2005 format
 delay_info = re.compile(r'.*(?:Delay|Delay\(All\))[ ]*(?P<used>[0-9]*)[ ]*(?P<wrms>[0-9\.]*) ps .*').match
 rate_info = re.compile(r'.*(?:Rate|Rate\(All\))[ ]*(?P<used>[0-9]*)[ ]*(?P<rate>[0-9\.]*) fs/s[ ]*.*').match
-baseline_data = re.compile(r' (?P<fr>.{8})\-(?P<to>.{8})(?P<used>[ 0-9]{4,5})/(?P<recov>[ 0-9]{5}).*').match
-baseline_nodata = re.compile(r' (?P<fr>.{8})\-(?P<to>.{8}).*No Data.*').match
-source_data = re.compile(r'(?:\s{5}|SRC_STAT:\s{2})(?P<name>.{8})\s[\sA-Z]\s+(?P<used>[0-9]+)[/\s]+(?P<recov>[0-9]+).*').match
-station_data = re.compile(r' {5}(?P<name>.{8})     (?P<used>[ 0-9]{5})/(?P<recov>[ 0-9]{5}).*').match
 param_clock = re.compile(r'[ 0-9]{5}\. (?P<sta>.{8}) (?P<code>AT|CL|BR) (?P<id>[0-9]) (?P<time>.{14}).*').match
 param_coord = re.compile(r'[ 0-9]{5}\. (?P<sta>.{8}).{12}(?P<code>[XYZ]) Comp.*').match
 check_db_name = re.compile('^ Data base (?P<name>[$]?\d{2}[A-Z]{3}\d{2}[A-Z]{1,2}|\d{8}-\w{1,12}) .*$').match
 baseline_clock = re.compile(r'[ 0-9]{5}\. (?P<fr>.{8})-(?P<to>.{8}) Clock offset.*').match
+# Codes of clock parameters and words included in all needed records of Section
+clock_codes = frozenset(['AT', 'CL', 'BR'])
+need_words = ('Wobble', 'UT1-TAI', 'Nutation')
+# Fields that could be selected when reading spool. EOB_FIELDS are the fields used by make_eob_record
+SPOOL_FIELDS = frozenset(['duration', 'delay', 'rate', 'session', 'baselines', 'sources', 'stations', 'parameters',
+                          'eop', 'correlation'])
+EOB_FIELDS = frozenset(['duration', 'delay', 'baselines', 'stations', 'eop', 'correlation'])
+
+
+# Match parameter line. Fixed columns are tested before using the regex of the only possible parameter type
+def match_parameter(line):
+    if line[5:7] != '. ':
+        return None
+    if line[15:16] == ' ' and line[16:18] in clock_codes and (param := param_clock(line)):
+        return param
+    if line[28:33] == ' Comp' and line[27:28] in 'XYZ' and (param := param_coord(line)):
+        return param
+    if line[15:16] == '-' and line[24:37] == ' Clock offset':
+        return baseline_clock(line)
+    return None
+
+
+# Statistics of baselines, sources or stations stored as columns (names, used and recoverable observations).
+# Values of a name are available as a dict {'used': , 'recov': } so that the table can be used like the original dict
+class StatsTable(Mapping):
+
+    def __init__(self, names=(), used=(), recov=()):
+        self.index = dict(zip(map(intern, names), range(len(names))))
+        self.names = list(self.index)
+        self.used, self.recov = np.asarray(used, dtype=np.int32), np.asarray(recov, dtype=np.int32)
+        if len(self.names) < len(names):  # Last values of duplicated names are kept at position of first one
+            rows = list(self.index.values())
+            self.used, self.recov = self.used[rows], self.recov[rows]
+            self.index = dict(zip(self.names, range(len(rows))))
+
+    def __getitem__(self, name):
+        row = self.index[name]
+        return {'used': int(self.used[row]), 'recov': int(self.recov[row])}
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __repr__(self):
+        return f'StatsTable({dict(self)})'
+
+    # New table with rows of other table added
+    def extend(self, other):
+        return StatsTable(self.names + other.names, np.concatenate((self.used, other.used)),
+                          np.concatenate((self.recov, other.recov)))
+
+
+# Rows of statistics tables. A baseline without data has a 'No Data' message instead of the used (4 or 5 digits) /
+# recoverable (5 digits) values. Source rows are not fixed width.
+baseline_row = re.compile(r'^ (.{8})-(.{8})(?:([ 0-9]{4,5})/([ 0-9]{5})(?!.*No Data)|.*No Data).*$', re.MULTILINE)
+station_row = re.compile(r'^ {5}(.{8}) {5}([ 0-9]{5})/([ 0-9]{5}).*$', re.MULTILINE)
+source_row = re.compile(r'^(?:[ \t]{5}|SRC_STAT:[ \t]{2})(.{8})[ \t][ \tA-Z][ \t]+([0-9]+)[/ \t]+([0-9]+).*$', re.MULTILINE)
+
+
+# Search function of block of contiguous rows of table
+def table_block(row):
+    return re.compile(rf'(?:{row.pattern}(?:\n|$))+', re.MULTILINE).search
+
+
+baseline_block, station_block, source_block = map(table_block, (baseline_row, station_row, source_row))
+
+
+# Decode block of baseline statistics. Values are 0 for rows with a 'No Data' message
+def baseline_stats(block):
+    rows = baseline_row.findall(block)
+    return StatsTable([f'{fr.strip()}|{to.strip()}' for fr, to, _, _ in rows], [to_int(row[2]) for row in rows],
+                      [to_int(row[3]) for row in rows])
+
+
+def station_stats(block):
+    rows = station_row.findall(block)
+    return StatsTable([row[0].strip() for row in rows], [to_int(row[1]) for row in rows],
+                      [to_int(row[2]) for row in rows])
+
+
+def source_stats(block):
+    rows = source_row.findall(block)
+    return StatsTable([row[0].strip() for row in rows], [int(row[1]) for row in rows], [int(row[2]) for row in rows])
+
+
+# Parameter of a run. Code is AT, CL, BR (clocks), X, Y, Z (coordinates) or BL (baseline clock).
+# Id and epoch are only defined for clocks (-1 and '' otherwise) and remote is the second station of baseline clock
+Parameter = namedtuple('Parameter', 'station code id epoch remote')
+
+
+# Parameters of a run stored in parallel columns. Names, codes and epochs are interned strings
+class ParameterTable(Sequence):
+    __slots__ = ('stations', 'codes', 'ids', 'epochs', 'remotes')
+
+    def __init__(self):
+        self.stations, self.codes, self.epochs, self.remotes = [], [], [], []
+        self.ids = array('b')
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self))[index]]
+        return Parameter(self.stations[index], self.codes[index], self.ids[index], self.epochs[index],
+                         self.remotes[index])
+
+    def __eq__(self, other):
+        return isinstance(other, ParameterTable) and list(self) == list(other)
+
+    # Add parameter matched by param_clock, param_coord or baseline_clock
+    def add(self, param):
+        if 'fr' in param.re.groupindex:
+            station, code, index, epoch, remote = param['fr'].strip(), 'BL', -1, '', param['to'].strip()
+        elif (code := param['code']) in 'XYZ':
+            station, index, epoch, remote = param['sta'].strip(), -1, '', ''
+        else:
+            station, index, epoch, remote = param['sta'].strip(), int(param['id']), param['time'], ''
+        self.stations.append(intern(station))
+        self.codes.append(intern(code))
+        self.ids.append(index)
+        self.epochs.append(intern(epoch))
+        self.remotes.append(intern(remote))
+
+
+# Coordinates of stations or sources in global section. Each row is one component of a station or a source
+# with its value and sigma. Components of all names are extracted at once as matrices (NaN when not estimated).
+class CoordinateTable(Mapping):
+    dtype = np.dtype([('name', 'U16'), ('component', 'U12'), ('value', 'f8'), ('sigma', 'f8')])
+    components = ()
+
+    def __init__(self, rows=()):
+        self.rows = np.array(rows if isinstance(rows, list) else list(rows), dtype=self.dtype)
+        names = list(map(intern, self.rows['name'].tolist()))
+        self.names = list(dict.fromkeys(names))
+        self.index = {name: row for row, name in enumerate(self.names)}
+        self.entries = np.array([self.index[name] for name in names], dtype=np.intp)
+
+    def __getitem__(self, name):
+        rows = self.rows[self.entries == self.index[name]]
+        return {comp: (value, sigma) for _, comp, value, sigma in rows.tolist()}
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({len(self.names)} names, {len(self.rows)} rows)'
+
+    # Values and sigmas of components (columns) for all names or list of names (rows)
+    def matrix(self, components=None, names=None):
+        components = list(components or self.components)
+        values, sigmas = np.full((2, len(self.names), len(components)), np.nan)
+        if len(self.rows):
+            found, inverse = np.unique(self.rows['component'], return_inverse=True)
+            columns = np.array([components.index(comp) if comp in components else -1 for comp in found.tolist()])
+            columns = columns[inverse.ravel()]
+            rows, keep = self.entries, columns >= 0
+            values[rows[keep], columns[keep]] = self.rows['value'][keep]
+            sigmas[rows[keep], columns[keep]] = self.rows['sigma'][keep]
+        if names is not None:
+            rows = [self.index[name] for name in names]
+            values, sigmas = values[rows], sigmas[rows]
+        return values, sigmas
+
+
+# Station positions (X, Y, Z) and velocities (VX, VY, VZ) in meters and meters/year
+class StationTable(CoordinateTable):
+    components = ('X', 'Y', 'Z')
+
+    def positions(self, names=None):
+        return self.matrix(('X', 'Y', 'Z'), names)
+
+    def velocities(self, names=None):
+        return self.matrix(('VX', 'VY', 'VZ'), names)
+
+
+# Source coordinates (RT. ASC., DEC.) in radians and correlation between them
+class SourceTable(CoordinateTable):
+    components = ('RT. ASC.', 'DEC.')
+
+    def coordinates(self, names=None):
+        return self.matrix(('RT. ASC.', 'DEC.'), names)
+
+    def correlations(self, names=None):
+        return self.matrix(('CORRELATION',), names)[0][:, 0]
+
+
+# Decode sexagesimal angle (hours or degrees, minutes, seconds) into radians
+def to_radians(text, hours=False):
+    if len(fields := text.split()) != 3:
+        return np.nan
+    sign = -1.0 if fields[0].startswith('-') else 1.0
+    value = abs(to_float(fields[0])) + to_float(fields[1]) / 60 + to_float(fields[2]) / 3600
+    return float(np.deg2rad(sign * value * (15 if hours else 1)))
+
+
+# Decode station and source coordinates of global section.
+# Estimated parameters have consecutive indices. Source correlations are not indexed
+def decode_global_section(lines, add_error=print):
+    stations, sources, known, index = [], [], set(), 0
+    for line in lines:
+        if line[5:6] == '.' and to_int(line[:5]) == index + 1:
+            index += 1
+            if line[27:28] in ('X', 'Y', 'Z'):
+                name, coord, code = line[7:15].strip(), line[27:28], line[29:35].strip()
+                if code == 'Velo':
+                    if name not in known:
+                        add_error(f'{name} not in station list')
+                        continue
+                    coord = 'V' + coord
+                elif code != 'Comp':
+                    name = f'{name}_{code}'
+                known.add(name)
+                stations.append((name, coord, to_float(line[39:53]), to_float(line[83:93])))
+            elif (code := line[17:28].strip()) in ('RT. ASC.', 'DEC.'):
+                sources.append((line[8:16].strip(), code, to_radians(line[34:52], code == 'RT. ASC.'),
+                                to_float(line[81:93])))
+        elif line[17:28] == 'CORRELATION':
+            sources.append((line[8:16].strip(), 'CORRELATION', to_float(line[32:39]), np.nan))
+    return StationTable(stations), SourceTable(sources)
 
 
 # Decode header line
@@ -64,20 +297,36 @@ class Section:
                        ('YREOP', [(9, 6, 1.0e-3), (9, 6, 1.0e-6)]),
                        ('REOP', [(7, 4, 1.0), (7, 4, 1.0e-3)])
                        ])
-
-    def __init__(self, spl):
+    # EOP and nutation values in eob records
+    nutation_forms = (('PEOP', 'EEOP'), ('XNUT', 'YNUT'))
+    eop_keys = ('XEOP', 'YEOP', 'UEOP', 'XREOP', 'YREOP', 'REOP')
+    # EOP values and MJD_EOP are only defined when found in section
+    __slots__ = ('spl', 'run_id', 'DB_NAME', 'POST2005', 'header', 'Duration', 'USED', 'WRMS', 'RATE', 'stats',
+                 'parameters', 'CORRELATION', 'MJD_EOP', 'MJD_NUT') + tuple(key for key, _ in need.values())
+
+    def __init__(self, spl, fields=None):
         self.DB_NAME = self.MJD_NUT = None
         self.USED, self.WRMS, self.RATE = 0, 0.0, 0.0
         self.spl = spl
         self.run_id = self.spl.line.strip().split()[1]
         self.POST2005 = False
-        self.CORRELATION = [0] * 28
+        self.CORRELATION = array('d', [0] * 28)
         self.Duration = 0
-        self.stats = {'session': {}, 'baselines': {}, 'stations': {}, 'sources': {}}
-        self.parameters = []
+        self.stats = {'session': {}, 'baselines': StatsTable(), 'stations': StatsTable(), 'sources': StatsTable()}
+        self.parameters = ParameterTable()
         self.header = {}
-        self.read_all()
+        self.read_all(fields)
         self.MJD_NUT = self.MJD_NUT if self.MJD_NUT else getattr(self, 'MJD_EOP', 0.0)
+        self.spl = None  # Reader is only used while decoding
+
+    # Reader is not pickled. Values not found in section are not in state
+    def __getstate__(self):
+        return {key: getattr(self, key) for key in self.__slots__ if key != 'spl' and hasattr(self, key)}
+
+    def __setstate__(self, state):
+        self.spl = None
+        for key, value in state.items():
+            setattr(self, key, value)
 
     # Read header
     def read_header(self):
@@ -85,11 +334,8 @@ class Section:
             line = self.spl.line
             if line.startswith('  Flyby'):
                 #
-                # Check if post2005 format and change decoding functions
-                if self.header.get('Listing_Options', {}).get('SEG_STYLE', '') == 'POST2005':
-                    self.POST2005 = True
-                    self.decode_eops = self.decode_eops_post2005
-                    self.decode_nutation = self.decode_nutation_post2005
+                # Check if post2005 format
+                self.POST2005 = self.header.get('Listing_Options', {}).get('SEG_STYLE', '') == 'POST2005'
                 return True
             if has_db_name := check_db_name(line):
                 self.DB_NAME = has_db_name['name'].replace('$', '')
@@ -99,6 +345,8 @@ class Section:
 
     # Decode eops records
     def decode_eops(self, line):
+        if self.POST2005:
+            return self.decode_eops_post2005(line)
         return to_float(line[38:49]), to_float(line[77:87]), to_float(line[99:108]), MJD(spool=line[21:35])
 
     # Decode eops records in POST2005 format
@@ -107,6 +355,8 @@ class Section:
 
     # Decode nutation records
     def decode_nutation(self, line):
+        if self.POST2005:
+            return self.decode_nutation_post2005(line)
         return to_float(line[51:62]), to_float(line[67:77]), to_float(line[67:77]),MJD(spool=line[21:35])
 
     # Decode nutation records in POST2005 format
@@ -114,7 +364,7 @@ class Section:
         return to_float(line[65:74]), to_float(line[79:89]), to_float(line[100:110]), MJD(spl=line[41:64])
 
     def read_eop_correlation(self):
-        self.CORRELATION = []
+        self.CORRELATION = array('d')
         for row in range(8):
             if self.spl.has_next():
                 # Extract all values in row except the last 1.000
@@ -132,10 +382,11 @@ class Section:
     def get_rate(line):
         return to_float(info['rate']) if (info := rate_info(line)) else 0.0
 
-    def get_data(self, line):
-        if (param := param_clock(line)) or (param := param_coord(line)) or (param := baseline_clock(line)):
-            self.parameters.append(param)
-        else:
+    # Decode parameter or EOP record. Return True if EOP record
+    def get_data(self, line, parameters=True):
+        if parameters and (param := match_parameter(line)):
+            self.parameters.add(param)
+        elif need_words[0] in line or need_words[1] in line or need_words[2] in line:
             for string in Section.need.keys():
                 if string in line:
                     key, code = Section.need[string]
@@ -143,62 +394,89 @@ class Section:
                     setattr(self, key, [val, a_sigma, m_sigma])
                     if not hasattr(self, Section.mjds[code]):
                         setattr(self, Section.mjds[code], mjd)
-                    return
+                    return True
+        return False
 
-    def decode_stats(self, Id, decoder):
-        stats = self.stats[Id]
-        while self.spl.has_next():
-            data = decoder(self.spl.line)
-            if data:
-                stats[data['name'].strip()] = {'used': to_int(data['used']), 'recov': to_int(data['recov']) }
-            elif stats:  # Stats not empty so it should be over
-                return
+    def add_stats(self, Id, table):
+        self.stats[Id] = self.stats[Id].extend(table) if self.stats[Id] else table
 
+    # Statistics tables are read as blocks of rows decoded by one pass of the regex of rows
     def decode_baseline_stats(self):
-        stats = self.stats['baselines']
-        while self.spl.has_next():
-            no_data, data = baseline_nodata(self.spl.line), baseline_data(self.spl.line)
-            if not no_data and not data and stats:  # Stats not empty so it should be over
-                return
-            if no_data:  # Database has no data
-                key = f'{no_data["fr"].strip()}|{no_data["to"].strip()}'
-                stats[key] = {'used': 0, 'recov': 0}
-            elif data:  # Process data
-                key = f'{data["fr"].strip()}|{data["to"].strip()}'
-                stats[key] = {'used': to_int(data['used']), 'recov': to_int(data['recov']) }
-
-    # Read all records in section
-    def read_all(self):
+        if block := self.spl.read_block(baseline_block):
+            self.add_stats('baselines', baseline_stats(block))
+
+    def decode_station_stats(self):
+        if block := self.spl.read_block(station_block):
+            self.add_stats('stations', station_stats(block))
+
+    def decode_source_stats(self):
+        if block := self.spl.read_block(source_block):
+            self.add_stats('sources', source_stats(block))
+
+    # Read all records in section or only the requested fields. Reading stops when all fields have been decoded.
+    # EOP values are complete at the first line after the EOP and nutation records used by make_eob_record.
+    def read_all(self, fields=None):
         # Read the header
         if not self.read_header():
             return
+        pending = set(fields if fields else SPOOL_FIELDS)
+        wanted = pending.copy()
+        table_end = False  # Line ending a table has been read and is decoded like any other line
+        eob_found = False  # All EOP and nutation records have been found
         # Read each line
-        while self.spl.has_next():
-            line = self.spl.line
+        while pending and (table_end or self.spl.has_next()):
+            line, table_end = self.spl.line, False
+            if eob_found and not any(word in line for word in need_words):
+                pending.discard('eop')
+                if not pending:
+                    return
             if line.startswith('1Run'):
                 return
             if line.startswith((' Nominal duration:', ' Actual duration:')):
                 self.Duration = to_float(line.split(':')[1].split()[0])
+                pending.discard('duration')
             elif line.startswith('   Delay'):
                 self.USED, self.WRMS = self.get_delay(line)
+                pending.discard('delay')
             elif line.startswith('   Rate'):
                 self.RATE = self.get_rate(line)
+                pending.discard('rate')
             elif line.startswith(' Baseline Statistics'):
-                self.decode_baseline_stats()
+                if 'baselines' in wanted:
+                    self.decode_baseline_stats()
+                    pending.discard('baselines')
+                    table_end = True
             elif line.startswith(' Source Statistics'):
-                self.decode_stats('sources', source_data)
+                if 'sources' in wanted:
+                    self.decode_source_stats()
+                    pending.discard('sources')
+                else:
+                    self.spl.read_block(source_block)
+                table_end = True
             elif line.startswith(' Station Statistics'):
-                self.decode_stats('stations', station_data)
+                if 'stations' in wanted:
+                    self.decode_station_stats()
+                    pending.discard('stations')
+                    table_end = True
             elif line.startswith(' EOP Correlations:'):
                 self.read_eop_correlation()
+                pending.discard('correlation')
             elif line.startswith(' Number of potentially recoverable observations'):
                 self.stats['session']['recov'] = to_int(line[55:60])
             elif line.startswith(' Number of potentially good observations'):
                 self.stats['session']['good'] = to_int(line[55:60])
             elif line.startswith(' Number of used observations'):
                 self.stats['session']['used'] = to_int(line[55:60])
-            else:
-                self.get_data(line)
+                if len(self.stats['session']) == 3:
+                    pending.discard('session')
+            elif self.get_data(line, 'parameters' in wanted):
+                eob_found = self.has_eob_values()
+
+    # Test if EOP and nutation values used by make_eob_record have been found. Nutation could be in DPSI/DEPS or Dx/Dy
+    # form. All forms found in section must be complete.
+    def has_eob_values(self):
+        forms = [form for form in self.nutation_forms if any(hasattr(self, key) for key in form)]
+        return bool(forms) and all(hasattr(self, key) for form in [self.eop_keys] + forms for key in form)
 
     def fmt_val(self, val, err, width, precision):
         if err < 1.0E-20:
@@ -246,6 +524,179 @@ class Section:
         return ' '.join(vals)
 
 
+# Read lines of a section of spool file using same rules than TEXTfile (universal newlines)
+class SectionReader(TEXTfile):
+
+    def __init__(self, data, encoding='UTF-8'):
+        self.path, self.EOL, self.encoding, self.line, self.line_nbr, self.is_valid = None, -1, encoding, None, 0, True
+        self.text = data.decode(encoding, errors='surrogateescape')
+        if '\r' in self.text:
+            self.text = self.text.replace('\r\n', '\n').replace('\r', '\n')
+        self.file = io.StringIO(self.text)
+
+    # Read block of contiguous lines found by search function. Lines before block are skipped and the line after
+    # block is read. Return empty string if block is not found.
+    def read_block(self, search):
+        start = self.file.tell()
+        if not (block := search(self.text, start)):
+            self.file.seek(len(self.text))
+            self.has_next()
+            return ''
+        self.file.seek(block.end())
+        self.line_nbr += self.text.count('\n', start, block.end())
+        self.has_next()
+        return block.group()
+
+
+# Number of cpus this process can run on
+def available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on all platforms
+        return os.cpu_count() or 1
+
+
+# Sequence of runs in spool file. A section is decoded only when it is accessed.
+# Ranges of compressed files are in decompressed data, which is kept in memory until spool is pickled.
+# Runs are indexed again if spool file has been changed (by solve) since it was indexed.
+class LazyRuns(Sequence):
+    fields = None  # Fields decoded in each section (all if None)
+
+    def __init__(self, path, stamp, data, fields=None):
+        self.path, self.fields = path, fields
+        self.index(stamp, data)
+
+    # Index byte offsets and DB_NAME of each 1Run section of file content
+    def index(self, stamp, data):
+        starts = [0] if data[:4] == b'1Run' else []
+        while (pos := data.find(b'\n1Run', starts[-1] if starts else 0)) >= 0:
+            starts.append(pos + 1)
+        self.ranges = list(zip(starts, starts[1:] + [len(data)]))
+        self.db_names = [Spool.find_db_name(data, start, end) for start, end in self.ranges]
+        self.stamp, self._runs = stamp, [None] * len(self.ranges)
+        self._data = data if is_compressed(self.path) else None
+
+    # Decompressed data is not pickled
+    def __getstate__(self):
+        return dict(self.__dict__, _data=None)
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self))[index]]
+        if self._runs[index] is None:
+            self._runs[index] = self.decode(index)
+        return self._runs[index]
+
+    # Memory map of file or decompressed data of archive. Archive is read again if data is not in memory.
+    # Runs are indexed again and cached spool is removed if file has changed.
+    @contextmanager
+    def content(self):
+        if self._data is not None:
+            yield self._data
+            return
+        with spool_bytes(self.path) as (stamp, data):
+            if stamp != self.stamp:
+                remove_cached_spool(self.path)
+                self.index(stamp, data)
+            elif is_compressed(self.path):
+                self._data = data
+            yield data
+
+    # Read bytes of section and decode it
+    def decode(self, index):
+        with self.content() as data:
+            start, end = self.ranges[index]
+            return decode_section(data[start:end], self.fields)
+
+    # Decode all sections when iterating. Process pool is used if number of sections to decode is over threshold.
+    # Other sections are decoded using one memory map of file.
+    def __iter__(self):
+        if (missing := [index for index, run in enumerate(self._runs) if run is None]) \
+                and len(missing) >= int(getattr(app, 'spool_parallel_runs', 500)) > 0:
+            self.decode_parallel(missing)
+        if missing := [index for index, run in enumerate(self._runs) if run is None]:
+            self.decode_serial(missing)
+        for index in range(len(self)):
+            yield self[index]
+
+    # Decode sections from memory map of file or from decompressed data of archive
+    def decode_serial(self, indices):
+        stamp = self.stamp
+        with self.content() as data:
+            if self.stamp != stamp:  # All runs are decoded from new content
+                indices = range(len(self))
+            for index in indices:
+                start, end = self.ranges[index]
+                self._runs[index] = decode_section(data[start:end], self.fields)
+
+    # Decode sections in process pool. Each worker decodes a block of consecutive sections from memory map of file
+    # or from the part of the decompressed data of archive sent to worker. Sections of a worker finding that the file
+    # has changed are not decoded.
+    # Number of workers is limited to available cpus. Sections are decoded serially if only one cpu is available.
+    def decode_parallel(self, indices, workers=None):
+        cpus = available_cpus()
+        workers = min(int(workers or getattr(app, 'spool_workers', 0) or cpus), cpus)
+        if workers < 2:
+            return
+        size = -(-len(indices) // (workers * 4))
+        blocks = [indices[start:start + size] for start in range(0, len(indices), size)]
+        ranges = [[self.ranges[index] for index in block] for block in blocks]
+        data = [self._data[rng[0][0]:rng[-1][1]] for rng in ranges] if self._data is not None \
+            else [None] * len(blocks)
+        with ProcessPoolExecutor(max_workers=min(workers, len(blocks))) as pool:
+            decoded = pool.map(decode_sections, [self.path] * len(blocks), [self.stamp] * len(blocks), ranges,
+                               [self.fields] * len(blocks), data)
+            for block, sections in zip(blocks, decoded):
+                for index, section in zip(block, sections or []):
+                    self._runs[index] = section
+
+
+# Decode section from its bytes. Reader and its text are released when section is decoded
+def decode_section(data, fields):
+    reader = SectionReader(data)
+    try:
+        reader.has_next()  # Read 1Run line
+        return Section(reader, fields)
+    finally:
+        reader.file.close()
+
+
+# Decode sections at byte ranges of spool file or of data starting at first range (process pool worker)
+def decode_sections(path, stamp, ranges, fields, data=None):
+    if data is not None:
+        offset = ranges[0][0]
+        return [decode_section(data[start - offset:end - offset], fields) for start, end in ranges]
+    with spool_bytes(path) as (current, mm):
+        if current == stamp:
+            return [decode_section(mm[start:end], fields) for start, end in ranges]
+    return None
+
+
+# Size and modification time of open file
+def file_stamp(file):
+    info = os.fstat(file.fileno())
+    return info.st_size, info.st_mtime_ns
+
+
+# Content of spool file as memory map of plain file or as decompressed data of gzip or zstandard archive.
+# Stamp is the size and modification time of file (compressed file for archive).
+@contextmanager
+def spool_bytes(path):
+    with open(path, 'rb') as file:
+        stamp = file_stamp(file)
+        if is_compressed(path):
+            with open_binary(path) as archive:
+                yield stamp, archive.read()
+        elif not stamp[0]:
+            yield stamp, b''
+        else:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield stamp, mm
+
+
 class Spool(TEXTfile):
 
     def __init__(self, path):
@@ -254,11 +705,16 @@ class Spool(TEXTfile):
         self.last_modified = os.path.getmtime(path)
 
         self.runs, self.header = [], {}
-        self.data = {'Apriori model': {}, 'Stations': {}, 'Sources': {}, 'Sections': []}
-        self.unused = {}
+        self.data = {'Apriori model': {}, 'Stations': StationTable(), 'Sources': SourceTable(), 'Sections': []}
+        self.coordinates_read = False
+        self.unused, self.unused_stamp = {}, False
         self.valid = True
         self._errors = []
 
+    # Open file is not pickled
+    def __getstate__(self):
+        return dict(self.__dict__, file=None)
+
     def add_error(self, msg):
         self._errors.append(msg)
         return False
@@ -281,75 +737,27 @@ class Spool(TEXTfile):
     def read_statistics(self):
         pass
 
-    @staticmethod
-    def get_position_index(line):
-        if line[5:6] == '.':
-            try:
-                return int(line[0:5].strip())
-            except:
-                pass
-        return -1
-
-    @staticmethod
-    def decode_coord(sta, coord, line):
-        sta[coord] = (to_float(line[39:53]), to_float(line[83:93]))
-
-    def get_or_create_station(self, name):
-        if not (sta := self.data['Stations'].get(name, None)):
-            sta = {'X': (None, None), 'Y': (None, None), 'Z': (None, None), 'VX': (None, None),
-                   'VY': (None, None), 'VZ': (None, None)}
-            self.data['Stations'][name] = sta
-        return sta
-
-    def decode_station(self, line):
-        name, coord, code = line[7:15].strip(), line[27:28], line[29:35].strip()
-        # Decode velocity record
-        if code == 'Velo':
-            if sta := self.data['Stations'].get(name):
-                self.decode_coord(sta, 'V' + coord, line)
-            else:
-                self.add_error(f'{name} not in station list')
-        # Decode station record
-        elif code == 'Comp':
-            sta = self.get_or_create_station(name)
-            self.decode_coord(sta, coord, line)
-        else:
-            sta = self.get_or_create_station(f'{name}_{code}')
-            self.decode_coord(sta, coord, line)
-
-    def decode_ra_dec(self, src, code, line):
-        src[code] = (line[34:52].strip().split(), to_float(line[81:93]))
-
-    def get_or_create_source(self, name):
-        if not (src := self.data['Sources'].get(name)):
-            src = {'RT. ASC.': (None, None), 'DEC.': (None, None), 'CORRELATION': (None, None)}
-            self.data['Sources'][name] = src
-        return src
-
-    def decode_source(self, line):
-        name, code = line[8:16], line[17:28].strip()
-        src = self.get_or_create_source(name)
-        if code == 'CORRELATION':
-            src[code] = to_float(line[32:39])
-        else:
-            self.decode_ra_dec(src, code, line)
+    # Decode station and source coordinates of global section (lines before first run)
+    def read_coordinates(self):
+        with spool_bytes(self.path) as (_, mm):
+            end = 0 if mm[:4] == b'1Run' else pos + 1 if (pos := mm.find(b'\n1Run')) >= 0 else len(mm)
+            data = mm[:end]
+        lines = data.decode('utf-8', errors='surrogateescape').splitlines()
+        self.data['Stations'], self.data['Sources'] = decode_global_section(lines, self.add_error)
+        self.coordinates_read = True
 
-    def read_global_section_old(self):
-        sta_coord, src_coord = 'XYZ', ['RT. ASC.', 'DEC.']
+    # Station and source coordinates are decoded the first time they are used
+    @property
+    def stations(self):
+        if not self.coordinates_read:
+            self.read_coordinates()
+        return self.data['Stations']
 
-        index = 0
-        while self.has_next():
-            if self.line.startswith('1Run'):
-                return
-            n = self.get_position_index(self.line)
-            if n == index + 1:
-                index += 1
-                if self.line[27:28] in sta_coord:
-                    self.decode_station(self.line)
-                elif self.line[17:28].strip() in src_coord:
-                    self.decode_source(self.line)
-            elif self.line[17:28] == 'CORRELATION':
-                self.decode_source(self.line)
+    @property
+    def sources(self):
+        if not self.coordinates_read:
+            self.read_coordinates()
+        return self.data['Sources']
 
     def read_global_section(self):
         while self.has_next():
@@ -361,6 +769,35 @@ class Spool(TEXTfile):
         while self.line.startswith('1Run'):
             self.runs.append(Section(self))
 
+    # Read block of contiguous lines found by search function while reading file line by line (see SectionReader)
+    def read_block(self, search):
+        lines = []
+        while self.has_next():
+            if search(self.line):
+                lines.append(self.line)
+            elif lines:
+                break
+        return '\n'.join(lines)
+
+    # Index byte offsets and DB_NAME of each 1Run section using memory map of file (decompressed data of archive).
+    # Runs are decoded when accessed.
+    def index_sections(self):
+        with spool_bytes(self.path) as (stamp, mm):
+            self.runs = LazyRuns(self.path, stamp, mm)
+        return len(self.runs) > 0
+
+    # Find DB_NAME in header of section (before Flyby line)
+    @staticmethod
+    def find_db_name(mm, start, end):
+        db_name, end = None, pos if (pos := mm.find(b'\n  Flyby', start, end)) >= 0 else end
+        while (pos := mm.find(b'\n Data base ', start, end)) >= 0:
+            start = mm.find(b'\n', pos + 1, end)
+            start = end if start < 0 else start
+            line = mm[pos + 1:start].decode('utf-8', errors='surrogateescape').rstrip('\r')
+            if has_db_name := check_db_name(line):
+                db_name = has_db_name['name'].replace('$', '')
+        return db_name
+
     def add_apriori(self, line):
         key, info = line.split(':')
         self.data['Apriori model'][key.strip()] = info.strip()
@@ -373,16 +810,29 @@ class Spool(TEXTfile):
                 return
             self.add_apriori(self.line[8:])
 
+    # Path of file with unused observations
+    def get_unused_path(self):
+        folder, name = Path(self.path).parent, uncompressed_name(Path(self.path).name)
+        if name.endswith('.SFF'):
+            return find_file(Path(folder, name).with_suffix('.NUO'))
+        elif name.startswith('SPLF'):
+            return find_file(Path(folder, f'nuSolve_unused_observations_{name[-2:]}'))
+        return None
+
+    # Read unused observations if file has changed since last time. Return True if read.
     def get_unused_observations(self):
-        if (filepath := Path(self.path)).suffix == '.SFF':
-            path = filepath.with_suffix('.NUO')
-        elif (filepath := Path(self.path)).name.startswith('SPLF'):
-            path = Path(filepath.parent, f'nuSolve_unused_observations_{filepath.name[-2:]}')
-        else:
-            return
-        if not path.exists():
-            return
+        stamp = None
+        if (path := self.get_unused_path()) and path.exists():
+            info = path.stat()
+            stamp = info.st_size, info.st_mtime_ns
+        if stamp == self.unused_stamp:
+            return False
+        self.unused_stamp = stamp
+        if stamp:
+            self.read_unused_observations(path)
+        return True
 
+    def read_unused_observations(self, path):
         # Extract
         unused = {'unusable': [], 'excluded': []}
 
@@ -395,7 +845,7 @@ class Spool(TEXTfile):
 
         match = re.compile(r'^(?P<code>[ue]) (?P<row>[ 0-9]{5}) (?P<time>[0-9\:]{8})(?P<qc>.{4})(?P<fc>.{4}).{1,20}'
                            r'(?P<nunchan>[ 0-9]{6}) (?P<baseline>.{17}) (?P<source>.{8})(?P<data>.*)$').match
-        with open(path, errors='ignore') as file:
+        with open_text(path, errors='ignore') as file:
             for line in file.readlines():
                 code = None
                 if (run := get_run(line)) and run['id'].strip() != self.runs[0].run_id:
@@ -423,28 +873,87 @@ class Spool(TEXTfile):
         self.unused = unused
 
 
-# Get all spool file from backup directories
+# Roots of stored spool files with index refreshed by this process
+indexed_roots = set()
+
+
+# Get most recent spool file from backup directories. Files are found using the index of stored spool files
+# in database. The index is refreshed (only folders that have changed) once per process.
 def get_stored_spool(db_name):
     if not (root := app.folder('STORED_SPOOL')):
         root = str(Path().home())
-    files = [Path(file) for file in glob.glob(f'{root}/**/{db_name}.SFF', recursive=True)]
+    dbase = app.get_dbase()
+    if root not in indexed_roots and loaders.load_stored_spool(dbase, root):
+        indexed_roots.add(root)
+    files = [Path(file) for file in dbase.get_stored_spools(db_name, root) if os.path.exists(file)]
     files.sort(key=lambda x: x.stat().st_mtime, reverse=True)
     return files[0] if files else None
 
 
-# Read spool file
-def read_spool(path=None, initials='', db_name='', read_unused=False):
+# Version of cached spool format. Cached files with other version are decoded again
+cache_version = 4
+
+
+# Path of cached spool in cache folder. Return None if cache is not used (no_spool_cache option or spool_cache = false)
+def spool_cache_path(path):
+    if getattr(app.args, 'no_spool_cache', False) or not getattr(app, 'spool_cache', True):
+        return None
+    if folder := app.cache_folder('spool'):
+        key = hashlib.md5(str(Path(path).resolve()).encode('utf-8')).hexdigest()
+        return Path(folder, f'{Path(path).name}-{key}.pkl')
+    return None
+
+
+# Load decoded spool from cache if spool file has not changed (same size and mtime)
+def load_cached_spool(path):
+    if cache := spool_cache_path(path):
+        try:
+            with open(cache, 'rb') as file:
+                version, stamp, spool = pickle.load(file)
+            info = os.stat(path)
+            if version == cache_version and stamp == (info.st_size, info.st_mtime_ns):
+                return spool
+        except Exception:
+            pass
+    return None
+
+
+# Remove cached spool of spool file
+def remove_cached_spool(path):
+    if (cache := spool_cache_path(path)) and cache.exists():
+        cache.unlink(missing_ok=True)
+
+
+# Save decoded spool in cache using pickle protocol 5
+def save_cached_spool(spool):
+    if cache := spool_cache_path(spool.path):
+        try:
+            with open(tmp := Path(f'{cache}.{os.getpid()}'), 'wb') as file:
+                pickle.dump((cache_version, spool.runs.stamp, spool), file, protocol=5)
+            os.replace(tmp, cache)
+        except Exception:
+            pass
+
+
+# Read spool file. If fields are given, only these fields are decoded in each run and spool is not cached
+def read_spool(path=None, initials='', db_name='', read_unused=False, fields=None):
     if not path:
         path = Path(app.folder('SPOOL_DIR'), f'SPLF{initials}') if initials \
             else get_stored_spool(db_name) if db_name else None
     if path and path.exists():
-
-        with Spool(path) as spool:
-            if spool.read_global_section():
-                spool.read_sections()
-                if spool.runs:
-                    if not db_name or spool.runs[0].DB_NAME == db_name:
-                        if read_unused:
-                            spool.get_unused_observations()
-                        return spool
+        if not (spool := load_cached_spool(path)):
+            with Spool(path) as spool:
+                if not spool.index_sections():
+                    return None
+            spool.runs.fields = fields
+            spool.runs[0]  # First run is used by all applications and is always cached
+            changed = complete = not fields
+        else:
+            changed, complete = False, True
+        if not db_name or spool.runs.db_names[0] == db_name:
+            if read_unused:
+                changed = spool.get_unused_observations() or changed
+            if changed and complete:
+                save_cached_spool(spool)
+            return spool
     return None
@@ -1,6 +1,8 @@
 import os
 from pathlib import Path
 
+from aps.utils import app
+from aps.utils.files import open_text, compressed_suffixes
 from aps.aps.process import APSprocess
 from aps.aps import solve
 
@@ -56,20 +58,31 @@ class STANDALONE(APSprocess):
         link.symlink_to(path)
         return True
 
-    # Extract information from spool file and store to new file
-    def store_spool_data(self, session):
+    # Extract information from spool file and store to new file.
+    # File is compressed if spool_compression is gz or zst (option or config)
+    # Data is written to a temporary file that replaces the stored file when complete
+    def store_spool_data(self, session, compression=None):
         if not (spool := Path(os.environ['SPOOL_DIR'], f'SPLF{self.initials}')).exists():
             self.add_error(f'{spool.name} does not exist')
             return False
+        plain = path = session.file_path('spl')
+        if (ext := f'.{compression or getattr(app, "spool_compression", "")}') in compressed_suffixes:
+            path = path.with_name(path.name + ext)
+        tmp = path.with_name(f'.{os.getpid()}.{path.name}')  # Same suffix so that it is compressed like path
         try:
-            path = session.file_path('spl')
-            with open(path, 'w') as f_out, open(spool) as sp:
+            with open_text(tmp, 'w') as f_out, open(spool) as sp:
                 for line in sp:
                     if line.startswith('PROGRAM VERSIONS:'):
-                        return True  # End of interesting information
+                        break  # End of interesting information
                     print(line, end='', file=f_out)
+            os.replace(tmp, path)
+            # Remove file stored with other compression so that readers do not find an old one
+            for old in [plain] + [plain.with_name(plain.name + ext) for ext in compressed_suffixes]:
+                if old != path and old.exists():
+                    old.unlink()
             return True
         except Exception as err:  # Problem
+            tmp.unlink(missing_ok=True)
             self.add_error(f'Error creating {path.name} file [{str(err)}]')
             return False
 
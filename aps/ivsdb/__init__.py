@@ -7,6 +7,7 @@ from datetime import datetime
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy import create_engine, event, exists, and_
 from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
 
 from aps.ivsdb import models
 from aps.utils import app
@@ -222,3 +223,31 @@ class IVSdata:
                 .order_by(models.SEFD.observed.asc()).all():
             yield info[0]
 
+    # Get paths of stored spool files for a db_name under root folder
+    def get_stored_spools(self, db_name, root):
+        prefix = os.path.join(str(root), '')
+        return [rec[0] for rec in self.orm_ses.query(models.StoredSpool.path).filter(
+            and_(models.StoredSpool.db_name == db_name, models.StoredSpool.path.startswith(prefix, autoescape=True))
+        ).all()]
+
+    # Get fingerprint of the schedule stored for a session. Empty string if not available
+    def get_schedule_fingerprint(self, code):
+        return record.fingerprint if (record := self.get(models.ScheduleFingerprint, session=code.casefold())) else ''
+
+    # Store fingerprint of the schedule of a session. Return True if it is different from the stored one.
+    # Nothing is written if fingerprint is the same. None is returned if session is not in database.
+    def update_schedule_fingerprint(self, code, fingerprint):
+        code = code.casefold()
+        if (record := self.get(models.ScheduleFingerprint, session=code)) and record.fingerprint == fingerprint:
+            return False
+        if not record and not self.get_session(code):
+            return None
+        try:
+            if not record:
+                self.add(record := models.ScheduleFingerprint(code))
+            record.fingerprint, record.updated = fingerprint, datetime.now()
+            self.commit()
+        except SQLAlchemyError:
+            self.rollback()
+            raise
+        return True
@@ -6,7 +6,9 @@ from datetime import datetime
 from pathlib import Path
 
 from aps.ivsdb.models import OperationsCenter, Correlator, AnalysisCenter, Station, Session, SessionStation, MasterFile
+from aps.ivsdb.models import StoredSpoolFolder, StoredSpool
 from aps.utils import utctime, app, to_float
+from aps.utils.files import uncompressed_name
 
 ivs_types = json.load(app.get_hidden_file('types.json').open())
 ivs_types = {ses_id.upper(): ses_type.upper() for ses_type, sessions in ivs_types.items() for ses_id in sessions}
@@ -196,3 +198,55 @@ def load_masters(dbase, folder):
     for path in lst:
         if path.exists() and path.stat().st_size > 0 and not load_master(dbase, path):
             break
+
+
+# Index stored spool files (SFF, SFF.gz or SFF.zst) under root folder. Only the folders with a new modification time are listed again.
+# Like glob, hidden files and folders are ignored. Symbolic links to folders are not followed.
+def load_stored_spool(dbase, root, rebuild=False):
+    root = str(Path(root))
+    under_root = lambda column: (column == root) | column.startswith(os.path.join(root, ''), autoescape=True)
+    try:
+        if rebuild:
+            dbase.orm_ses.query(StoredSpoolFolder).filter(under_root(StoredSpoolFolder.path))\
+                .delete(synchronize_session='fetch')
+        folders = {path: (parent, mtime) for path, parent, mtime in dbase.orm_ses.query(
+            StoredSpoolFolder.path, StoredSpoolFolder.parent, StoredSpoolFolder.mtime).filter(
+            under_root(StoredSpoolFolder.path)).all()}
+        children = {}
+        for path, (parent, _) in folders.items():
+            children.setdefault(parent, []).append(path)
+
+        seen, stack = set(), [(root, '')]
+        while stack:
+            folder, parent = stack.pop()
+            try:
+                mtime = os.stat(folder).st_mtime_ns
+            except OSError:
+                continue
+            seen.add(folder)
+            if folders.get(folder, (None, None))[1] == mtime:
+                stack.extend((child, folder) for child in children.get(folder, []))
+                continue
+            if not (record := dbase.get(StoredSpoolFolder, path=folder)):
+                dbase.add(record := StoredSpoolFolder(folder, parent))
+            dbase.orm_ses.query(StoredSpool).filter(StoredSpool.folder == folder).delete(synchronize_session=False)
+            dbase.flush()
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, folder))
+                    elif (name := uncompressed_name(entry.name)).endswith('.SFF') and entry.is_file():
+                        dbase.add(StoredSpool(entry.path, name[:-4], folder, entry.stat().st_mtime_ns))
+            record.mtime = mtime
+        # Remove folders that do not exist anymore. Their spool files are deleted in cascade
+        if removed := [path for path in folders if path not in seen]:
+            dbase.orm_ses.query(StoredSpoolFolder).filter(StoredSpoolFolder.path.in_(removed))\
+                .delete(synchronize_session=False)
+        dbase.commit()
+        return True
+    except Exception as e:
+        dbase.rollback()
+        app.notify('Spool index failed', f'{root}\n{str(e)}\n{traceback.format_exc()}')
+        return False
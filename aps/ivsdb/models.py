@@ -317,3 +317,53 @@ class MasterFile(Base):
 
     code = Column('code', String(100), primary_key=True, unique=True)
     updated = Column('updated', DateTime, nullable=True)
+
+
+class StoredSpoolFolder(Base):
+    """ Folders of the stored spool files with their modification time (ns) """
+
+    __tablename__ = 'stored_spool_folders'
+
+    path = Column('path', String(500), primary_key=True, unique=True)
+    parent = Column('parent', String(500), nullable=False, server_default='', index=True)
+    mtime = Column('mtime', BigInteger, nullable=False, server_default='0')
+
+    def __init__(self, path, parent, mtime=0):
+        self.path, self.parent, self.mtime = path, parent, mtime
+
+    def __repr__(self):
+        return f'StoredSpoolFolder({self.path}, {self.mtime})'
+
+
+class StoredSpool(Base):
+    """ Stored spool files (SFF) indexed by db_name """
+
+    __tablename__ = 'stored_spools'
+
+    path = Column('path', String(500), primary_key=True, unique=True)
+    db_name = Column('db_name', String(25), nullable=False, index=True)
+    folder = Column('folder', String(500), ForeignKey(StoredSpoolFolder.path, ondelete='CASCADE'), nullable=False,
+                    index=True)
+    mtime = Column('mtime', BigInteger, nullable=False, server_default='0')
+
+    def __init__(self, path, db_name, folder, mtime):
+        self.path, self.db_name, self.folder, self.mtime = path, db_name, folder, mtime
+
+    def __repr__(self):
+        return f'StoredSpool({self.db_name}, {self.path})'
+
+
+class ScheduleFingerprint(Base):
+    """ Fingerprint (sha256 hex digest) of the schedule used for a session """
+
+    __tablename__ = 'schedule_fingerprints'
+
+    session = Column('session', String(15), ForeignKey(Session.code, ondelete='CASCADE'), primary_key=True)
+    fingerprint = Column('fingerprint', String(64), nullable=False, server_default='')
+    updated = Column('updated', TIMESTAMP, server_default=text('CURRENT_TIMESTAMP'))
+
+    def __init__(self, session, fingerprint=''):
+        self.session, self.fingerprint = session, fingerprint
+
+    def __repr__(self):
+        return f'ScheduleFingerprint({self.session}, {self.fingerprint})'
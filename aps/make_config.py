@@ -26,6 +26,19 @@ class Config(QMainWindow):
                             "fringe amplitude", "please download", "ftp:"],
                   'exact': ["g code", "s-band", "x-band", "transfer rate:"]
                   }
+    # Optional settings (default used by application when not set). They are not edited by this helper and only the
+    # settings of the loaded file are saved
+    #   spool_compression: compression (gz or zst) of spool files stored by STANDALONE (default empty is not compressed)
+    #   spool_cache: keep decoded spool files in cache_dir/spool (default true)
+    #   spool_parallel_runs: decode runs in process pool when spool has this number of runs (0 is never, default 500)
+    #   spool_workers: maximum number of processes decoding runs of spool (0 is number of cpus, default)
+    #   cache_dir: folder of cached spool files and schedules (default ~/.cache/aps)
+    #   vgosdb_cache_mb: size (MB) of cache of decoded vgosDB variables (0 is no cache, default 256)
+    #   vgosdb_prefetch_workers: number of threads reading vgosDB files in advance (0 or 1 is no prefetch, default 8)
+    #   max_obs_chunk: maximum number of vgosDB observations read at once (0 is all observations, default)
+    #   schedule_cache: keep parsed schedules in cache_dir/schedule (default true)
+    settings = ('spool_compression', 'spool_cache', 'spool_parallel_runs', 'spool_workers', 'cache_dir',
+                'vgosdb_cache_mb', 'vgosdb_prefetch_workers', 'max_obs_chunk', 'schedule_cache')
 
     def __init__(self, agency, path):
 
@@ -208,8 +221,10 @@ class Config(QMainWindow):
                                               "Config files (*.conf);;Text Files (*.txt);;All Files (*)")
 
         if file:
+            settings = {name: self.options[name] for name in self.settings if name in self.options}
             self.options = {name: widget.currentText() if isinstance(widget, QComboBox) else widget.text()
                             for name, widget in self.widgets.items()}
+            self.options.update(settings)
             if 'CorrNotes' not in self.options:
                 self.options['CorrNotes'] = self.corr_notes
             with open(file, 'w') as file:
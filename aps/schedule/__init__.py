@@ -1,6 +1,19 @@
+import os
+import gc
+import copy
+import pickle
+import hashlib
+from pathlib import Path
+from collections import OrderedDict
+
+from aps.utils import app
 from aps.schedule.skd import SKD
 from aps.schedule.vex import VEX
-from collections import OrderedDict
+
+# Version of cached schedule format. Cached files with other version are not used
+cache_version = 3
+# Parsed schedules of this process keyed by path with size and mtime of file
+_parsed, _max_parsed = OrderedDict(), 8
 
 
 def sched_reader(session, vex_first=False):
@@ -14,12 +27,80 @@ def sched_reader(session, vex_first=False):
     return SKD('')
 
 
-def get_schedule(session, vex_first=False, VieSched_sort=False):
-    with sched_reader(session, vex_first) as sched:
-        if sched.valid:
+# Key of parsed schedule using content of file, reader and sort option
+def schedule_key(path, cls, VieSched_sort):
+    key = hashlib.md5(f'{cache_version} {cls.__name__} {VieSched_sort} '.encode('utf-8'))
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            key.update(chunk)
+    return key.hexdigest()
+
+
+# Path of cached schedule in cache folder. Return None if cache is not used (schedule_cache = false)
+def schedule_cache_path(path, key):
+    if getattr(app, 'schedule_cache', True) and (folder := app.cache_folder('schedule')):
+        return Path(folder, f'{Path(path).name}-{key}.pkl')
+    return None
+
+
+# Copy of parsed schedule sharing its scan arrays. Records and counts modified by callers are not shared
+def schedule_copy(sched):
+    sched = copy.copy(sched)
+    sched.missed = []
+    return sched
+
+
+# Parse schedule file or get it from cache. Returned schedule is a copy of the one kept in memory
+def read_schedule(sched, VieSched_sort=False):
+    path, cls = str(sched.path), type(sched)
+    info = os.stat(path)
+    stamp = (info.st_size, info.st_mtime_ns, cls.__name__, VieSched_sort)
+    if (parsed := _parsed.get(path)) and parsed[0] == stamp:
+        _parsed.move_to_end(path)
+        return schedule_copy(parsed[1])
+    cached, cache = None, schedule_cache_path(path, schedule_key(path, cls, VieSched_sort))
+    if cache and cache.exists():
+        # Garbage collection is disabled while loading the many small dicts of scans and observations
+        enabled = gc.isenabled()
+        try:
+            gc.disable()
+            with open(cache, 'rb') as file:
+                cached = pickle.load(file)
+        except Exception:
+            pass
+        finally:
+            if enabled:
+                gc.enable()
+    if cached:
+        sched = cached
+    else:
+        with sched:
             sched.read(VieSched_sort)
-            for sta in session.removed:
-                if (sta := sta.capitalize()) in sched.stations['codes']:
-                    sched.missed.append(sched.stations['codes'][sta]['name'])
+        if cache:
+            try:
+                with open(tmp := Path(f'{cache}.{os.getpid()}'), 'wb') as file:
+                    pickle.dump(sched, file, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, cache)
+            except Exception:
+                pass
+    _parsed[path] = (stamp, sched)
+    while len(_parsed) > _max_parsed:
+        _parsed.popitem(last=False)
+    return schedule_copy(sched)
+
+
+def get_schedule(session, vex_first=False, VieSched_sort=False):
+    sched = sched_reader(session, vex_first)
+    if sched.valid:
+        sched = read_schedule(sched, VieSched_sort)
+        for sta in session.removed:
+            if (sta := sta.capitalize()) in sched.stations['codes']:
+                sched.missed.append(sched.stations['codes'][sta]['name'])
 
     return sched
+
+
+# Compare fingerprint of schedule with the one stored in database for the session. New fingerprint is stored.
+# Return None if session is not in database.
+def schedule_changed(session, sched):
+    return app.get_dbase().update_schedule_fingerprint(session.code, sched.fingerprint.hex())
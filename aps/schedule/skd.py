@@ -1,59 +1,107 @@
 import os, re
+import copy
+import hashlib
 from collections import OrderedDict
+from collections.abc import Mapping
 import string
 from operator import itemgetter
-from datetime import timedelta
+
+import numpy as np
 
 from aps.utils.utctime import utc
 from aps.utils.files import TEXTfile
 
 
+# Scan read from schedule file. Durations of stations are keyed by station code (key for sked files)
+class Scan:
+    __slots__ = ('name', 'source', 'start', 'durations')
+
+    def __init__(self, name, source, start, durations=None):
+        self.name, self.source, self.start, self.durations = name, source, start, durations or {}
+
+
+# Read-only view of the scans of a station or a source. Scans are the dict views of the schedule
+class ScanView(Mapping):
+    __slots__ = ('sched', 'kind', 'key')
+
+    def __init__(self, sched, kind, key):
+        self.sched, self.kind, self.key = sched, kind, key
+
+    def __getitem__(self, name):
+        if name not in self.sched.scans_of(self.kind, self.key):
+            raise KeyError(name)
+        return self.sched.scans[name]
+
+    def __iter__(self):
+        return iter(self.sched.scans_of(self.kind, self.key))
+
+    def __len__(self):
+        return len(self.sched.scans_of(self.kind, self.key))
+
+    def __contains__(self, name):
+        return name in self.sched.scans_of(self.kind, self.key)
+
+    def __repr__(self):
+        return f'ScanView({self.kind} {self.key}: {len(self)} scans)'
+
+
 class SKD(TEXTfile):
     def __init__(self, path):
         super().__init__(path)
         self.scheduling_software, self.session_code = 'SKED', ''
         self.stations = {'names': {}, 'codes': {}, 'keys': {}, 'removed': []}
-        self.sources, self.scans = {}, {}
-        self.observations, self.baselines = OrderedDict(), OrderedDict()
-        self.obs_list = []
+        self.sources, self.baselines = {}, OrderedDict()
         self.scheduled_obs = 0
         self.missed = []
         self.valid = os.path.exists(path)
         self.correlator = self.start = self.end = None
         self.errors, self.warnings = [], []
-
+        # Scans are rows of arrays with name, start time and source index. Durations of stations (columns) are
+        # in a matrix with -1 for stations not in scan. Observations are arrays of scan, fr and to indices.
+        self.scan_index, self.scan_starts, self.station_index, self.source_index = [], [], [], []
+        self.scan_sources = np.zeros(0, dtype=np.intp)
+        self.durations = np.zeros((0, 0), dtype=np.int32)
+        self.obs_scan = self.obs_fr = self.obs_to = np.zeros(0, dtype=np.int32)
+        # Dict views of scans and observations are made when needed
+        self._views = {}
+        # Digest (sha256) of scans independent of file format and scan names
+        self.fingerprint = b''
+
+    # Dict views are not saved
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_views', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._views = {}
+
+    # Copy sharing the scan arrays that are never modified in place. Station and source records, baselines and lists
+    # are copied so that the copy could be modified without changing this schedule. Views are made for the copy.
+    def __copy__(self):
+        other, records = self.__class__.__new__(self.__class__), {}
+
+        def clone(record):  # Same record could be in codes, names and keys dicts
+            if id(record) not in records:
+                records[id(record)] = {key: copy.deepcopy(value) for key, value in record.items() if key != 'scans'}
+            return records[id(record)]
+
+        other.__dict__.update(self.__getstate__())
+        other.stations = {key: {name: clone(sta) for name, sta in info.items()} if isinstance(info, dict)
+                          else copy.copy(info) for key, info in self.stations.items()}
+        other.sources = {name: clone(src) for name, src in self.sources.items()}
+        other.baselines = OrderedDict(self.baselines)
+        other.missed, other.errors, other.warnings = list(self.missed), list(self.errors), list(self.warnings)
+        other._views = {}
+        other.bind_records()
+        return other
+
+    # Schedules are the same if they have same session code, same scans (fingerprint) and same number of observations.
+    # Number of observations is different when stations have been removed.
     def __eq__(self, other):
-        if self.session_code != other.session_code or \
-                self.scheduled_obs != other.scheduled_obs or \
-                len(self.observations) != len(other.observations):
-            return False
-
-        def is_same(first, second):
-
-            if isinstance(first, dict):
-                if len(first) != len(second):
-                    return False
-                for (k1, v1), (k2, v2) in zip(first.items(), second.items()):
-                    if k1 != k2 or not is_same(v1, v2):
-                        return False
-            if isinstance(first, list):
-                if len(first) != len(second):
-                    return False
-                for one, two in zip(first, second):
-                    if not is_same(one, two):
-                        return False
-            elif first != second:
-                return False
-            return True
-
-        # Check if same observations
-        for (skd, skd_obs), (vex, vex_obs) in zip(self.observations.items(), other.observations.items()):
-            if skd != vex:
-                return False
-            for (skd_key, skd_data), (vex_key, vex_data) in zip(skd_obs.items(), vex_obs.items()):
-                if skd_key != vex_key or not is_same(skd_data, vex_data):
-                    return False
-        return True
+        return self.session_code == other.session_code and self.scheduled_obs == other.scheduled_obs and \
+            self.fingerprint == other.fingerprint
 
     @property
     def is_vex(self):
@@ -89,15 +137,13 @@ class SKD(TEXTfile):
         info = line.split()
         start = utc(skd=info[4])
         name = start.strftime('%j-%H%M')
-        scan = SKD.init_scan(name, info[0], start)
         # Extract stations
-        scan['ids'] = {}
         n = int(len(info[9]) / 2)
         if int(n * 2) != len(info[9]):
             self.warnings.add(f'Problem with scan {info[0]} {info[4]}')
             return
-        scan['ids'] = {k: int(info[i]) for i, k in enumerate(info[9][::2], 11+n)}
-        self.scans[name].append(scan) if name in self.scans else self.scans.update({name: [scan]})
+        scan = Scan(name, info[0], start, {k: int(info[i]) for i, k in enumerate(info[9][::2], 11+n)})
+        self.sked.setdefault(name, []).append(scan)
 
     # Read skd file ans extract information
     def read(self, VieSched_sort=False):
@@ -114,6 +160,7 @@ class SKD(TEXTfile):
         # Decode session code
         self.session_code = self.line.split()[1].lower()
         # Decode all sections
+        self.sked = {}
         while self.has_next():
             if not (line := self.line) or line.startswith('*'):  # Empty line or comment
                 continue
@@ -124,133 +171,192 @@ class SKD(TEXTfile):
 
         # Order scans by time and source name
         sort_source = not (VieSched_sort and self.scheduling_software == 'VieSched++')
-        scans, self.scans = dict(sorted(self.scans.items())), OrderedDict()
-        for name, scan in scans.items():
-            if len(scan) == 1:
-                end = self.add_scan(scan[0])
-            else:
-                scan = sorted(scan, key=lambda i: (i['start'], i['source'])) if sort_source else \
-                    sorted(scan, key=lambda i: i['start'])
-                for index, rec in zip(string.ascii_lowercase, scan):
-                    rec['name'] = f'{rec["name"]}{index}'
-                    end = self.add_scan(rec)
-        if not hasattr(self, 'end'):
-            self.end = end
-
+        scans, keys = OrderedDict(), self.stations['keys']
+        for name, records in sorted(self.sked.items()):
+            if len(records) > 1:
+                records = sorted(records, key=lambda i: (i.start, i.source)) if sort_source else \
+                    sorted(records, key=lambda i: i.start)
+                for index, scan in zip(string.ascii_lowercase, records):
+                    scan.name = f'{scan.name}{index}'
+            for scan in records:
+                if scan.name in scans:
+                    self.warnings.append(f'duplicate scan {scan.name}')
+                scan.durations = {keys[key]['code']: duration for key, duration in scan.durations.items()
+                                  if key in keys}
+                scans[scan.name] = scan
+        del self.sked
+
+        self.set_scans(list(scans.values()))
+
+    # Make arrays of scans and observations
+    def set_scans(self, scans):
+        self.station_index = sorted(self.stations['codes'])
+        column = {code: col for col, code in enumerate(self.station_index)}
+        self.source_index = list(dict.fromkeys(scan.source for scan in scans))
+        index = {name: row for row, name in enumerate(self.source_index)}
+        self.scan_index, self.scan_starts = [scan.name for scan in scans], [scan.start for scan in scans]
+        self.scan_sources = np.array([index[scan.source] for scan in scans], dtype=np.intp)
+        cells = [(row, column[code], duration) for row, scan in enumerate(scans)
+                 for code, duration in scan.durations.items() if code in column]
+        self.durations = np.full((len(scans), len(self.station_index)), -1, dtype=np.int32)
+        if cells:
+            rows, cols, durations = np.array(cells).T
+            self.durations[rows, cols] = durations
+        self.make_observations()
+        self.make_fingerprint()
+        self.bind_records()
         self.set_first_sources()
         self.count_observations()
 
-    def add_scan(self, scan):
-        if not hasattr(self, 'start'):
-            self.start = scan['start']
-
-        # Add scan to scans
-        name = scan['name']
-        if name in self.scans:
-            self.warnings.append(f'duplicate scan {name}')
-        self.scans[name] = scan;
-
-        scan_duration = 0
-        for key, duration in scan['ids'].items():
-            if key in self.stations['keys']:
-                scan_duration = max(duration, scan_duration)
-                code = self.stations['keys'][key]['code']
-                scan['station_codes'][code] = {'duration': duration}
-                self.stations['codes'][code]['scans'][name] = scan
-        scan.pop('ids')
-        scan['station_codes'] = OrderedDict(sorted(scan['station_codes'].items()))
-
-        # Update sources dict
-        source = scan['source']
-        if source not in self.observations:
-            self.observations[source] = {}
-        src = self.observations[source]
-        for fr in scan['station_codes']:
-            if fr not in src:
-                src[fr] = {}
-            for to in scan['station_codes']:
-                if fr < to:
-                    if to not in src[fr]:
-                        src[fr][to] = []
-                    obs = SKD.init_obs(scan, fr, to)
-                    src[fr][to].append(obs)
-                    self.obs_list.append(obs)
-
-        return scan['start'] + timedelta(seconds=scan_duration)
+    # Scans of station and source records are views of this schedule
+    def bind_records(self):
+        for code, sta in self.stations['codes'].items():
+            sta['scans'] = ScanView(self, 'station', code)
+        for name, src in self.sources.items():
+            src['scans'] = ScanView(self, 'source', name)
+
+    # Observations are all pairs of stations (in order of station codes) of each scan.
+    # Arrays are read-only since they are shared by copies of the schedule.
+    def make_observations(self):
+        incidence = self.incidence
+        fr, to = np.triu_indices(len(self.station_index), k=1)
+        rows, pairs = np.nonzero(incidence[:, fr] & incidence[:, to])
+        self.obs_scan, self.obs_fr, self.obs_to = [index.astype(np.int32) for index in (rows, fr[pairs], to[pairs])]
+        for array in (self.durations, self.scan_sources, self.obs_scan, self.obs_fr, self.obs_to):
+            array.setflags(write=False)
+        self._views = {}
+
+    # Canonical fingerprint of schedule. Scans are hashed by start time and source with durations of their stations.
+    # Scan names are not used so that skd and vex files of the same session have the same fingerprint.
+    def make_fingerprint(self):
+        digest, codes = hashlib.sha256(), self.station_index
+        starts = [start.strftime('%Y-%m-%dT%H:%M:%S') for start in self.scan_starts]
+        sources = [self.source_index[src] for src in self.scan_sources.tolist()]
+        durations = self.durations.tolist()
+        for row in sorted(range(len(starts)), key=lambda row: (starts[row], sources[row])):
+            stations = ' '.join(f'{codes[col]}:{duration}' for col, duration in enumerate(durations[row])
+                                if duration >= 0)
+            digest.update(f'{starts[row]} {sources[row]} {stations}\n'.encode('utf-8'))
+        self.fingerprint = digest.digest()
+
+    # Boolean matrix of scans (rows) by stations (columns)
+    @property
+    def incidence(self):
+        return self.durations >= 0
+
+    # Dict of scan records. Durations are in station_codes dict
+    @property
+    def scans(self):
+        if 'scans' not in self._views:
+            codes, sources = self.station_index, self.source_index
+            self._views['scans'] = OrderedDict(
+                (name, {'name': name, 'source': sources[src], 'start': start,
+                        'station_codes': {codes[col]: {'duration': duration}
+                                          for col, duration in enumerate(durations) if duration >= 0}})
+                for name, start, src, durations in zip(self.scan_index, self.scan_starts, self.scan_sources.tolist(),
+                                                       self.durations.tolist()))
+        return self._views['scans']
+
+    # Observation record using scan record
+    def observation(self, index):
+        scan = self.scans[self.scan_index[self.obs_scan[index]]]
+        return SKD.init_obs(scan, self.station_index[self.obs_fr[index]], self.station_index[self.obs_to[index]])
+
+    # List of observation records
+    @property
+    def obs_list(self):
+        if 'obs_list' not in self._views:
+            scans, codes = list(self.scans.values()), self.station_index
+            self._views['obs_list'] = [SKD.init_obs(scans[row], codes[fr], codes[to]) for row, fr, to in
+                                       zip(self.obs_scan.tolist(), self.obs_fr.tolist(), self.obs_to.tolist())]
+        return self._views['obs_list']
+
+    # Observation records by source, fr and to stations
+    @property
+    def observations(self):
+        if 'observations' not in self._views:
+            observations = OrderedDict()
+            for scan in self.scans.values():
+                src = observations.setdefault(scan['source'], {})
+                for fr in scan['station_codes']:
+                    src.setdefault(fr, {})
+            for obs in self.obs_list:
+                observations[obs['scan']['source']][obs['fr']].setdefault(obs['to'], []).append(obs)
+            self._views['observations'] = observations
+        return self._views['observations']
+
+    # Names of scans (with row) for a station code or a source name
+    def scans_of(self, kind, key):
+        if (kind, key) not in self._views:
+            if kind == 'station':
+                col = self.station_index.index(key) if key in self.station_index else -1
+                rows = np.flatnonzero(self.durations[:, col] >= 0) if col >= 0 else []
+            else:
+                src = self.source_index.index(key) if key in self.source_index else -1
+                rows = np.flatnonzero(self.scan_sources == src) if src >= 0 else []
+            self._views[(kind, key)] = {self.scan_index[row]: row for row in np.asarray(rows).tolist()}
+        return self._views[(kind, key)]
 
     def set_first_sources(self):
         # Set first sources
+        present = self.incidence
         for code, sta in self.stations['codes'].items():
-            if len(sta['scans']) > 0:
-                sta['first_source'] = list(sta['scans'].values())[0]['source']
+            if code in self.station_index and (rows := np.flatnonzero(present[:, self.station_index.index(code)])).size:
+                sta['first_source'] = self.source_index[self.scan_sources[rows[0]]]
 
+    # Count observations of stations, baselines and sources using incidence matrix
     def count_observations(self):
-        # Count observations for stations
-        scheduled = 0
+        matrix = self.incidence.astype(np.int64)
+        per_scan = matrix.sum(axis=1)
+        pairs = per_scan * (per_scan - 1) // 2
+
+        # Count observations for stations. Each station of a scan observes with all others
+        by_station = dict(zip(self.station_index, (matrix.T @ (per_scan - 1)).tolist()))
         for code, sta in self.stations['codes'].items():
-            nbr_obs = 0
-            for scan in sta['scans'].values():
-                nbr_obs += len(scan['station_codes']) - 1
-            sta['scheduled_obs'] = nbr_obs
-            scheduled += nbr_obs
-        self.scheduled_obs = int(scheduled / 2)
+            sta['scheduled_obs'] = by_station.get(code, 0)
+        self.scheduled_obs = int(pairs.sum())
 
         # Count observations for sources
+        counts = np.bincount(self.scan_sources, weights=pairs, minlength=len(self.source_index)).astype(int)
+        by_source = dict(zip(self.source_index, counts.tolist()))
         for name, src in self.sources.items():
-            if name in self.observations:
-                obs = self.observations[name]
-                nbr_obs = 0
-                for fr, info in obs.items():
-                    for to, scans in info.items():
-                        nbr_obs += len(scans)
-                src['scheduled_obs'] += nbr_obs
-
-        # Count observations for baselines
-        names = sorted(self.stations['names'].keys())
-        for index, fr in enumerate(names):
-            sta = self.stations['names'][fr]
-            for to in names[index+1:]:
-                nbr_obs = 0
-                code = self.stations['names'][to]['code']
-                for scan in sta['scans'].values():
-                    if code in scan['station_codes']:
-                        nbr_obs += 1
-                self.baselines[f'{fr}-{to}'] = nbr_obs
+            src['scheduled_obs'] = by_source.get(name, 0)
 
+        # Count observations for baselines (number of scans with both stations)
+        common, column = matrix.T @ matrix, {code: col for col, code in enumerate(self.station_index)}
+        names = sorted(self.stations['names'].keys())
+        columns = [column.get(self.stations['names'][name]['code'], -1) for name in names]
+        self.baselines = OrderedDict((f'{fr}-{to}', int(common[col_fr, col_to]) if min(col_fr, col_to) >= 0 else 0)
+                                     for index, (fr, col_fr) in enumerate(zip(names, columns))
+                                     for to, col_to in zip(names[index+1:], columns[index+1:]))
+
+    # Code of station name. TIGO could be used for any TIGO station name
+    def get_station_code(self, name):
+        if name in self.stations['names']:
+            return self.stations['names'][name]['code']
+        elif name.startswith('TIGO') and 'TIGO' in self.stations['names']:
+            return self.stations['names']['TIGO']['code']
+        return ''
+
+    # Remove stations from scans. Columns of stations are removed from duration matrix and scans of these stations
+    # with less than 2 stations are removed.
     def remove_stations(self, stations):
-        for name in stations:
-            sta_code = ''
-            if name in self.stations['names']:
-                sta_code = self.stations['names'][name]['code']
-            elif name.startswith('TIGO') and 'TIGO' in self.stations['names']:
-                sta_code = self.stations['names']['TIGO']['code']
-
-            if sta_code:
-                for scan_name in list(self.scans.keys()):
-                    sta_lst = self.scans[scan_name]['station_codes']
-                    if sta_code in sta_lst:
-                        sta_lst.pop(sta_code)
-                        if len(sta_lst) == 1:
-                            sta = list(sta_lst.keys())[0]
-                            self.stations['codes'][sta]['scans'].pop(scan_name)
-                            self.scans.pop(scan_name)
-                        self.stations['codes'][sta_code]['scans'].pop(scan_name)
+        codes = {code for name in stations if (code := self.get_station_code(name))}
+        if columns := [col for col, code in enumerate(self.station_index) if code in codes]:
+            rows = np.flatnonzero((self.durations[:, columns] >= 0).any(axis=1))
+            self.durations = np.delete(self.durations, columns, axis=1)
+            self.station_index = [code for code in self.station_index if code not in codes]
+            if (empty := rows[(self.durations[rows] >= 0).sum(axis=1) < 2]).size:
+                keep = np.ones(len(self.scan_index), dtype=bool)
+                keep[empty] = False
+                self.durations, self.scan_sources = self.durations[keep], self.scan_sources[keep]
+                self.scan_index = [name for name, ok in zip(self.scan_index, keep.tolist()) if ok]
+                self.scan_starts = [start for start, ok in zip(self.scan_starts, keep.tolist()) if ok]
+            self.make_observations()
 
         self.count_observations()
         return self.scheduled_obs
 
-    def make_observations(self):
-        observations = {}
-        for name, scan in self.scans.items():
-            stations = list(scan['station_codes'].keys())
-            for i in range(0, len(stations) - 1):
-                for j in range(i + 1, len(stations)):
-                    obs = SKD.init_obs(scan, stations[i], stations[j])
-                    observations['{}-{}-{}'.format(name, stations[i], stations[j])] = obs
-                    observations['{}-{}-{}'.format(name, stations[j], stations[i])] = obs
-
-        self.observations = observations
-
     def get_nbr_scans(self, id):
         return len(self.stations['codes'][id.capitalize()]['scans'])
 
@@ -298,14 +404,14 @@ class SKD(TEXTfile):
 
     @staticmethod
     def init_sta(code='', name='', key=''):
-        return {'name': name, 'code': code, 'key': key, 'first_source': '', 'scans': OrderedDict(),
+        return {'name': name, 'code': code, 'key': key, 'first_source': '', 'scans': {},
                 'scheduled': 0, 'scheduled_obs': 0, 'correlated': 0, 'used': 0, 'dropped': '', 'Dropped': '',
                 'X': SKD.init_band(8), 'S': SKD.init_band(6), 'antenna': {}}
 
     @staticmethod
     def init_src(code='', name=''):
         name = code if name == '$' else name
-        return {'name': name, 'code': code, 'scheduled_obs': 0, 'scans': OrderedDict(), 'obs': {}}
+        return {'name': name, 'code': code, 'scheduled_obs': 0, 'scans': {}, 'obs': {}}
 
     @staticmethod
     def init_scan(name, source, start):
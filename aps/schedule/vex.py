@@ -1,7 +1,14 @@
+import re
 from collections import OrderedDict, defaultdict
 
 from aps.utils.utctime import utc
-from aps.schedule.skd import SKD
+from aps.schedule.skd import SKD, Scan
+
+
+# Blocks used to extract schedule information. Other blocks are skipped without decoding their records
+used_blocks = frozenset(['EXPER', 'STATION', 'SITE', 'SOURCE', 'SCHED'])
+# Split statement (ref $key = value or key = value:value...) in key and value
+statement = re.compile(r'(?P<ref>ref\s+\$)?(?P<key>[^=\s]+)\s*=\s*(?P<value>[^=\s](?:[^=]*[^=\s])?)?').match
 
 
 def decode_vex_value(param, row=0, col=0):
@@ -13,42 +20,44 @@ class VEX(SKD):
     def __init__(self, path):
         super().__init__(path)
 
-    def read(self, VieSched_sort=False):
-
+    # Read records of used blocks
+    def read_blocks(self):
         blocks = defaultdict(dict)
         block, literal = '', False
-
-        if not self.has_next() or not self.line.strip().startswith('VEX_rev'):
-            print(f'{self.path} not a VEX file! Check first line.')
-            return
-
         while self.has_next():
+            # Lines of skipped blocks are only checked for new block or literal
+            if not block and '$' not in self.line and 'literal' not in self.line:
+                continue
             for part in self.line.strip().split(';'):
-                if not (part := part.strip()) or part.startswith('*'):
-                    continue
-                if part.startswith('end_literal'):
-                    literal = False
-                elif literal:
+                if not (part := part.strip()) or part[0] == '*':
                     continue
+                if literal:
+                    literal = not part.startswith('end_literal')
+                elif '=' in part:  # Parameter or reference
+                    if block and (info := statement(part)):
+                        if info['ref']:
+                            record['ref'][info['key']].append(info['value'] or '')
+                        else:
+                            record.setdefault(info['key'], []).append((info['value'] or '').split(':'))
+                elif part[0] == '$':
+                    block = part[1:] if part[1:] in used_blocks else ''
                 elif part.startswith('start_literal'):
                     literal = True
-                elif part.startswith('$'):
-                    block = part[1:]
+                elif not block:
+                    continue
                 elif part.startswith('enddef') or part.startswith('endscan'):
                     blocks[block][record['code']] = record
                 elif part.startswith('def ') or part.startswith('scan '):
                     record = {'code': part.split()[1], 'ref': defaultdict(list)}
-                elif part.startswith('ref '):
-                    key = (info := part[3:].split('='))[0].strip()[1:]
-                    if block == 'GLOBAL':
-                        blocks[block][key] = info[1].strip()
-                    else:
-                        record['ref'][key].append(info[1].strip())
-                elif '=' in part:
-                    if (key := (info := part.split('='))[0].strip()) not in record:
-                        record[key] = []
-                    record[key].append(info[1].strip().split(':'))
+        return blocks
+
+    def read(self, VieSched_sort=False):
+
+        if not self.has_next() or not self.line.strip().startswith('VEX_rev'):
+            print(f'{self.path} not a VEX file! Check first line.')
+            return
 
+        blocks = self.read_blocks()
         # Keep EXPER information
         for code, record in blocks['EXPER'].items():
             if 'exper_name' in record:
@@ -69,55 +78,22 @@ class VEX(SKD):
         for record in blocks['SOURCE'].values():
             name, code = decode_vex_value(record['source_name']), record['code']
             self.sources[name] = SKD.init_src(code, name)
-        # Keep scans self.data
+        # Keep scans
+        scans = []
         for record in blocks['SCHED'].values():
             code = decode_vex_value(record['source'])
             source = decode_vex_value(blocks['SOURCE'][code]['source_name'])
             start = utc(vex=decode_vex_value(record['start']))
             self.start = self.start if self.start else start
 
-            name = record['code'].lower()
-            scan = {'name': name, 'source': source, 'start': start, 'station_codes': {}}
-            self.sources[source]['scans'][name] = self.scans[name] = scan
-            nbr_obs = len(record['station']) - 1
-            self.scheduled_obs += int((nbr_obs * (nbr_obs + 1)) / 2)
+            scan = Scan(record['code'].lower(), source, start)
             for info in record['station']:
-                code = info[0].strip().capitalize()
                 start_rec, stop_rec = int(info[1].split()[0].strip()), int(info[2].split()[0].strip())
-                scan['station_codes'][code] = {'duration': stop_rec - start_rec}
-                sta = self.stations['codes'][code]
-                sta['scans'][name] = scan
-                sta['scheduled_obs'] += nbr_obs
-
-            scan['station_codes'] = dict(sorted(scan['station_codes'].items()))
-            src = self.sources[source]
-
-            for fr in scan['station_codes']:
-                if fr not in src:
-                    src[fr] = {}
-                for to in scan['station_codes']:
-                    if fr != to:
-                        if to not in src[fr]:
-                            src[fr][to] = []
-                        src[fr][to].append(scan)
-
-            if source not in self.observations:
-                self.observations[source] = {}
-            src = self.observations[source]
-            for fr in scan['station_codes']:
-                if fr not in src:
-                    src[fr] = {}
-                for to in scan['station_codes']:
-                    if fr < to:
-                        if to not in src[fr]:
-                            src[fr][to] = []
-                        obs = SKD.init_obs(scan, fr, to)
-                        src[fr][to].append(obs)
-                        self.obs_list.append(obs)
+                scan.durations[info[0].strip().capitalize()] = stop_rec - start_rec
+            scans.append(scan)
 
         self.end = self.end if self.end else start
-        self.set_first_sources()
-        self.count_observations()
+        self.set_scans(scans)
 
         return
 
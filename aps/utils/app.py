@@ -114,5 +114,15 @@ def folder(dir_name):
     return os.environ.get(dir_name, '')
 
 
+# Get folder (cache_dir in config file) used to store cached data. Return None if folder cannot be created
+def cache_folder(*sub_dirs):
+    path = Path(globals().get('cache_dir', Path(Path.home(), '.cache', 'aps')), *sub_dirs).expanduser()
+    try:
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+    except OSError:
+        return None
+
+
 
 
@@ -1,10 +1,17 @@
 from datetime import datetime
 import unicodedata
 import hashlib
+import gzip
+import io
 import os
 import re
 import stat
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 MasterTypes = {'-int': 'intensive', '-vgos': 'vgos', '': 'standard'}
 
 _is_master = re.compile(r'master(?P<year>\d{4}|\d{2})(?P<type>(|-int|-vgos))?.txt$').match
@@ -26,6 +33,53 @@ def make_dir(folder, uid, gid):
     os.chown(folder, uid, gid)
 
 
+# Suffixes of compressed files that are read transparently
+compressed_suffixes = ('.gz', '.zst')
+
+
+def is_compressed(path):
+    return str(path).endswith(compressed_suffixes)
+
+
+# Name of file without compression suffix
+def uncompressed_name(name):
+    return name[:-len(ext)] if (ext := os.path.splitext(name)[1]) in compressed_suffixes else name
+
+
+# Path of existing file or of its compressed archive. Return path if none exists
+def find_file(path):
+    paths = [path] + [path.with_name(path.name + ext) for ext in compressed_suffixes]
+    return next((path for path in paths if path.exists()), paths[0])
+
+
+def check_zstandard(path):
+    if zstandard is None:
+        raise ImportError(f'zstandard module is required for {os.path.basename(path)}')
+
+
+# Open file for reading in binary mode. Gzip and zstandard archives are decompressed while reading
+def open_binary(path):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if str(path).endswith('.zst'):
+        check_zstandard(path)
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True))
+    return open(path, 'rb')
+
+
+# Open text file for reading or writing ('r' or 'w'). Data is compressed or decompressed if path is an archive
+def open_text(path, mode='r', encoding='UTF-8', errors='surrogateescape'):
+    if mode == 'r' and is_compressed(path):
+        return io.TextIOWrapper(open_binary(path), encoding=encoding, errors=errors)
+    if str(path).endswith('.gz'):
+        return gzip.open(path, f'{mode}t', encoding=encoding, errors=errors)
+    if str(path).endswith('.zst'):
+        check_zstandard(path)
+        writer = zstandard.ZstdCompressor(level=10).stream_writer(open(path, 'wb'), closefd=True)
+        return io.TextIOWrapper(writer, encoding=encoding, errors=errors)
+    return open(path, mode, encoding=encoding, errors=errors)
+
+
 # Class to help reading text file
 class TEXTfile:
     encode_list = ['latin-1', 'UTF-8', 'ISO-8859-7', 'us-ascii']
@@ -41,7 +95,7 @@ class TEXTfile:
         self.line_nbr = 0
         # Try to read to test encoding
         try:
-            with open(path, encoding=self.encoding, errors="surrogateescape") as f:
+            with open_text(path, encoding=self.encoding) as f:
                 line = f.readline()
                 if TEXTfile.reg_cr.search(line):
                     self.EOL = -2  # DOS file with CRLF and end of line
@@ -53,7 +107,7 @@ class TEXTfile:
     def __enter__(self):
 
         if self.is_valid:
-            self.file = open(self.path, encoding=self.encoding, errors="surrogateescape")
+            self.file = open_text(self.path, encoding=self.encoding)
             self.line_nbr = 0
         return self
 
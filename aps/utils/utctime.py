@@ -4,6 +4,8 @@ import re
 import pytz
 import math
 
+import numpy as np
+
 UTC = pytz.utc
 
 FORMATS = {'spl': '%Y.%m.%d-%H:%M:%S.%f', 'sumry': '%y/%m/%d %H:%M:%S.%f', 'sked': '%Y%j%H%M%S',
@@ -123,3 +125,24 @@ def toDateTime(ymdhm, sec):
     dec, second = math.modf(sec)
     return UTC.localize(datetime(*ymdhm, int(second), int(dec * 1.0e6)))
 
+
+
+# Combine vgosdb YMDHM and Second arrays into datetime64[us] array. Two digits years are decoded like %y format
+def vgosdbEpochs(YMDHM, second):
+    ymdhm = np.asarray(np.ma.filled(YMDHM, 0), dtype=np.int64).reshape(-1, 5)
+    year = ymdhm[:, 0]
+    year = np.where(year < 69, year + 2000, np.where(year < 100, year + 1900, year))
+    days = ((year - 1970) * 12 + ymdhm[:, 1] - 1).astype('M8[M]').astype('M8[D]') + (ymdhm[:, 2] - 1)
+    minutes = ymdhm[:, 3] * 60 + ymdhm[:, 4]
+    microseconds = minutes * 60000000 + np.rint(np.ma.filled(second, 0.0).ravel() * 1.0e6).astype(np.int64)
+    return days.astype('M8[us]') + microseconds.astype('m8[us]')
+
+
+# Change datetime64 value into UTC datetime
+def epoch2utc(epoch):
+    return UTC.localize(np.datetime64(epoch, 'us').astype(datetime))
+
+
+# Change UTC datetime into datetime64[us]
+def utc2epoch(t):
+    return np.datetime64(UTC.normalize(t).replace(tzinfo=None) if t.tzinfo else t, 'us')
@@ -1,18 +1,23 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 from operator import attrgetter
-from pytz import UTC
 import os
 import re
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import numpy as np
 from netCDF4 import Dataset
 
 from aps.utils import app, bstr
 from aps.utils.files import TEXTfile
-from aps.utils.utctime import utc, vgosdbTime
-from aps.vgosdb.wrapper import Wrapper
+from aps.utils.utctime import utc, vgosdbEpochs, epoch2utc, utc2epoch
+from aps.vgosdb.wrapper import WrapperIndex
 from aps.vgosdb.correlator import CorrelatorReport
+from aps.vgosdb.statistics import compile_statistics
+from aps.vgosdb.matcher import CorrelationMatcher
+from aps.vgosdb.cache import VariableCache
+from aps.vgosdb.strings import decode_S1
+from aps.vgosdb.observations import ObservationTable
 
 
 get_db_name = re.compile('(?P<name>\d{2}[A-Z]{3}\d{2}[A-Z]{1,2}|\d{8}-[a-z0-9]{1,12}).*$').match
@@ -31,6 +36,20 @@ class VGOSdb:
     VGOS = 'vgos'
     Unknown = 'unknown'
 
+    # Variables (group, key, variable, is_str) needed to compile statistics and list observations
+    ReportVariables = [('Session', 'AtmSetup', 'AtmRateStationList', True),
+                       ('Session', 'ClockSetup', 'ReferenceClock', True),
+                       ('Session', 'ClockSetup', 'ClockRateConstraintStationList', True),
+                       ('Session', 'SelectionStatus', 'BaselineSelectionFlag', False),
+                       ('Observation', 'Baseline', 'Baseline', False),
+                       ('Observation', 'Source', 'Source', False),
+                       ('Observation', 'TimeUTC', 'YMDHMS', False),
+                       ('Observation', 'QualityCode_bX', 'QualityCode', False),
+                       ('Observation', 'QualityCode_bS', 'QualityCode', False),
+                       ('Observation', 'CorrInfo_bX', 'FRNGERR', False),
+                       ('Observation', 'CorrInfo_bS', 'FRNGERR', False),
+                       ('Observation', 'Edit', 'DelayFlag', False)]
+
     def __init__(self, folder):
         self._valid = False
         self.errors = []
@@ -39,6 +58,11 @@ class VGOSdb:
         self.program = self.session = self.exp_name = self.exp_desc = self.correlator = self.correlatorType = ''
         self.correlated = 0
         self.station_list, self.stations, self.sources = [], {}, []
+        # Cache of decoded variables
+        self.cache = VariableCache(float(getattr(app, 'vgosdb_cache_mb', 256)))
+        self.observations = None
+        # Maximum number of observations read at once (0 is reading all observations)
+        self.max_obs_chunk = int(getattr(app.args, 'max_obs_chunk', None) or getattr(app, 'max_obs_chunk', 0))
 
         # Variables for statistics
         self.stats = {}
@@ -58,6 +82,7 @@ class VGOSdb:
             return
 
         self._valid = True
+        self.wrapper_index = WrapperIndex(self.folder)
 
         # Find the oldest wrapper and retrieve processes and var_list
         self.wrapper = oldest = self.get_oldest_wrapper(reload=True)
@@ -71,6 +96,10 @@ class VGOSdb:
     # Set the wrapper that will be used by default
     def set_wrapper(self, wrapper):
         self.wrapper = wrapper
+        self.cache.invalidate()
+        self.observations = None
+        # Maximum number of observations read at once (0 is reading all observations)
+        self.max_obs_chunk = int(getattr(app.args, 'max_obs_chunk', None) or getattr(app, 'max_obs_chunk', 0))
 
     def is_valid(self):
         return self._valid
@@ -115,16 +144,9 @@ class VGOSdb:
             else:
                 self.correlated = self.get_numobs()
 
-    # Get list of wrappers in vgosdb directory
+    # Get list of wrappers in vgosdb directory. Unchanged wrappers are read from cache
     def get_wrappers(self):
-        self.wrappers = []
-        for filename in os.listdir(self.folder):
-            if filename.endswith('.wrp'):
-                path = os.path.join(self.folder, filename)
-                with Wrapper(path) as wrp:
-                    if wrp.version:
-                        wrp.read()
-                        self.wrappers.append(wrp)
+        self.wrappers = self.wrapper_index.read()
 
     def get_numobs(self):
         if (path := os.path.join(self.folder, 'Observables', 'TimeUTC.nc')) and os.path.exists(path):
@@ -139,29 +161,25 @@ class VGOSdb:
     def get_oldest_wrapper(self, reload=False):
         if reload:
             self.get_wrappers()
-        return sorted(self.wrappers, key=attrgetter('version', 'time_tag'))[-1]
+        return self.wrapper_index.oldest
 
     # Get last wrapper for this agency (GSFC):
     def get_last_wrapper(self, agency, reload=False):
         if reload:
             self.get_wrappers()
-        lst = sorted(filter(lambda x: x.agency == agency and x.subset == 'all', self.wrappers),
-                     key=attrgetter('version'))
-        return lst[-1] if lst else None
+        return self.wrapper_index.last.get(agency)
 
     # Get first wrapper for this agency (GSFC):
     def get_first_wrapper(self, agency, reload=False):
         if reload:
             self.get_wrappers()
-        lst = sorted(filter(lambda x: x.agency == agency, self.wrappers), key=attrgetter('version'))
-        return lst[0] if lst else None
+        return self.wrapper_index.first.get(agency)
 
     # Get V001 wrapper:
     def get_v001_wrapper(self, reload=False):
         if reload:
             self.get_wrappers()
-        lst = sorted(filter(lambda x: x.version == 'V001', self.wrappers), key=attrgetter('time_tag'))
-        return lst[0] if lst else None
+        return self.wrapper_index.v001
 
     # Read data base to extract session name and type
     def get_session_info(self):
@@ -261,39 +279,48 @@ class VGOSdb:
     def S1_string(self, data):
         return data.tostring().decode('utf-8').strip('\x00').strip()
 
-    # Change S1 variable or multi dimension S1 array in string
-    def cleanS1var(self, data, ndim):
-        return self.S1_string(data) if ndim < 1 else [self.cleanS1var(value, ndim - 1) for value in data]
-
     # Get variable data
     def get_variable(self, path, name, is_str=False):
         with Dataset(path, 'r') as nc:
-            if name not in nc.variables:
-                print(f'{name} not found')
-                return np.ma.core.MaskedArray([])
-            var = nc.variables[name]
-            data = var[:][0] if var.dimensions[0] == 'DimUnity' else var[:]
-            ndim = len(var.dimensions)
-            if 'REPEAT' in var.ncattrs():
-                data = [data] * var.getncattr('REPEAT')
-                ndim += 1
-            # Transform S1 arrays in STRING array
-            if is_str and var.dtype == 'S1':
-                data = self.cleanS1var(data, ndim - 1)
-            return np.ma.core.MaskedArray(data) if isinstance(data, list) else data
-
-    # Extract UTC time and combine YMDHM and Second in datetime variables
-    def get_utctime(self, path):
-        utc = []
+            return self.read_variable(nc, name, is_str)
+
+    # Read variable from open dataset. S1 arrays are decoded in array of strings when is_str is True.
+    # Only the rows (slice) of the first dimension are read when rows is given.
+    def read_variable(self, nc, name, is_str=False, rows=None):
+        if name not in nc.variables:
+            print(f'{name} not found')
+            return np.ma.core.MaskedArray([])
+        var = nc.variables[name]
+        repeat = var.getncattr('REPEAT') if 'REPEAT' in var.ncattrs() else 0
+        if var.dimensions[0] == 'DimUnity':
+            data = var[:][0]
+        else:
+            data = var[:] if rows is None or repeat else var[rows]
+        # Transform S1 arrays in STRING array
+        if is_str and var.dtype == 'S1':
+            data = np.ma.core.MaskedArray(decode_S1(data))
+        if repeat:
+            data = self.repeat(data, repeat if rows is None else len(range(repeat)[rows]))
+        return data
+
+    # Repeat data using read-only views with no copy of data
+    @staticmethod
+    def repeat(data, count):
+        shape = (int(count), *np.shape(data))
+        mask = np.ma.getmask(data)
+        mask = mask if mask is np.ma.nomask else np.broadcast_to(mask, shape)
+        return np.ma.core.MaskedArray(np.broadcast_to(np.ma.getdata(data), shape), mask=mask)
+
+    # Extract UTC time and combine YMDHM and Second in datetime64 array
+    @staticmethod
+    def get_utctime(path):
         with Dataset(path, 'r') as nc:
-            for ymdhm, second in zip(nc.variables['YMDHM'], nc.variables['Second']):
-                t_str = '{:02d}-{:02d}-{:02d} {:02d}:{:02d}:{:09.6f}'.format(*ymdhm, second)
-                try:
-                    t = UTC.localize(datetime.strptime(t_str, '%y-%m-%d %H:%M:%S.%f'))
-                except:
-                    t = UTC.localize(datetime.strptime(t_str, '%Y-%m-%d %H:%M:%S.%f'))
-                utc.append(t)
-        return np.ma.core.MaskedArray(utc)
+            return VGOSdb.read_utctime(nc)
+
+    @staticmethod
+    def read_utctime(nc, rows=None):
+        rows = slice(None) if rows is None else rows
+        return vgosdbEpochs(nc.variables['YMDHM'][rows], nc.variables['Second'][rows])
 
     # Dump details of variable
     @staticmethod
@@ -317,15 +344,57 @@ class VGOSdb:
                 if name not in ignore:
                     VGOSdb.dump_var(name, nc.variables[name])
 
-    # Get variable using var_list information
-    def get_data(self, group, key, var_name, is_str=False):
-        if rel_path := self.wrapper.var_list[group.lower()].get(key.lower(), ''):
-            path = os.path.join(self.folder, rel_path)
-            return self.get_utctime(path) if var_name == 'YMDHMS' else self.get_variable(path, var_name, is_str)
+    # Get relative path of file using var_list information
+    def get_var_path(self, group, key):
+        return self.wrapper.var_list.get(group.lower(), {}).get(key.lower(), '')
+
+    # Function reading variable from file or from file content already in memory
+    def variable_reader(self, var_name, is_str=False, content=None, rows=None):
+        def read(path):
+            with Dataset(path, 'r', memory=content) as nc:
+                if var_name == 'YMDHMS':
+                    return self.read_utctime(nc, rows)
+                return self.read_variable(nc, var_name, is_str, rows)
+        return read
+
+    # Get variable using var_list information. Slices of observations (rows) are not cached
+    def get_data(self, group, key, var_name, is_str=False, rows=None):
+        if rel_path := self.get_var_path(group, key):
+            if rows is not None:
+                return self.variable_reader(var_name, is_str, rows=rows)(os.path.join(self.folder, rel_path))
+            return self.cache.get(self.folder, rel_path, var_name, is_str, self.variable_reader(var_name, is_str))
         return np.ma.MaskedArray([])
 
-    # Compile statistics for this sessions
-    def statistics(self):
+    # Read files of variables (group, key, variable, is_str) concurrently and store decoded variables in cache.
+    # netCDF files are decoded one at a time from memory since HDF5 is not thread safe
+    def prefetch(self, variables, workers=None):
+        workers = int(getattr(app, 'vgosdb_prefetch_workers', 8) if workers is None else workers)
+        files = defaultdict(list)
+        for group, key, var_name, is_str in variables:
+            if (rel_path := self.get_var_path(group, key)) and os.path.exists(os.path.join(self.folder, rel_path)) \
+                    and not self.cache.has(rel_path, var_name, is_str):
+                files[rel_path].append((var_name, is_str))
+        if workers < 2 or len(files) < 2 or self.cache.max_bytes <= 0:
+            return
+
+        def load(rel_path):
+            with open(os.path.join(self.folder, rel_path), 'rb') as file:
+                return file.read()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(load, rel_path): rel_path for rel_path in files}
+            for future in as_completed(futures):
+                rel_path = futures[future]
+                try:
+                    content = future.result()
+                    for var_name, is_str in files[rel_path]:
+                        self.cache.get(self.folder, rel_path, var_name, is_str,
+                                       self.variable_reader(var_name, is_str, content))
+                except Exception:  # Variables will be read from file when needed
+                    pass
+
+    # Initialize statistics for stations, baselines and sources
+    def init_statistics(self):
         # Get AtmRateStationList
         self.atm_station_list = self.get_data('Session', 'AtmSetup', 'AtmRateStationList', is_str=True)
         # Get clock information
@@ -339,7 +408,7 @@ class VGOSdb:
         for name in [*self.station_list, *self.sources]:
             self.stats[name] = {'used': 0, 'recov': 0, 'good': 0, 'corr': 0}
         if not self.stats:
-            return
+            return False
         for i, fr in enumerate(self.station_list):
             for j, to in enumerate(self.station_list[i+1:]):
                 key1 = '{}-{}'.format(fr, to)
@@ -354,25 +423,32 @@ class VGOSdb:
                         self.deselected_st.remove(fr)
                     if to in self.deselected_st:
                         self.deselected_st.remove(to)
-        # Compile stats
-        good_qc = b'56789'
-
-        for index, bl, src, utc, qc_x, qc_s, fc_x, fc_s, flg in self.get_all_obs():
-            recoverable = 0 if flg > 1 else 1
-            good = usable = 0
-            if qc_s in good_qc and qc_x in good_qc:
-                good = 1
-                usable = 1 if flg == 0 else 0
-
-            self.recoverable += recoverable
-            self.used += usable
-            # Update statistics for stations, source and baseline
-            for key in [bl[0], bl[1], src, '{}-{}'.format(bl[0], bl[1])]:
-                stats = self.stats[key]
-                stats['good'] += good
-                stats['recov'] += recoverable
-                stats['used'] += usable
-                stats['corr'] += 1
+        return True
+
+    # Compile statistics for this sessions
+    def statistics(self):
+        if not self.max_obs_chunk:
+            self.prefetch(self.ReportVariables)
+        if not self.init_statistics():
+            return
+        # Compile stats using columns of all observations (or chunks of observations)
+        for table in self.get_observation_chunks():
+            self.add_statistics(*compile_statistics(table))
+
+    # Add statistics compiled for some observations
+    def add_statistics(self, totals, counts):
+        self.recoverable += totals['recov']
+        self.used += totals['used']
+        # Update statistics for stations, source and baseline
+        for category, items in counts.items():
+            for key, values in items.items():
+                if category == 'baselines':  # Both keys are using same data set
+                    key, reverse = '{}-{}'.format(*key), '{1}-{0}'.format(*key)
+                    if key not in self.stats:
+                        self.stats[key] = self.stats[reverse] = {'used': 0, 'recov': 0, 'good': 0, 'corr': 0}
+                stats = self.stats.setdefault(key, {'used': 0, 'recov': 0, 'good': 0, 'corr': 0})
+                for name, value in values.items():
+                    stats[name] += value
 
     # Get list of all observations
     def get_scans(self):
@@ -382,66 +458,38 @@ class VGOSdb:
         UTC = self.get_data('Scan', 'TimeUTC', 'YMDHMS')
         return zip(Names, FullNames, UTC)
 
-    # Get list of all observations
+    # Get table of all observations. Columns are read only when needed
     def get_all_obs(self):
-        # Compile list of not usable observations
-        Baselines = self.get_data('Observation', 'Baseline', 'Baseline', is_str=True)
-        Sources = self.get_data('Observation', 'Source', 'Source', is_str=True)
-        UTC = self.get_data('Observation', 'TimeUTC', 'YMDHMS')
-        QCx = self.get_data('Observation', 'QualityCode_bX', 'QualityCode')
-        QCs = self.get_data('Observation', 'QualityCode_bS', 'QualityCode')
-        if QCs.size == 0: # Probably VGOS session
-            QCs = QCx
-        FCx = self.get_data('Observation', 'CorrInfo_bX', 'FRNGERR')
-        if FCx.size == 0: # Probably VGOS session or K5 correlator
-            FCx = np.ma.core.MaskedArray([b' '] * self.correlated)
-        FCs = self.get_data('Observation', 'CorrInfo_bS', 'FRNGERR')
-        if FCs.size == 0: # Probably VGOS session or K5 correlator
-            FCs = FCx
-
-        Flags = self.get_data('Observation', 'Edit', 'DelayFlag')
-        if Flags.size == 0:
-            Flags = np.ma.core.MaskedArray([0] * self.correlated)
-        indexes = np.arange(1, self.correlated + 1) # Index (base 1) of each observation
-
-        return zip(indexes, Baselines, Sources, UTC, QCx, QCs, FCx, FCs, Flags)
+        if self.observations is None:
+            self.observations = ObservationTable(self)
+        return self.observations
+
+    # Get observations in chunks of max_obs_chunk observations read directly from files or the table of all observations
+    def get_observation_chunks(self):
+        table = self.get_all_obs()
+        return table.chunks(self.max_obs_chunk) if 0 < self.max_obs_chunk < len(table) else [table]
+
     # Get list of correlated sources with usage
     def get_source_statistics(self):
         sources = defaultdict(int)
-        for src in self.get_data('Observation', 'Source', 'Source', is_str=True):
-            # Store number of correlated scans for each source
-            sources[src] += 1
-        return sources
+        for table in self.get_observation_chunks():
+            for name, count in table.count_by('source', {'corr': np.ones(len(table), dtype=bool)}).items():
+                sources[name] += count['corr']
+        return {name: count for name, count in sources.items() if count}
 
-    def get_uncorrelated_observations(self, schedule):
-        corr, not_corr = defaultdict(list), []
-        for index, bl, src, utc, qc_x, qc_s, fc_x, fc_s, flg in self.get_all_obs():
-            key = f'{bl[0]}:{bl[1]}:{src}'
-            # Store time of each scan
-            corr[key].append(utc)
+    # Get matcher of correlated observations using baseline, source and time of each observation
+    def get_matcher(self):
+        return CorrelationMatcher(self.get_observation_chunks())
+
+    # Get scheduled observations that have not been correlated
+    def get_not_correlated(self, schedule):
         # Get list of removed stations
         removed = set(schedule.missed) | set(self.deselected_st)
-        # Extract list of uncorrelated scans.
-        for index, obs in enumerate(schedule.obs_list):
-            fr = obs['fr']
-            fr_name = schedule.stations['codes'][fr]['name']
-            if fr_name not in self.station_list or fr_name in removed:
-                continue
-            to = obs['to']
-            to_name = schedule.stations['codes'][to]['name']
-            if to_name not in self.station_list or to_name in removed:
-                continue
-
-            scan = obs['scan']
-            duration = min(scan['station_codes'][fr]['duration'], scan['station_codes'][to]['duration'])
-            start = scan['start']
-            stop = start + timedelta(seconds=duration)
-            key = f'{fr_name}:{to_name}:{obs["scan"]["source"]}'
-            if key not in corr:
-                key = '{}:{}:{}'.format(to_name, fr_name, obs['scan']['source'])
-            if key not in corr or not any([start <= t <= stop for t in corr[key]]):
-                not_corr.append(f"    observation of {obs['scan']['source']:8s} at {start.strftime('%H:%M:%S')}")
-        return not_corr
+        return self.get_matcher().not_correlated(schedule, self.station_list, removed)
+
+    def get_uncorrelated_observations(self, schedule):
+        return [f"    observation of {obs['scan']['source']:8s} at {obs['scan']['start'].strftime('%H:%M:%S')}"
+                for obs in self.get_not_correlated(schedule)]
 
     # Get list of not usable observations
     def get_rejected_obs(self, unusable, excluded):
@@ -451,17 +499,18 @@ class VGOSdb:
         fmt_not = '{:4d}, {:8s}:{:8s}, {:8s}, {:8s}, quality code X: {} S: {}, fringe code X: \'{}\' S: \'{}\''.format
         fmt_rej = '{:4d}, {:8s}:{:8s}, {:8s}, {:8s}, which fits at {:10.1f} +/- {:9.1f} ps'.format
 
+        # Observations are numbered from 1
         all_obs = self.get_all_obs()
         for index in unusable:
-            id, bl, src, utc, qc_x, qc_s, fc_x, fc_s, flg = all_obs[index]
-            line = fmt_not(index, bl[0], bl[1], src, utc.strftime('%H:%M:%S'),
-                           bstr(qc_x), bstr(qc_s), bstr(fc_x), bstr(fc_s))
+            obs = all_obs[index - 1]
+            line = fmt_not(index, *obs.baseline, obs.source, epoch2utc(obs.utc).strftime('%H:%M:%S'),
+                           bstr(obs.qc_x), bstr(obs.qc_s), bstr(obs.fc_x), bstr(obs.fc_s))
             self.unusable.append(line)
 
         for index in sorted(list(excluded.keys())):
-            bl, src, utc, qc_x, qc_s, fc_x, fc_s, flg = all_obs[index]
-            values = excluded[index]
-            line = fmt_rej(index, bl[0], bl[1], src, utc.strftime('%H:%M:%S'), values[0], values[1])
+            obs, values = all_obs[index - 1], excluded[index]
+            line = fmt_rej(index, *obs.baseline, obs.source, epoch2utc(obs.utc).strftime('%H:%M:%S'),
+                           values[0], values[1])
             self.excluded.append(line)
 
     # Print all observations
@@ -472,14 +521,10 @@ class VGOSdb:
                 print(f'{id:5d} {str(timeUTC)}')
 
 
-# Read vgosDB time from
+# Read vgosDB time from file and return datetime64 array
 def read_vgosdb_time(path):
-    timeUTC = []
-    with Dataset(path,"r") as time_file:
-        # match each Timestamp with the corresponding second
-        for YMDHM, sec in zip(time_file.variables['YMDHM'], time_file.variables['Second']):
-            timeUTC.append(vgosdbTime(YMDHM, sec))
-    return timeUTC
+    with Dataset(path, "r") as time_file:
+        return vgosdbEpochs(time_file.variables['YMDHM'][:], time_file.variables['Second'][:])
 
 
 def vgosDb_dump(db_name):
@@ -0,0 +1,67 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+
+# Memory bounded LRU cache of variables decoded from vgosDB files.
+# Variables are keyed by relative path, variable name and string flag. Files of a wrapper are not modified while they
+# are used, so the cache is only invalidated when another wrapper is selected.
+class VariableCache:
+
+    def __init__(self, max_mb=256):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.data, self.size = OrderedDict(), 0
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def __str__(self):
+        return f'{len(self.data)} variables {self.size / 1024 / 1024:.1f} MB hits: {self.hits} misses: {self.misses}'
+
+    # Memory used by array and its mask. Repeated (broadcast) axes are not using memory
+    @staticmethod
+    def nbytes(data):
+        used = lambda arr: arr.itemsize * int(np.prod([n for n, st in zip(arr.shape, arr.strides) if st]))
+        mask = np.ma.getmask(data)
+        return used(np.ma.getdata(data)) + (used(mask) if mask is not np.ma.nomask else 0)
+
+    # Cached arrays are shared by all callers and cannot be modified
+    @staticmethod
+    def freeze(data):
+        if isinstance(data, np.ndarray):
+            data.setflags(write=False)
+            if (mask := np.ma.getmask(data)) is not np.ma.nomask:
+                mask.setflags(write=False)
+        return data
+
+    # Test if variable is in cache
+    def has(self, rel_path, var_name, is_str):
+        return (rel_path, var_name, is_str) in self.data
+
+    # Get variable from cache or decode it using reader function. Variables are not stored if cache is disabled.
+    def get(self, folder, rel_path, var_name, is_str, reader):
+        path = os.path.join(folder, rel_path)
+        if self.max_bytes <= 0:
+            return self.freeze(reader(path))
+        key = rel_path, var_name, is_str
+        if key in self.data:
+            self.hits += 1
+            self.data.move_to_end(key)
+            return self.data[key]
+        self.misses += 1
+        data = self.freeze(reader(path))
+        if (size := self.nbytes(data)) <= self.max_bytes:
+            self.data[key] = data
+            self.size += size
+            # Remove least recently used variables
+            while self.size > self.max_bytes:
+                _, old = self.data.popitem(last=False)
+                self.size -= self.nbytes(old)
+        return data
+
+    # Remove all variables from cache
+    def invalidate(self):
+        self.data.clear()
+        self.size = 0
@@ -0,0 +1,93 @@
+import numpy as np
+
+from aps.utils.utctime import utc2epoch
+
+
+# Index of each name in list of names (-1 if not in list)
+def name_index(names, items):
+    index = {name: i for i, name in enumerate(items)}
+    return np.array([index.get(name, -1) for name in names], dtype=np.int64)
+
+
+# Match scheduled observations with correlated ones.
+# Correlated observations are matched chunk by chunk. Epochs of a chunk are sorted by (baseline, source) key and each
+# scheduled window overlapping the time span of the chunk is found by binary search. Only the flags of the scheduled
+# windows and the (baseline, source) keys found in the vgosDB are kept between chunks.
+class CorrelationMatcher:
+
+    # Observations are in a list of tables (chunks) sharing the same station and source lists.
+    def __init__(self, tables):
+        self.tables = tables
+
+    # Test if some correlated observations are inside [start, stop] windows of (fr, to, source) keys.
+    # Keys are indices in lists of station and source names. The first orientation found for the baseline is used.
+    def is_correlated(self, stations, sources, fr, to, src, starts, stops):
+        fr, to, src = (np.asarray(values, dtype=np.int64) for values in (fr, to, src))
+        starts, stops = np.asarray(starts, dtype='M8[us]'), np.asarray(stops, dtype='M8[us]')
+        found, keys = np.zeros((2, starts.size), dtype=bool), set()
+        order = np.argsort(starts, kind='stable')
+        sorted_starts = starts[order]
+        longest = (stops - starts).max() if starts.size else np.timedelta64(0, 'us')
+        for table in self.tables:
+            epochs = np.asarray(table.epoch, dtype='M8[us]').ravel()
+            codes, nsta, nsrc = self.key_codes(table)
+            keys.update((table.stations[code // nsrc // nsta], table.stations[code // nsrc % nsta],
+                         table.sources[code % nsrc]) for code in np.unique(codes).tolist())
+            if not epochs.size:
+                continue
+            # Windows overlapping time span of chunk. Offsets are from first epoch of chunk
+            t0, t1 = epochs.min(), epochs.max()
+            windows = order[np.searchsorted(sorted_starts, t0 - longest):np.searchsorted(sorted_starts, t1, 'right')]
+            first, last = (starts[windows] - t0).astype(np.int64), (stops[windows] - t0).astype(np.int64)
+            unique, ordered, span = self.sort_keys(codes, (epochs - t0).astype(np.int64))
+            sta, srcs = name_index(stations, table.stations), name_index(sources, table.sources)
+            for flags, (a, b) in zip(found, ((fr, to), (to, fr))):
+                a, b, s = sta[a[windows]], sta[b[windows]], srcs[src[windows]]
+                wanted = np.where((a >= 0) & (b >= 0) & (s >= 0), (a * nsta + b) * nsrc + s, -1)
+                flags[windows] |= self.search(unique, ordered, span, wanted, first, last)
+        # Use direct orientation when this key has correlated observations
+        direct = np.array([(stations[f], stations[t], sources[s]) in keys
+                           for f, t, s in zip(fr.tolist(), to.tolist(), src.tolist())], dtype=bool)
+        return np.where(direct, found[0], found[1])
+
+    # Code of (fr, to, source) key of each observation of chunk
+    @staticmethod
+    def key_codes(table):
+        fr, to, src = table.fr, table.to, table.src  # Loading baselines could add stations to list
+        nsta, nsrc = max(len(table.stations), 1), max(len(table.sources), 1)
+        return (fr.astype(np.int64) * nsta + to) * nsrc + src, nsta, nsrc
+
+    # Distinct key codes and offsets of observations sorted by key rank and offset. Keys are separated by span of chunk
+    @staticmethod
+    def sort_keys(codes, offsets):
+        span = int(offsets.max()) + 1
+        unique, ranks = np.unique(codes, return_inverse=True)
+        if len(unique) * span >= 2 ** 62:
+            raise ValueError('too many keys to match correlated observations')
+        return unique, np.sort(ranks.ravel().astype(np.int64) * span + offsets), span
+
+    # Test if sorted observations are inside windows [first, last] of wanted key codes (-1 if not in chunk lists)
+    @staticmethod
+    def search(unique, ordered, span, wanted, first, last):
+        rank = np.minimum(np.searchsorted(unique, wanted), len(unique) - 1)
+        valid = (unique[rank] == wanted) & (last >= 0) & (first < span) & (first <= last)
+        base = rank * span
+        index = np.searchsorted(ordered, base + np.clip(first, 0, span - 1), side='left')
+        found = ordered[np.minimum(index, ordered.size - 1)]
+        return valid & (index < ordered.size) & (found <= base + np.clip(last, 0, span - 1))
+
+    # Get all scheduled observations not correlated. Stations not correlated or removed are ignored.
+    # Windows are computed with the observation arrays of the schedule and records are made for uncorrelated ones.
+    def not_correlated(self, schedule, station_list, removed):
+        stations, names = set(station_list), schedule.stations['codes']
+        codes = [names[code]['name'] for code in schedule.station_index]
+        used = np.array([name in stations and name not in removed for name in codes], dtype=bool)
+        if not (selected := np.flatnonzero(used[schedule.obs_fr] & used[schedule.obs_to])).size:
+            return []
+        rows, fr, to = schedule.obs_scan[selected], schedule.obs_fr[selected], schedule.obs_to[selected]
+        durations = np.minimum(schedule.durations[rows, fr], schedule.durations[rows, to]).astype(np.int64)
+        starts = np.array([utc2epoch(start) for start in schedule.scan_starts], dtype='M8[us]')[rows]
+        stops = starts + durations * np.timedelta64(1, 's')
+        correlated = self.is_correlated(codes, schedule.source_index, fr, to, schedule.scan_sources[rows], starts, stops)
+        return [schedule.observation(index) for index, found in zip(selected.tolist(), correlated.tolist())
+                if not found]
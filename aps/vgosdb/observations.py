@@ -0,0 +1,160 @@
+from collections import namedtuple
+
+import numpy as np
+
+from aps.vgosdb.strings import decode_S1
+
+# Row of the observation table. Index is the observation number (base 1) and baseline is a tuple of station names
+Observation = namedtuple('Observation', 'index baseline source utc qc_x qc_s fc_x fc_s flag')
+
+
+# Count observations for each index using all boolean (or weight) arrays
+def count_by(indices, values, size):
+    return np.stack([np.bincount(indices, weights=val, minlength=size) for val in values], axis=1).astype(int)
+
+
+# Columnar table of all observations in a vgosDB.
+# Columns are read the first time they are needed using the var_list of the wrapper selected in vgosDB.
+# A table could be a view (rows) of a parent table or a window (slice) of observations read directly from files.
+class ObservationTable:
+
+    def __init__(self, vgosdb, parent=None, rows=None, window=None, names=None):
+        self.vgosdb, self.parent, self.rows, self.window = vgosdb, parent, rows, window
+        names = (parent.stations, parent.sources) if parent is not None else names
+        self.stations, self.sources = names if names else (list(vgosdb.station_list), list(vgosdb.sources))
+        if parent is not None:
+            self.size = len(rows)
+        else:
+            self.size = len(range(vgosdb.correlated)[window]) if window else vgosdb.correlated
+        self._columns = {}
+
+    def __len__(self):
+        return self.size
+
+    # Row access for integer and sub-table for boolean mask, slice or array of positions
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            return self.row(item)
+        rows = np.arange(self.size)[item]
+        if self.parent is None:
+            return ObservationTable(self.vgosdb, self, rows)
+        return ObservationTable(self.vgosdb, self.parent, self.rows[rows])
+
+    def __iter__(self):
+        stations, sources = self.stations, self.sources
+        columns = [self.column(name).tolist() for name in ('index', 'fr', 'to', 'src')]
+        columns.append(self.epoch)
+        columns.extend(self.column(name).tolist() for name in ('qc_x', 'qc_s', 'fc_x', 'fc_s', 'flag'))
+        for index, fr, to, src, epoch, qc_x, qc_s, fc_x, fc_s, flag in zip(*columns):
+            yield Observation(index, (stations[fr], stations[to]), sources[src], epoch, qc_x, qc_s, fc_x, fc_s, flag)
+
+    def row(self, position):
+        if not -self.size <= position < self.size:
+            raise IndexError(f'observation {position} out of range')
+        fr, to, src = self.fr[position], self.to[position], self.src[position]
+        return Observation(int(self.index[position]), (self.stations[fr], self.stations[to]), self.sources[src],
+                           self.epoch[position], self.qc_x[position], self.qc_s[position], self.fc_x[position],
+                           self.fc_s[position], int(self.flag[position]))
+
+    # Split table in chunks of observations read directly from files. Chunks share station and source lists
+    def chunks(self, size):
+        for start in range(0, self.size, size):
+            yield ObservationTable(self.vgosdb, window=slice(start, min(start + size, self.size)),
+                                   names=(self.stations, self.sources))
+
+    # Get column. Sub-tables are using the columns of parent table
+    def column(self, name):
+        if self.parent is not None:
+            return self.parent.column(name)[self.rows]
+        if name not in self._columns:
+            getattr(self, f'_load_{name}')()
+        return self._columns[name]
+
+    index = property(lambda self: self.column('index'))
+    fr = property(lambda self: self.column('fr'))
+    to = property(lambda self: self.column('to'))
+    src = property(lambda self: self.column('src'))
+    epoch = property(lambda self: self.column('epoch'))
+    qc_x = property(lambda self: self.column('qc_x'))
+    qc_s = property(lambda self: self.column('qc_s'))
+    fc_x = property(lambda self: self.column('fc_x'))
+    fc_s = property(lambda self: self.column('fc_s'))
+    flag = property(lambda self: self.column('flag'))
+
+    # Read variable for all observations of this table
+    def _get_data(self, group, key, var_name):
+        return self.vgosdb.get_data(group, key, var_name, rows=self.window)
+
+    # Index (base 1) of each observation
+    def _load_index(self):
+        self._columns['index'] = np.arange(1, self.size + 1) + (self.window.start if self.window else 0)
+
+    # Baseline stations are indices in station list. Names are decoded directly in indices
+    def _load_fr(self):
+        baselines = self._get_data('Observation', 'Baseline', 'Baseline')
+        bl = decode_S1(baselines, self.stations).reshape(-1, 2)
+        self._columns['fr'], self._columns['to'] = bl[:, 0], bl[:, 1]
+
+    _load_to = _load_fr
+
+    def _load_src(self):
+        sources = self._get_data('Observation', 'Source', 'Source')
+        self._columns['src'] = decode_S1(sources, self.sources).ravel()
+
+    def _load_epoch(self):
+        self._columns['epoch'] = self._get_data('Observation', 'TimeUTC', 'YMDHMS')
+
+    # Quality and fringe codes of S band are the X band codes for VGOS sessions
+    def _load_codes(self, key, var, default):
+        codes = self._get_data('Observation', key, var)
+        return np.ma.filled(codes, b'').ravel() if codes.size else default
+
+    def _load_qc_x(self):
+        self._columns['qc_x'] = self._load_codes('QualityCode_bX', 'QualityCode', np.full(self.size, b''))
+
+    def _load_qc_s(self):
+        self._columns['qc_s'] = self._load_codes('QualityCode_bS', 'QualityCode', self.qc_x)
+
+    # Fringe codes are not available for VGOS sessions or K5 correlator
+    def _load_fc_x(self):
+        self._columns['fc_x'] = self._load_codes('CorrInfo_bX', 'FRNGERR', np.full(self.size, b' '))
+
+    def _load_fc_s(self):
+        self._columns['fc_s'] = self._load_codes('CorrInfo_bS', 'FRNGERR', self.fc_x)
+
+    # A masked flag is recoverable but not usable
+    def _load_flag(self):
+        if (flags := self._get_data('Observation', 'Edit', 'DelayFlag')).size == 0:
+            self._columns['flag'] = np.zeros(self.size, dtype=int)
+        else:
+            self._columns['flag'] = np.ma.filled(flags, 1).ravel().astype(int)
+
+    # Indices of groups for each observation with list of group keys.
+    # Baselines are independent of the order of the stations. Each observation is in the group of both stations.
+    def groups(self, key):
+        if key == 'source':
+            return [self.src], self.sources
+        fr, to = self.fr, self.to  # Loading baselines could add stations to list
+        if key == 'station':
+            return [fr, to], self.stations
+        if key == 'baseline':
+            nsta = len(self.stations)
+            pairs, inverse = np.unique(np.minimum(fr, to) * nsta + np.maximum(fr, to), return_inverse=True)
+            return [inverse.ravel()], [(self.stations[pair // nsta], self.stations[pair % nsta])
+                                       for pair in pairs.tolist()]
+        raise KeyError(f'invalid group {key}')
+
+    # Positions of the observations of each group in table order
+    def group_by(self, key):
+        indices, keys = self.groups(key)
+        positions = np.concatenate([np.arange(self.size)] * len(indices))
+        indices = np.concatenate(indices)
+        order = np.lexsort((positions, indices))
+        splits = np.searchsorted(indices[order], np.arange(1, len(keys)))
+        return {name: rows for name, rows in zip(keys, np.split(positions[order], splits)) if rows.size}
+
+    # Count observations of each group using boolean masks. Groups with no observations are included.
+    def count_by(self, key, masks):
+        indices, keys = self.groups(key)
+        counts = sum(count_by(index, list(masks.values()), len(keys)) for index in indices)
+        return {name: dict(zip(masks.keys(), row.tolist())) for name, row in zip(keys, counts)}
@@ -0,0 +1,24 @@
+import numpy as np
+
+# Order of the counters compiled for each station, baseline and source
+COUNTERS = ('good', 'recov', 'used', 'corr')
+# Quality codes of good observations. The empty code (NUL) is kept since the original test was b'' in b'56789'
+GOOD_QC = [b'5', b'6', b'7', b'8', b'9', b'']
+
+
+# Test quality codes of all observations
+def good_quality(codes):
+    return np.isin(np.ma.filled(codes, b''), GOOD_QC).ravel()
+
+
+# Compile good, recoverable, used and correlated observations for stations, baselines and sources
+def compile_statistics(table):
+    recov = table.flag <= 1
+    good = good_quality(table.qc_x) & good_quality(table.qc_s)
+    used = good & (table.flag == 0)
+    masks = dict(zip(COUNTERS, [good, recov, used, np.ones(len(table), dtype=bool)]))
+    totals = {name: int(val.sum()) for name, val in masks.items()}
+
+    counts = {category: table.count_by(key, masks)
+              for category, key in [('stations', 'station'), ('sources', 'source'), ('baselines', 'baseline')]}
+    return totals, counts
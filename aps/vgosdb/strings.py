@@ -0,0 +1,24 @@
+import numpy as np
+
+
+# Decode S1 character array into array of strings. The last axis holds the characters of each string.
+# Names are decoded only once. If list of known names is given, return indices in list (unknown names are appended).
+def decode_S1(data, known=None):
+    chars = np.ascontiguousarray(np.ma.filled(data, b'\x00'), dtype='S1')
+    if chars.ndim == 0:
+        chars = chars.reshape(1)
+    shape, width = chars.shape[:-1], chars.shape[-1]
+    if chars.size == 0:
+        shape = shape if chars.ndim > 1 else (0,)
+        return np.zeros(shape, dtype=np.intp) if known is not None else np.zeros(shape, dtype='U1')
+    # Fixed width strings drop trailing NULs. Leading NULs and spaces are removed from unique names only
+    uniques, inverse = np.unique(chars.view(f'S{width}').reshape(-1), return_inverse=True)
+    names = [name.decode('utf-8', errors='replace').strip('\x00').strip() for name in uniques.tolist()]
+    if known is None:
+        return np.array(names, dtype=f'U{max(map(len, names), default=1) or 1}')[inverse.ravel()].reshape(shape)
+    index = {name: i for i, name in enumerate(known)}
+    for name in names:
+        if name not in index:
+            index[name] = len(known)
+            known.append(name)
+    return np.array([index[name] for name in names], dtype=np.intp)[inverse.ravel()].reshape(shape)
@@ -1,9 +1,13 @@
 import os
 import re
 import sys
+import pickle
+import hashlib
+from operator import attrgetter
 from datetime import datetime, timedelta
 from pytz import UTC
 
+from aps.utils import app
 from aps.utils.files import TEXTfile
 
 # Regex to extract information in wrapper
@@ -34,6 +38,10 @@ class Wrapper(TEXTfile):
     def __str__(self):
         return self.name
 
+    # Open file is not stored when wrapper is pickled
+    def __getstate__(self):
+        return dict(self.__dict__, file=None, line=None)
+
     # Get head file name. Sometimes the V00x is attached to head name
     def get_head(self):
         for key in list(self.var_list['session'].keys()):
@@ -145,3 +153,71 @@ class Wrapper(TEXTfile):
             for key, value in info.items():
                 print(name, key, value)
 
+
+
+# Index of parsed wrappers in a vgosDB folder.
+# Parsed wrappers are stored in cache folder and a wrapper is parsed again only if its size or mtime has changed
+class WrapperIndex:
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.wrappers = []
+        self.oldest, self.v001, self.last, self.first = None, None, {}, {}
+        self.parsed = 0
+
+    # Path of cache file for this vgosDB folder
+    def cache_path(self):
+        if folder := app.cache_folder('wrappers'):
+            key = hashlib.md5(os.path.abspath(self.folder).encode('utf-8')).hexdigest()
+            return os.path.join(folder, f'{os.path.basename(self.folder)}-{key}.pkl')
+        return None
+
+    def load_cache(self, path):
+        try:
+            with open(path, 'rb') as file:
+                return pickle.load(file)
+        except Exception:
+            return {}
+
+    def save_cache(self, path, cache):
+        try:
+            with open(tmp := f'{path}.{os.getpid()}', 'wb') as file:
+                pickle.dump(cache, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except Exception:
+            pass
+
+    # Read all wrappers using cached information for the ones that have not changed
+    def read(self):
+        cache = self.load_cache(path) if (path := self.cache_path()) else {}
+        updated, self.wrappers, self.parsed = {}, [], 0
+        for filename in os.listdir(self.folder):
+            if filename.endswith('.wrp'):
+                info = os.stat(wrp_path := os.path.join(self.folder, filename))
+                key = (info.st_size, info.st_mtime_ns)
+                if filename in cache and cache[filename][0] == key:
+                    wrp = cache[filename][1]
+                else:
+                    self.parsed += 1
+                    with Wrapper(wrp_path) as wrp:
+                        if wrp.version:
+                            wrp.read()
+                updated[filename] = (key, wrp)
+                if wrp.version:
+                    self.wrappers.append(wrp)
+        if path and (self.parsed or updated.keys() != cache.keys()):
+            self.save_cache(path, updated)
+        self.make_index()
+        return self.wrappers
+
+    # Index wrappers using same sort as original search functions so that ties are resolved the same way
+    def make_index(self):
+        lst = sorted(self.wrappers, key=attrgetter('version', 'time_tag'))
+        self.oldest = lst[-1] if lst else None
+        lst = sorted(filter(lambda x: x.version == 'V001', self.wrappers), key=attrgetter('time_tag'))
+        self.v001 = lst[0] if lst else None
+        self.last, self.first = {}, {}
+        for wrp in sorted(self.wrappers, key=attrgetter('version')):
+            self.first.setdefault(wrp.agency, wrp)
+            if wrp.subset == 'all':
+                self.last[wrp.agency] = wrp
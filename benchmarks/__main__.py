@@ -0,0 +1,663 @@
+import os
+import sys
+import time
+import tempfile
+from pathlib import Path
+from argparse import Namespace
+
+import numpy as np
+from netCDF4 import Dataset
+
+from aps.utils import app
+from benchmarks import legacy
+from benchmarks.synthetic import make_scans, make_skd, make_vgosdb, copy_wrappers, make_spool, make_global_section, \
+    make_vex
+
+
+# Initialize application with an empty database when no config file is given
+def init_app(config=None):
+    if not config:
+        folder = tempfile.mkdtemp(prefix='aps_bench_')
+        config = os.path.join(folder, 'aps.conf')
+        with open(config, 'w') as file:
+            print(f'database = "{os.path.join(folder, "aps.db")}"', file=file)
+            print(f'cache_dir = "{os.path.join(folder, "cache")}"', file=file)
+    return app.init(Namespace(config=config))
+
+
+# Time a function and return best time of all repetitions with last answer
+def timeit(fnc, *args, repeat=3):
+    best, ans = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ans = fnc(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, ans
+
+
+# Read schedule file with reader class
+def read_schedule_file(cls, path):
+    with cls(path) as sched:
+        sched.read()
+    return sched
+
+
+# Compare bulk decoding of Observables/TimeUTC.nc with original loop
+def bench_utctime(folder):
+    from aps.vgosdb import VGOSdb
+
+    path = Path(folder, 'Observables', 'TimeUTC.nc')
+    loop_time, _ = timeit(legacy.loop_utctime, path, repeat=1)
+    bulk_time, new = timeit(VGOSdb.get_utctime, path)
+    print(f'TimeUTC decoding for {len(new)} observations')
+    print(f'  loop {loop_time:8.3f} s')
+    print(f'  bulk {bulk_time:8.3f} s ({loop_time / bulk_time:.1f}x)')
+
+
+# Compare interval matcher with original linear search of uncorrelated observations
+def bench_matcher(folder, schedule):
+    from aps.vgosdb import VGOSdb
+    from aps.schedule.skd import SKD
+
+    sched = read_schedule_file(SKD, schedule)
+    vgosdb = VGOSdb(folder)
+    vgosdb.get_all_obs()  # Same starting point for both methods
+    loop_time, _ = timeit(legacy.loop_uncorrelated, vgosdb, sched, repeat=1)
+    matcher_time, new = timeit(vgosdb.get_uncorrelated_observations, sched)
+    print(f'{len(new)} uncorrelated observations out of {len(sched.obs_list)} scheduled')
+    print(f'  loop    {loop_time:8.3f} s')
+    print(f'  matcher {matcher_time:8.3f} s ({loop_time / matcher_time:.1f}x)')
+
+
+# Compare vectorized statistics with original loop
+def bench_statistics(folder):
+    from aps.vgosdb import VGOSdb
+
+    def run(vectorized):
+        vgosdb = VGOSdb(folder)
+        start = time.perf_counter()
+        if vectorized:
+            vgosdb.statistics()
+        elif vgosdb.init_statistics():
+            legacy.loop_statistics(vgosdb)
+        return time.perf_counter() - start, vgosdb
+
+    loop_time, _ = run(False)
+    vector_time, new = run(True)
+    print(f'statistics for {new.correlated} observations')
+    print(f'  loop       {loop_time:8.3f} s')
+    print(f'  vectorized {vector_time:8.3f} s ({loop_time / vector_time:.1f}x)')
+
+
+# Compare a report pass over the vgosDB variables with and without the variable cache
+def bench_cache(folder):
+    from aps.vgosdb import VGOSdb
+
+    # Observation table is built again for each report
+    def report_pass(vgosdb):
+        vgosdb.statistics()
+        vgosdb.observations = None
+        obs = list(vgosdb.get_all_obs())
+        vgosdb.observations = None
+        return len(vgosdb.get_source_statistics()) + len(obs)
+
+    vgosdb = VGOSdb(folder)
+    vgosdb.cache.max_bytes = 0
+    no_cache, _ = timeit(report_pass, vgosdb, repeat=1)
+    vgosdb = VGOSdb(folder)
+    cached, _ = timeit(report_pass, vgosdb, repeat=1)
+    print(f'report pass for {vgosdb.correlated} observations')
+    print(f'  no cache {no_cache:8.3f} s')
+    print(f'  cache    {cached:8.3f} s ({no_cache / cached:.1f}x) {vgosdb.cache}')
+
+
+# Compare wrapper index (cold and warm cache) with original parsing and sort of all wrappers
+def bench_wrappers(folder, nbr_wrappers=60):
+    from aps.vgosdb.wrapper import WrapperIndex
+
+    wrp_folder = copy_wrappers(folder, tempfile.mkdtemp(prefix='aps_wrappers_'), nbr_wrappers)
+
+    def select(index):
+        index.read()
+        return index.oldest, index.v001, index.last, index.first
+
+    sort_time, _ = timeit(legacy.sorted_wrappers, wrp_folder)
+    cold_time, _ = timeit(lambda: select(WrapperIndex(str(wrp_folder))), repeat=1)
+    warm_time, _ = timeit(lambda: select(WrapperIndex(str(wrp_folder))))
+    print(f'{len(list(wrp_folder.glob("*.wrp")))} wrappers')
+    print(f'  parse and sort {sort_time:8.3f} s')
+    print(f'  index (cold)   {cold_time:8.3f} s')
+    print(f'  index (warm)   {warm_time:8.3f} s ({sort_time / warm_time:.1f}x)')
+
+
+# Compare bulk decoding of Baseline and Source S1 arrays with original recursive decoding
+def bench_strings(folder):
+    from aps.vgosdb.strings import decode_S1
+
+    for name in ['Baseline', 'Source']:
+        with Dataset(Path(folder, 'Observables', f'{name}.nc'), 'r') as nc:
+            data = nc.variables[name][:]
+        loop_time, _ = timeit(legacy.loop_S1, data, data.ndim - 1, repeat=1)
+        bulk_time, _ = timeit(decode_S1, data)
+        codes_time, _ = timeit(lambda: decode_S1(data, []))
+        print(f'{name} decoding for {len(data)} observations')
+        print(f'  loop  {loop_time:8.3f} s')
+        print(f'  bulk  {bulk_time:8.3f} s ({loop_time / bulk_time:.1f}x)')
+        print(f'  codes {codes_time:8.3f} s ({loop_time / codes_time:.1f}x)')
+
+
+# Peak memory of reading variables with REPEAT attribute. Memory does not grow with REPEAT
+def bench_repeat(folder, size=10000):
+    import tracemalloc
+    from aps.vgosdb import VGOSdb
+
+    vgosdb, path = VGOSdb(folder), Path(tempfile.mkdtemp(prefix='aps_repeat_'), 'Repeat.nc')
+    for repeat in [10, 1000, 100000]:
+        with Dataset(path, 'w') as nc:
+            nc.createDimension('NumScans', size)
+            var = nc.createVariable('Cable', 'f8', ('NumScans',))
+            var[:] = np.ma.masked_array(np.arange(size) * 0.5, mask=np.arange(size) % 7 == 0)
+            var.setncattr('REPEAT', repeat)
+        tracemalloc.start()
+        start = time.perf_counter()
+        data = vgosdb.get_variable(path, 'Cable')
+        elapsed, peak = time.perf_counter() - start, tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f'  REPEAT {repeat:6d} shape {str(data.shape):15s} {elapsed:8.3f} s peak memory '
+              f'{peak / 1024 / 1024:8.2f} MB')
+
+
+# Compare statistics compiled with sequential reads and with concurrent prefetch of report variables
+def bench_prefetch(folder, workers=8):
+    from aps.vgosdb import VGOSdb
+
+    def run(nbr_workers):
+        app.vgosdb_prefetch_workers = nbr_workers
+        vgosdb = VGOSdb(folder)
+        vgosdb.statistics()
+        return vgosdb
+
+    sequential, _ = timeit(run, 1)
+    prefetch, new = timeit(run, workers)
+    print(f'statistics for {new.correlated} observations')
+    print(f'  sequential       {sequential:8.3f} s')
+    print(f'  prefetch ({workers:2d})    {prefetch:8.3f} s ({sequential / prefetch:.1f}x) {new.cache}')
+
+
+# Compare time and peak memory of statistics and matcher when observations are read in chunks
+def bench_chunks(folder, schedule, chunks=(0, 100000, 10000)):
+    import tracemalloc
+    from aps.vgosdb import VGOSdb
+    from aps.schedule.skd import SKD
+
+    sched = read_schedule_file(SKD, schedule)
+    for chunk in chunks:
+        app.max_obs_chunk = chunk
+        vgosdb = VGOSdb(folder)
+        tracemalloc.start()
+        start = time.perf_counter()
+        vgosdb.statistics()
+        vgosdb.get_uncorrelated_observations(sched)
+        elapsed, peak = time.perf_counter() - start, tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f'  max_obs_chunk {chunk:7d} {elapsed:8.3f} s peak memory {peak / 1024 / 1024:8.2f} MB')
+    print(f'{vgosdb.correlated} observations')
+
+
+# Compare spool indexing (first run and all runs) with original decoding of all runs
+def bench_spool(nbr_runs=2000):
+    from aps.aps.spool import read_spool
+
+    app.spool_cache = False
+    path = make_spool(Path(tempfile.mkdtemp(prefix='aps_spool_'), 'SPLFXX'), nbr_runs)
+    loop_time, _ = timeit(legacy.loop_spool, path)
+    open_time, new = timeit(read_spool, path)
+    first_time, _ = timeit(lambda: read_spool(path).runs[0])
+    all_time, _ = timeit(lambda: list(read_spool(path).runs))
+    print(f'spool with {len(new.runs)} runs ({path.stat().st_size / 1024 / 1024:.1f} MB)')
+    print(f'  decode all runs      {loop_time:8.3f} s')
+    print(f'  open (index)         {open_time:8.3f} s ({loop_time / open_time:.0f}x)')
+    print(f'  open and first run   {first_time:8.3f} s')
+    print(f'  open and all runs    {all_time:8.3f} s ({loop_time / all_time:.2f}x)')
+
+
+# Compare reading spool files with and without cache of decoded spool
+def bench_spool_cache(nbr_runs=2000):
+    from aps.aps.spool import read_spool
+
+    folder = Path(tempfile.mkdtemp(prefix='aps_spool_'))
+    for name, runs, nbr_stations in [('SPLFXX', 1, 60), ('SPLFGL', nbr_runs, 10)]:
+        path = make_spool(Path(folder, name), runs, nbr_stations=nbr_stations, nbr_sources=300)
+        Path(folder, f'nuSolve_unused_observations_{name[-2:]}').write_text(
+            ''.join(f'u {i:5d} 12:00:00 0 0  A A  \n' for i in range(1000)))
+
+        def read(use_cache):
+            app.spool_cache = use_cache
+            spool = read_spool(path, read_unused=True)
+            return spool.runs[0], spool.unused
+
+        no_cache, _ = timeit(read, False)
+        read(True)  # Store spool in cache
+        cached, _ = timeit(read, True)
+        print(f'{name} {runs} runs ({path.stat().st_size / 1024 / 1024:.1f} MB) first run')
+        print(f'  no cache {no_cache:8.3f} s')
+        print(f'  cache    {cached:8.3f} s ({no_cache / cached:.1f}x)')
+
+
+# Compare lines per second decoded by original get_data and fixed column classifier using all lines of a spool
+def bench_classifier(path=None, nbr_runs=200):
+    from aps.aps.spool import Section, ParameterTable
+
+    path = Path(path) if path else make_spool(Path(tempfile.mkdtemp(prefix='aps_spool_'), 'SPLFXX'), nbr_runs)
+    lines = path.read_text(errors='surrogateescape').splitlines()
+
+    def decode(get_data):
+        section = Section.__new__(Section)
+        section.parameters, section.POST2005 = ParameterTable(), True
+        for line in lines:
+            get_data(section, line)
+        return section
+
+    old_time, _ = timeit(decode, legacy.loop_get_data)
+    new_time, new = timeit(decode, Section.get_data)
+    print(f'{path.name} {len(lines)} lines {len(new.parameters)} parameters')
+    print(f'  regex and search  {len(lines) / old_time:12.0f} lines/s')
+    print(f'  classifier        {len(lines) / new_time:12.0f} lines/s ({old_time / new_time:.1f}x)')
+
+
+# Compare regex and block decoding of statistics tables for a small and a large network
+def bench_stats_tables(networks=((10, 50), (40, 500), (200, 2000))):
+    from aps.aps.spool import Section, SectionReader
+
+    tables = [('Baseline', 'baselines', legacy.loop_baseline_stats, Section.decode_baseline_stats),
+              ('Source', 'sources', lambda section: legacy.loop_stats(section, legacy.source_data),
+               Section.decode_source_stats),
+              ('Station', 'stations', lambda section: legacy.loop_stats(section, legacy.station_data),
+               Section.decode_station_stats)]
+    for nbr_stations, nbr_sources in networks:
+        path = make_spool(Path(tempfile.mkdtemp(prefix='aps_spool_'), 'SPLFXX'), 1, nbr_stations, nbr_sources)
+        data = path.read_bytes()
+
+        # Section positioned at title of table
+        def section_at(title):
+            section = Section.__new__(Section)
+            section.spl = SectionReader(data[data.index(title.encode()):])
+            section.spl.has_next()
+            section.stats = {'baselines': {}, 'sources': {}, 'stations': {}}
+            return section
+
+        for title, key, loop, decoder in tables:
+            loop_time, _ = timeit(lambda: loop(section_at(f' {title} Statistics')), repeat=50)
+            block_time, section = timeit(lambda: (section := section_at(f' {title} Statistics'), decoder(section))[0],
+                                         repeat=50)
+            print(f'{title} Statistics {len(section.stats[key])} rows')
+            print(f'  regex {loop_time * 1000:8.3f} ms')
+            print(f'  block {block_time * 1000:8.3f} ms ({loop_time / block_time:.1f}x)')
+
+
+# Compare recursive glob and index of stored spool files (first build, lookups, refresh without change in a new
+# process and refresh after new file)
+def bench_stored_spool(nbr_folders=1000, nbr_files=10):
+    from aps.aps.spool import get_stored_spool, indexed_roots
+
+    root = Path(tempfile.mkdtemp(prefix='aps_stored_'))
+    os.environ['STORED_SPOOL'] = str(root)
+    db_names = []
+    for index in range(nbr_folders):
+        folder = Path(root, str(2000 + index % 20), f'r4{index:04d}')
+        folder.mkdir(parents=True)
+        for version in range(nbr_files):
+            db_names.append(db_name := f'{20000101 + index:08d}-r4{index:04d}v{version}')
+            Path(folder, f'{db_name}.SFF').write_text(db_name)
+            Path(folder, f'{db_name}.log').write_text(db_name)
+    names = db_names[::len(db_names) // 20]
+    glob_time, _ = timeit(lambda: [legacy.glob_stored_spool(name) for name in names], repeat=1)
+    build_time, _ = timeit(get_stored_spool, names[0], repeat=1)
+    index_time, _ = timeit(lambda: [get_stored_spool(name) for name in names], repeat=1)
+    indexed_roots.clear()  # Index is refreshed once by each process
+    refresh_time, _ = timeit(get_stored_spool, names[0], repeat=1)
+    Path(root, '2005', 'r40005', f'{names[-1]}.SFF').write_text('new')
+    indexed_roots.clear()
+    added_time, _ = timeit(get_stored_spool, names[-1], repeat=1)
+    print(f'{len(db_names)} stored spool files in {nbr_folders} folders ({len(names)} lookups)')
+    print(f'  glob          {glob_time / len(names):8.3f} s by lookup')
+    print(f'  build index   {build_time:8.3f} s')
+    print(f'  index         {index_time / len(names):8.5f} s by lookup ({glob_time / index_time:.0f}x)')
+    print(f'  refresh       {refresh_time:8.3f} s')
+    print(f'  new file      {added_time:8.3f} s')
+
+
+# Compare reading all records of spool with reading only fields used by make_eob_record
+def bench_spool_fields(nbr_runs=200, nbr_stations=20, nbr_sources=1000):
+    from aps.aps.spool import read_spool, EOB_FIELDS
+
+    app.spool_cache = False
+    path = make_spool(Path(tempfile.mkdtemp(prefix='aps_spool_'), 'SPLFXX'), nbr_runs, nbr_stations, nbr_sources)
+    stations = {f'STA{i:05d}': f'{i:02d}' for i in range(nbr_stations)}
+
+    def eob_records(fields):
+        return [run.make_eob_record(stations, 'r4000', want_xy) for run in read_spool(path, fields=fields).runs
+                for want_xy in (True, False)]
+
+    all_time, _ = timeit(eob_records, None)
+    fields_time, _ = timeit(eob_records, EOB_FIELDS)
+    print(f'spool with {nbr_runs} runs ({path.stat().st_size / 1024 / 1024:.1f} MB) EOB records')
+    print(f'  all records  {all_time:8.3f} s')
+    print(f'  EOB fields   {fields_time:8.3f} s ({all_time / fields_time:.1f}x)')
+
+
+# Memory (tracemalloc) retained by all runs of a large spool decoded as before and as compact sections,
+# and by parameters kept as regex matches or table
+def bench_memory(nbr_runs=5000):
+    import tracemalloc
+    from aps.aps.spool import read_spool, match_parameter, Section, SectionReader, ParameterTable
+
+    app.spool_cache, app.spool_parallel_runs = False, 0
+    path = make_spool(Path(tempfile.mkdtemp(prefix='aps_spool_'), 'SPLFXX'), nbr_runs)
+    lines = path.read_text(errors='surrogateescape').splitlines()
+    ranges, legacy_cls = read_spool(path).runs.ranges, legacy.legacy_section(Section)
+
+    def traced(fnc):
+        tracemalloc.start()
+        data = fnc()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return data, current / 1024 / 1024, peak / 1024 / 1024
+
+    def legacy_runs():
+        runs, data = [], path.read_bytes()
+        for start, end in ranges:
+            reader = SectionReader(data[start:end])
+            reader.has_next()
+            runs.append(legacy_cls(reader))
+        return runs
+
+    def table(params):
+        parameters = ParameterTable()
+        for param in params:
+            parameters.add(param)
+        return parameters
+
+    _, old_mb, old_peak = traced(legacy_runs)
+    runs, current, peak = traced(lambda: list(read_spool(path).runs))
+    matches, match_mb, _ = traced(lambda: list(filter(None, map(match_parameter, lines))))
+    _, table_mb, _ = traced(lambda: table(matches))
+    print(f'spool with {len(runs)} runs ({path.stat().st_size / 1024 / 1024:.1f} MB)')
+    print(f'  decoded runs')
+    print(f'    baseline         {old_mb:8.1f} MB (peak {old_peak:.1f} MB)')
+    print(f'    compact          {current:8.1f} MB (peak {peak:.1f} MB) ({old_mb / current:.1f}x)')
+    print(f'  {len(matches)} parameters')
+    print(f'    regex matches    {match_mb:8.1f} MB')
+    print(f'    parameter table  {table_mb:8.1f} MB ({match_mb / table_mb:.1f}x)')
+
+
+# Compare serial and process pool decoding of all runs of a global solution spool
+def bench_parallel(nbr_runs=4000, workers=4):
+    from aps.aps.spool import read_spool, available_cpus
+
+    app.spool_cache, app.spool_workers = False, workers
+    path = make_spool(Path(tempfile.mkdtemp(prefix='aps_spool_'), 'SPLFGL'), nbr_runs)
+
+    def decode(threshold):
+        app.spool_parallel_runs = threshold
+        return list(read_spool(path).runs)
+
+    serial_time, _ = timeit(decode, 0, repeat=1)
+    parallel_time, _ = timeit(decode, 1, repeat=1)
+    workers = min(workers, available_cpus())
+    print(f'spool with {nbr_runs} runs ({path.stat().st_size / 1024 / 1024:.1f} MB) {available_cpus()} cpu')
+    print(f'  serial              {serial_time:8.3f} s')
+    print(f'  {workers} workers           {parallel_time:8.3f} s ({serial_time / parallel_time:.1f}x)')
+
+
+# Compare dict and columnar decoding of global section, including extraction of all positions and coordinates
+def bench_global_section(nbr_stations=5000, nbr_sources=20000):
+    from aps.aps.spool import Spool, to_radians
+
+    path = make_global_section(Path(tempfile.mkdtemp(prefix='aps_spool_'), 'SPLFGL'), nbr_stations, nbr_sources)
+
+    def old_coordinates():
+        stations, sources = legacy.loop_global_section(path.read_text(errors='surrogateescape').splitlines())
+        positions = np.array([[sta[comp][0] for comp in ('X', 'Y', 'Z', 'VX', 'VY', 'VZ')]
+                              for sta in stations.values()])
+        coordinates = np.array([[to_radians(' '.join(src['RT. ASC.'][0]), True), to_radians(' '.join(src['DEC.'][0]))]
+                                for src in sources.values()])
+        return positions, coordinates
+
+    def new_coordinates():
+        spool = Spool(path)
+        return np.hstack((spool.stations.positions()[0], spool.stations.velocities()[0])), \
+            spool.sources.coordinates()[0]
+
+    old_time, _ = timeit(old_coordinates)
+    new_time, _ = timeit(new_coordinates)
+    print(f'global section {nbr_stations} stations {nbr_sources} sources ({path.stat().st_size / 1024 / 1024:.1f} MB)')
+    print(f'  dicts      {old_time:8.3f} s')
+    print(f'  columns    {new_time:8.3f} s ({old_time / new_time:.1f}x)')
+
+
+# Compare reading plain and compressed (gzip, zstandard) spool files in folder (network mount if given).
+# Time to transfer file over a network with given bandwidth (MB/s) is added to local read time.
+def bench_compressed(folder=None, nbr_runs=2000, bandwidth=100):
+    import shutil
+    from aps.aps.spool import read_spool
+    from aps.utils.files import open_text, zstandard
+
+    folder = Path(folder or tempfile.mkdtemp(prefix='aps_spool_'))
+    plain = make_spool(Path(folder, 'SPLFXX'), nbr_runs)
+    paths = [plain]
+    for ext in ('.gz', '.zst') if zstandard else ('.gz',):
+        with open_text(plain, encoding='utf-8') as f_in, open_text(path := Path(folder, plain.name + ext), 'w') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        paths.append(path)
+
+    def read(path, use_cache):
+        app.spool_cache, app.spool_parallel_runs = use_cache, 0
+        return list(read_spool(path).runs)
+
+    print(f'spool with {nbr_runs} runs, network {bandwidth} MB/s ({folder})')
+    for path in paths:
+        size = path.stat().st_size / 1024 / 1024
+        app.spool_cache = False
+        first_time, _ = timeit(lambda: read_spool(path).runs[0])
+        all_time, _ = timeit(read, path, False, repeat=1)
+        read(path, True)  # Store spool in cache
+        cached_time, _ = timeit(lambda: read_spool(path).runs[0])
+        print(f'  {path.name:10s} {size:7.1f} MB first run {first_time:7.3f} s all runs {all_time:7.3f} s '
+              f'cached {cached_time:7.3f} s network {size / bandwidth + first_time:7.3f} s')
+
+
+# Compare loops and incidence matrix to count observations of large network and to remove stations
+def bench_incidence(nbr_stations=30, nbr_sources=300, nbr_scans=5000):
+    from aps.schedule.skd import SKD
+
+    stations, sources, scans = make_scans(nbr_stations, nbr_sources, nbr_scans, max_stations=nbr_stations // 2)
+    path = make_skd(Path(tempfile.mkdtemp(prefix='aps_skd_'), 'r41000.skd'), 'r41000', stations, sources, scans)
+
+    def reset(sched):
+        for src in sched.sources.values():
+            src['scheduled_obs'] = 0
+        return sched
+
+    old, new = read_schedule_file(legacy.legacy_schedule(SKD), path), read_schedule_file(SKD, path)
+    old_time, _ = timeit(lambda: legacy.loop_count_observations(reset(old)))
+    new_time, _ = timeit(lambda: new.count_observations())
+    removed = stations[:nbr_stations // 3]
+    old_remove, _ = timeit(legacy.loop_remove_stations, old, removed, repeat=1)
+    new_remove, _ = timeit(new.remove_stations, removed, repeat=1)
+    print(f'{nbr_stations} stations {len(new.scan_index)} scans {new.scheduled_obs} observations')
+    print(f'  count   loops {old_time * 1000:8.2f} ms matrix {new_time * 1000:8.2f} ms ({old_time / new_time:.1f}x)')
+    print(f'  remove  loops {old_remove * 1000:8.2f} ms matrix {new_remove * 1000:8.2f} ms '
+          f'({old_remove / new_remove:.1f}x)')
+
+
+# Compare construction time and retained memory of dict and array models of a large schedule.
+# Dict views of the array model are made when first needed.
+def bench_schedule_model(nbr_stations=20, nbr_sources=300, nbr_scans=5000):
+    import tracemalloc
+    from aps.schedule.skd import SKD
+
+    path = make_skd(Path(tempfile.mkdtemp(prefix='aps_skd_'), 'r41000.skd'), 'r41000',
+                    *make_scans(nbr_stations, nbr_sources, nbr_scans))
+
+    def retained(cls):
+        tracemalloc.start()
+        sched = read_schedule_file(cls, path)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return sched, size / 1024 / 1024
+
+    legacy_cls = legacy.legacy_schedule(SKD)
+    old_time, _ = timeit(read_schedule_file, legacy_cls, path)
+    new_time, new = timeit(read_schedule_file, SKD, path)
+    old_size, new_size = retained(legacy_cls)[1], retained(SKD)[1]
+    fresh = read_schedule_file(SKD, path)
+    views_time, _ = timeit(lambda: (fresh.obs_list, fresh.observations), repeat=1)
+    print(f'{path.name} {nbr_stations} stations {len(new.scan_index)} scans {len(new.obs_scan)} observations')
+    print(f'  dicts   read {old_time * 1000:8.2f} ms memory {old_size:7.1f} MB')
+    print(f'  arrays  read {new_time * 1000:8.2f} ms memory {new_size:7.1f} MB ({old_time / new_time:.1f}x '
+          f'{old_size / new_size:.1f}x)')
+    print(f'  dict views {views_time * 1000:8.2f} ms')
+
+
+# Compare deep comparison of observations with fingerprint of schedules
+def bench_schedule_fingerprint(nbr_stations=20, nbr_sources=300, nbr_scans=2000):
+    from aps.schedule.skd import SKD
+
+    path = make_skd(Path(tempfile.mkdtemp(prefix='aps_skd_'), 'r41000.skd'), 'r41000',
+                    *make_scans(nbr_stations, nbr_sources, nbr_scans))
+    skd, other = read_schedule_file(SKD, path), read_schedule_file(SKD, path)
+    loop_time, _ = timeit(legacy.loop_same_schedule, skd, other)
+    digest_time, _ = timeit(lambda: skd == other)
+    fingerprint_time, _ = timeit(lambda: skd.make_fingerprint())
+    print(f'{path.name} {nbr_stations} stations {len(skd.scan_index)} scans {skd.scheduled_obs} observations')
+    print(f'  compare observations {loop_time * 1000:8.2f} ms')
+    print(f'  compare fingerprints {digest_time * 1000:8.4f} ms ({loop_time / digest_time:.0f}x) '
+          f'fingerprint {fingerprint_time * 1000:8.2f} ms {skd.fingerprint.hex()[:16]}')
+
+
+# Compare wall time and allocations (tracemalloc peak) of original and selective VEX tokenizers
+def bench_vex(path=None):
+    import tracemalloc
+    from aps.schedule.vex import VEX
+
+    path = Path(path) if path else make_vex(Path(tempfile.mkdtemp(prefix='aps_vex_'), 'vt3001.vex'))
+
+    class OriginalVEX(VEX):
+        read_blocks = legacy.loop_vex_blocks
+
+    def tokenize(cls):
+        with cls(path) as sched:
+            sched.has_next()  # VEX_rev line
+            return sched.read_blocks()
+
+    def traced(cls):
+        tracemalloc.start()
+        tokenize(cls)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak / 1024 / 1024
+
+    old_time, _ = timeit(read_schedule_file, OriginalVEX, path, repeat=5)
+    new_time, new = timeit(read_schedule_file, VEX, path, repeat=5)
+    old_tokens, new_tokens = timeit(tokenize, OriginalVEX, repeat=5)[0], timeit(tokenize, VEX, repeat=5)[0]
+    print(f'{path.name} ({path.stat().st_size / 1024 / 1024:.1f} MB) {len(new.scans)} scans {len(new.stations["codes"])} stations')
+    print(f'  all blocks   read {old_time:7.3f} s tokenizer {old_tokens:7.3f} s peak {traced(OriginalVEX):6.1f} MB')
+    print(f'  used blocks  read {new_time:7.3f} s tokenizer {new_tokens:7.3f} s peak {traced(VEX):6.1f} MB '
+          f'({old_tokens / new_tokens:.1f}x)')
+
+
+# Compare parsing schedule with disk and in-memory caches of parsed schedule
+def bench_schedule_cache(nbr_stations=30, nbr_sources=300, nbr_scans=5000):
+    import aps.schedule
+    from aps.schedule import get_schedule
+
+    stations, sources, scans = make_scans(nbr_stations, nbr_sources, nbr_scans, max_stations=nbr_stations // 2)
+    folder = Path(tempfile.mkdtemp(prefix='aps_skd_'))
+    path = make_skd(Path(folder, 'r41000.skd'), 'r41000', stations, sources, scans)
+    session = Namespace(file_path=lambda code: Path(folder, f'r41000.{code}'), removed=['ab'])
+
+    def read(use_cache, memory):
+        app.schedule_cache = use_cache
+        if not memory:
+            aps.schedule._parsed.clear()
+        return get_schedule(session)
+
+    parse_time, old = timeit(read, False, False)
+    read(True, False)  # Store schedule in cache
+    disk_time, _ = timeit(read, True, False)
+    memory_time, _ = timeit(read, True, True)
+    print(f'{path.name} {nbr_stations} stations {len(old.scans)} scans')
+    print(f'  parse         {parse_time * 1000:8.2f} ms')
+    print(f'  disk cache    {disk_time * 1000:8.2f} ms ({parse_time / disk_time:.0f}x)')
+    print(f'  memory cache  {memory_time * 1000:8.2f} ms ({parse_time / memory_time:.0f}x)')
+
+
+# Synthetic vgosDB when no folder is given
+def vgosdb_folder(args):
+    return args.folder if args.folder else make_vgosdb(tempfile.mkdtemp(prefix='aps_vgosdb_'), nbr_scans=args.scans)
+
+
+# Schedule of vgosDB folder
+def schedule_path(args, folder):
+    return args.schedule if args.schedule else Path(Path(folder).parent, 'r41000.skd')
+
+
+def run_matcher(args):
+    folder = vgosdb_folder(args)
+    bench_matcher(folder, schedule_path(args, folder))
+
+
+def run_chunks(args):
+    folder = vgosdb_folder(args)
+    bench_chunks(folder, schedule_path(args, folder))
+
+
+# Benchmarks by name. Each function is called with the command line arguments
+BENCHMARKS = {
+    'statistics': lambda args: bench_statistics(vgosdb_folder(args)),
+    'utctime': lambda args: bench_utctime(vgosdb_folder(args)),
+    'matcher': run_matcher,
+    'cache': lambda args: bench_cache(vgosdb_folder(args)),
+    'wrappers': lambda args: bench_wrappers(vgosdb_folder(args)),
+    'strings': lambda args: bench_strings(vgosdb_folder(args)),
+    'repeat': lambda args: bench_repeat(vgosdb_folder(args)),
+    'prefetch': lambda args: bench_prefetch(vgosdb_folder(args)),
+    'chunks': run_chunks,
+    'spool': lambda args: bench_spool(),
+    'spool-cache': lambda args: bench_spool_cache(),
+    'classifier': lambda args: bench_classifier(args.folder),
+    'stats-tables': lambda args: bench_stats_tables(),
+    'stored-spool': lambda args: bench_stored_spool(),
+    'spool-fields': lambda args: bench_spool_fields(),
+    'memory': lambda args: bench_memory(),
+    'parallel': lambda args: bench_parallel(),
+    'global-section': lambda args: bench_global_section(),
+    'compressed': lambda args: bench_compressed(args.folder),
+    'incidence': lambda args: bench_incidence(),
+    'vex': lambda args: bench_vex(args.folder),
+    'schedule-cache': lambda args: bench_schedule_cache(),
+    'schedule-model': lambda args: bench_schedule_model(),
+    'schedule-fingerprint': lambda args: bench_schedule_fingerprint(),
+}
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='APS benchmarks')
+    parser.add_argument('-c', '--config', help='config file', required=False)
+    parser.add_argument('-f', '--folder', help='vgosDB folder, spool file (classifier), folder (compressed) or vex file (synthetic data if missing)', required=False)
+    parser.add_argument('-s', '--schedule', help='schedule file of vgosDB', required=False)
+    parser.add_argument('-n', '--scans', help='number of scans in synthetic vgosDB', type=int, default=5000)
+    parser.add_argument('test', help='benchmark to run', choices=list(BENCHMARKS))
+
+    args = parser.parse_args()
+    init_app(args.config)
+    BENCHMARKS[args.test](args)
+
+
+if __name__ == '__main__':
+
+    sys.exit(main())
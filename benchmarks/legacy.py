@@ -0,0 +1,409 @@
+# Original implementations replaced by faster code. They are the reference of the tests and the baseline of
+# the benchmarks.
+import os
+import re
+from pathlib import Path
+from datetime import datetime, timedelta
+
+import numpy as np
+from netCDF4 import Dataset
+
+from aps.utils import app, to_int
+
+
+# Statistics compiled with the original loop over all observations
+def loop_statistics(vgosdb):
+    good_qc = b'56789'
+    for index, bl, src, utc, qc_x, qc_s, fc_x, fc_s, flg in vgosdb.get_all_obs():
+        recoverable = 0 if flg > 1 else 1
+        good = usable = 0
+        if qc_s in good_qc and qc_x in good_qc:
+            good = 1
+            usable = 1 if flg == 0 else 0
+
+        vgosdb.recoverable += recoverable
+        vgosdb.used += usable
+        for key in [bl[0], bl[1], src, '{}-{}'.format(bl[0], bl[1])]:
+            stats = vgosdb.stats[key]
+            stats['good'] += good
+            stats['recov'] += recoverable
+            stats['used'] += usable
+            stats['corr'] += 1
+
+
+# UTC time decoded with the original strptime loop
+def loop_utctime(path):
+    from pytz import UTC
+
+    utc = []
+    with Dataset(path, 'r') as nc:
+        for ymdhm, second in zip(nc.variables['YMDHM'], nc.variables['Second']):
+            t_str = '{:02d}-{:02d}-{:02d} {:02d}:{:02d}:{:09.6f}'.format(*ymdhm, second)
+            try:
+                t = UTC.localize(datetime.strptime(t_str, '%y-%m-%d %H:%M:%S.%f'))
+            except:
+                t = UTC.localize(datetime.strptime(t_str, '%Y-%m-%d %H:%M:%S.%f'))
+            utc.append(t)
+    return np.ma.core.MaskedArray(utc)
+
+
+# Uncorrelated observations found with the original linear search
+def loop_uncorrelated(vgosdb, schedule):
+    from collections import defaultdict
+    from aps.utils.utctime import utc2epoch
+
+    corr, not_corr = defaultdict(list), []
+    for index, bl, src, utc, qc_x, qc_s, fc_x, fc_s, flg in vgosdb.get_all_obs():
+        corr[f'{bl[0]}:{bl[1]}:{src}'].append(utc)
+    removed = set(schedule.missed) | set(vgosdb.deselected_st)
+    for index, obs in enumerate(schedule.obs_list):
+        fr = obs['fr']
+        fr_name = schedule.stations['codes'][fr]['name']
+        if fr_name not in vgosdb.station_list or fr_name in removed:
+            continue
+        to = obs['to']
+        to_name = schedule.stations['codes'][to]['name']
+        if to_name not in vgosdb.station_list or to_name in removed:
+            continue
+        scan = obs['scan']
+        duration = min(scan['station_codes'][fr]['duration'], scan['station_codes'][to]['duration'])
+        start = scan['start']
+        first, last = utc2epoch(start), utc2epoch(start + timedelta(seconds=duration))
+        key = f'{fr_name}:{to_name}:{obs["scan"]["source"]}'
+        if key not in corr:
+            key = '{}:{}:{}'.format(to_name, fr_name, obs['scan']['source'])
+        if key not in corr or not any([first <= t <= last for t in corr[key]]):
+            not_corr.append(f"    observation of {obs['scan']['source']:8s} at {start.strftime('%H:%M:%S')}")
+    return not_corr
+
+
+# Observations by index (base 1) built with the original zip of the variables of the vgosDB
+def loop_all_obs(vgosdb):
+    baselines = vgosdb.get_data('Observation', 'Baseline', 'Baseline', is_str=True)
+    sources = vgosdb.get_data('Observation', 'Source', 'Source', is_str=True)
+    utc = vgosdb.get_data('Observation', 'TimeUTC', 'YMDHMS')
+    qc_x = vgosdb.get_data('Observation', 'QualityCode_bX', 'QualityCode')
+    qc_s = vgosdb.get_data('Observation', 'QualityCode_bS', 'QualityCode')
+    if qc_s.size == 0:
+        qc_s = qc_x
+    fc_x = vgosdb.get_data('Observation', 'CorrInfo_bX', 'FRNGERR')
+    if fc_x.size == 0:
+        fc_x = np.ma.core.MaskedArray([b' '] * vgosdb.correlated)
+    fc_s = vgosdb.get_data('Observation', 'CorrInfo_bS', 'FRNGERR')
+    if fc_s.size == 0:
+        fc_s = fc_x
+    flags = vgosdb.get_data('Observation', 'Edit', 'DelayFlag')
+    if flags.size == 0:
+        flags = np.ma.core.MaskedArray([0] * vgosdb.correlated)
+    indexes = np.arange(1, vgosdb.correlated + 1)
+    return {int(index): (tuple(bl), src, t, qcx, qcs, fcx, fcs, int(flg))
+            for index, bl, src, t, qcx, qcs, fcx, fcs, flg in zip(indexes, baselines, sources, utc, qc_x, qc_s, fc_x,
+                                                                     fc_s, flags)}
+
+
+# Rejected observations formatted with the original lookup in the dictionary of observations
+def loop_rejected_obs(all_obs, unusable, excluded):
+    from aps.utils import bstr
+    from aps.utils.utctime import epoch2utc
+
+    fmt_not = '{:4d}, {:8s}:{:8s}, {:8s}, {:8s}, quality code X: {} S: {}, fringe code X: \'{}\' S: \'{}\''.format
+    fmt_rej = '{:4d}, {:8s}:{:8s}, {:8s}, {:8s}, which fits at {:10.1f} +/- {:9.1f} ps'.format
+    lines = []
+    for index in unusable:
+        bl, src, utc, qc_x, qc_s, fc_x, fc_s, flg = all_obs[index]
+        lines.append(fmt_not(index, bl[0], bl[1], src, epoch2utc(utc).strftime('%H:%M:%S'),
+                             bstr(qc_x), bstr(qc_s), bstr(fc_x), bstr(fc_s)))
+    rejected = []
+    for index in sorted(excluded):
+        bl, src, utc, qc_x, qc_s, fc_x, fc_s, flg = all_obs[index]
+        rejected.append(fmt_rej(index, bl[0], bl[1], src, epoch2utc(utc).strftime('%H:%M:%S'), *excluded[index]))
+    return lines, rejected
+
+
+# Indexes of observations of each source, station or baseline (stations in any order) using a dictionary
+def loop_group_by(all_obs, indexes, key):
+    from collections import defaultdict
+
+    groups = defaultdict(list)
+    for index in indexes:
+        bl, src = all_obs[index][:2]
+        names = {'source': [src], 'station': list(bl), 'baseline': [frozenset(bl)]}[key]
+        for name in names:
+            groups[name].append(index)
+    return dict(groups)
+
+
+# Wrappers selected with the original sort of all wrappers
+def sorted_wrappers(folder):
+    from operator import attrgetter
+    from aps.vgosdb.wrapper import Wrapper
+
+    wrappers = []
+    for filename in os.listdir(folder):
+        if filename.endswith('.wrp'):
+            with Wrapper(os.path.join(folder, filename)) as wrp:
+                if wrp.version:
+                    wrp.read()
+                    wrappers.append(wrp)
+    first = lambda lst: lst[0] if lst else None
+    return (sorted(wrappers, key=attrgetter('version', 'time_tag'))[-1],
+            first(sorted(filter(lambda x: x.version == 'V001', wrappers), key=attrgetter('time_tag'))),
+            {agency: sorted(filter(lambda x: x.agency == agency and x.subset == 'all', wrappers),
+                            key=attrgetter('version'))[-1:] for agency in ['GSFC', 'BKG', 'USNO']},
+            {agency: first(sorted(filter(lambda x: x.agency == agency, wrappers), key=attrgetter('version')))
+             for agency in ['GSFC', 'BKG', 'USNO']})
+
+
+# Strings decoded with the original recursive decoding of each element
+def loop_S1(data, ndim):
+    clean = lambda value: value.tobytes().decode('utf-8').strip('\x00').strip()
+    return clean(data) if ndim < 1 else [loop_S1(value, ndim - 1) for value in data]
+
+
+# Runs decoded with the original line by line reading of the whole spool file
+def loop_spool(path):
+    from aps.aps.spool import Spool
+
+    with Spool(path) as spool:
+        if spool.read_global_section():
+            spool.read_sections()
+    return spool
+
+
+# Original decoding of line using all parameter regex and search of all needed records
+def loop_get_data(section, line):
+    from aps.aps.spool import Section, param_clock, param_coord, baseline_clock
+
+    if (param := param_clock(line)) or (param := param_coord(line)) or (param := baseline_clock(line)):
+        section.parameters.add(param)
+    else:
+        for string in Section.need.keys():
+            if string in line:
+                key, code = Section.need[string]
+                val, a_sigma, m_sigma, mjd = section.decode_eops(line) if code == 'EOP' else section.decode_nutation(line)
+                setattr(section, key, [val, a_sigma, m_sigma])
+                if not hasattr(section, Section.mjds[code]):
+                    setattr(section, Section.mjds[code], mjd)
+                return
+
+
+# Original regex decoding of statistics tables (one or two regex by row)
+baseline_data = re.compile(r' (?P<fr>.{8})\-(?P<to>.{8})(?P<used>[ 0-9]{4,5})/(?P<recov>[ 0-9]{5}).*').match
+baseline_nodata = re.compile(r' (?P<fr>.{8})\-(?P<to>.{8}).*No Data.*').match
+source_data = re.compile(r'(?:\s{5}|SRC_STAT:\s{2})(?P<name>.{8})\s[\sA-Z]\s+(?P<used>[0-9]+)[/\s]+(?P<recov>[0-9]+).*').match
+station_data = re.compile(r' {5}(?P<name>.{8})     (?P<used>[ 0-9]{5})/(?P<recov>[ 0-9]{5}).*').match
+
+
+def loop_stats(section, decoder):
+    stats = {}
+    while section.spl.has_next():
+        data = decoder(section.spl.line)
+        if data:
+            stats[data['name'].strip()] = {'used': to_int(data['used']), 'recov': to_int(data['recov'])}
+        elif stats:  # Stats not empty so it should be over
+            break
+    return stats
+
+
+def loop_baseline_stats(section):
+    stats = {}
+    while section.spl.has_next():
+        no_data, data = baseline_nodata(section.spl.line), baseline_data(section.spl.line)
+        if not no_data and not data and stats:  # Stats not empty so it should be over
+            break
+        if no_data:  # Database has no data
+            stats[f'{no_data["fr"].strip()}|{no_data["to"].strip()}'] = {'used': 0, 'recov': 0}
+        elif data:  # Process data
+            stats[f'{data["fr"].strip()}|{data["to"].strip()}'] = {'used': to_int(data['used']),
+                                                                   'recov': to_int(data['recov'])}
+    return stats
+
+
+# Original search of stored spool using recursive glob
+def glob_stored_spool(db_name):
+    import glob
+
+    root = app.folder('STORED_SPOOL')
+    files = [Path(file) for file in glob.glob(f'{root}/**/{db_name}.SFF', recursive=True)]
+    files.sort(key=lambda x: x.stat().st_mtime, reverse=True)
+    return files[0] if files else None
+
+
+# Section as decoded before the compact representation. Reader and its text are kept with section,
+# parameters are regex matches pinning their lines and correlations are a list
+def legacy_section(cls):
+    from aps.aps.spool import match_parameter
+
+    class LegacySection(cls):
+
+        def __init__(self, spl, fields=None):
+            self.matches = []
+            super().__init__(spl, fields)
+            self.spl, self.parameters, self.CORRELATION = spl, self.matches, list(self.CORRELATION)
+
+        def get_data(self, line, parameters=True):
+            if parameters and (param := match_parameter(line)):
+                self.matches.append(param)
+                return False
+            return super().get_data(line, parameters=False)
+
+    return LegacySection
+
+
+# Original decoding of global section into one dict by station and source
+def loop_global_section(lines):
+    from aps.utils import to_float
+
+    stations, sources, index = {}, {}, 0
+    new_station = lambda: {key: (None, None) for key in ('X', 'Y', 'Z', 'VX', 'VY', 'VZ')}
+    for line in lines:
+        if line[5:6] == '.' and line[0:5].strip().isdigit() and int(line[0:5]) == index + 1:
+            index += 1
+            if line[27:28] in 'XYZ':
+                name, coord, code = line[7:15].strip(), line[27:28], line[29:35].strip()
+                coord = 'V' + coord if code == 'Velo' else coord
+                sta = stations.setdefault(name if code in ('Comp', 'Velo') else f'{name}_{code}', new_station())
+                sta[coord] = (to_float(line[39:53]), to_float(line[83:93]))
+            elif (code := line[17:28].strip()) in ('RT. ASC.', 'DEC.'):
+                src = sources.setdefault(line[8:16], {'RT. ASC.': (None, None), 'DEC.': (None, None)})
+                src[code] = (line[34:52].strip().split(), to_float(line[81:93]))
+        elif line[17:28] == 'CORRELATION':
+            sources.setdefault(line[8:16], {'RT. ASC.': (None, None), 'DEC.': (None, None)})['CORRELATION'] = \
+                to_float(line[32:39])
+    return stations, sources
+
+
+# Original count of observations walking scans of each station for every baseline
+def loop_count_observations(sched):
+    scheduled = 0
+    for code, sta in sched.stations['codes'].items():
+        sta['scheduled_obs'] = sum(len(scan['station_codes']) - 1 for scan in sta['scans'].values())
+        scheduled += sta['scheduled_obs']
+    sched.scheduled_obs = int(scheduled / 2)
+    for name, src in sched.sources.items():
+        if name in sched.observations:
+            src['scheduled_obs'] += sum(len(scans) for info in sched.observations[name].values()
+                                        for scans in info.values())
+    names = sorted(sched.stations['names'].keys())
+    for index, fr in enumerate(names):
+        sta = sched.stations['names'][fr]
+        for to in names[index+1:]:
+            code = sched.stations['names'][to]['code']
+            sched.baselines[f'{fr}-{to}'] = sum(1 for scan in sta['scans'].values() if code in scan['station_codes'])
+
+
+# Original removal of stations walking all scans for each station
+def loop_remove_stations(sched, stations):
+    for name in stations:
+        if sta_code := sched.get_station_code(name):
+            for scan_name in list(sched.scans.keys()):
+                sta_lst = sched.scans[scan_name]['station_codes']
+                if sta_code in sta_lst:
+                    sta_lst.pop(sta_code)
+                    if len(sta_lst) == 1:
+                        sched.stations['codes'][list(sta_lst.keys())[0]]['scans'].pop(scan_name)
+                        sched.scans.pop(scan_name)
+                    sched.stations['codes'][sta_code]['scans'].pop(scan_name)
+    loop_count_observations(sched)
+    return sched.scheduled_obs
+
+
+# Original dict model of schedule. Scans and observations are dicts referenced by stations, sources and baselines
+def legacy_schedule(cls):
+    from collections import OrderedDict
+    from aps.schedule.skd import SKD
+
+    class LegacySchedule(cls):
+        scans = obs_list = observations = None
+
+        def set_scans(self, scans):
+            self.scans, self.observations, self.obs_list = OrderedDict(), OrderedDict(), []
+            for info in list(self.stations['codes'].values()) + list(self.sources.values()):
+                info['scans'] = OrderedDict()
+            for record in scans:
+                name, scan = record.name, SKD.init_scan(record.name, record.source, record.start)
+                self.scans[name] = scan
+                for code, duration in record.durations.items():
+                    if code in self.stations['codes']:
+                        scan['station_codes'][code] = {'duration': duration}
+                        self.stations['codes'][code]['scans'][name] = scan
+                scan['station_codes'] = OrderedDict(sorted(scan['station_codes'].items()))
+                if scan['source'] in self.sources:
+                    self.sources[scan['source']]['scans'][name] = scan
+                src = self.observations.setdefault(scan['source'], {})
+                for fr in scan['station_codes']:
+                    src.setdefault(fr, {})
+                    for to in scan['station_codes']:
+                        if fr < to:
+                            obs = SKD.init_obs(scan, fr, to)
+                            src[fr].setdefault(to, []).append(obs)
+                            self.obs_list.append(obs)
+            self.set_first_sources()
+            self.count_observations()
+
+        def set_first_sources(self):
+            for sta in self.stations['codes'].values():
+                if sta['scans']:
+                    sta['first_source'] = list(sta['scans'].values())[0]['source']
+
+        def count_observations(self):
+            for src in self.sources.values():
+                src['scheduled_obs'] = 0
+            loop_count_observations(self)
+
+        remove_stations = loop_remove_stations
+
+    return LegacySchedule
+
+
+# Original comparison walking the observations of both schedules
+def loop_same_schedule(first, second):
+    if first.session_code != second.session_code or first.scheduled_obs != second.scheduled_obs or \
+            len(first.observations) != len(second.observations):
+        return False
+
+    def is_same(one, two):
+        if isinstance(one, dict):
+            return len(one) == len(two) and all(k1 == k2 and is_same(v1, v2)
+                                                for (k1, v1), (k2, v2) in zip(one.items(), two.items()))
+        if isinstance(one, list):
+            return len(one) == len(two) and all(is_same(a, b) for a, b in zip(one, two))
+        return one == two
+
+    return all(src1 == src2 and is_same(obs1, obs2) for (src1, obs1), (src2, obs2)
+               in zip(first.observations.items(), second.observations.items()))
+
+
+# Original VEX tokenizer. All statements of all blocks are decoded into records
+def loop_vex_blocks(sched):
+    from collections import defaultdict
+
+    blocks = defaultdict(dict)
+    block, literal = '', False
+    while sched.has_next():
+        for part in sched.line.strip().split(';'):
+            if not (part := part.strip()) or part.startswith('*'):
+                continue
+            if part.startswith('end_literal'):
+                literal = False
+            elif literal:
+                continue
+            elif part.startswith('start_literal'):
+                literal = True
+            elif part.startswith('$'):
+                block = part[1:]
+            elif part.startswith('enddef') or part.startswith('endscan'):
+                blocks[block][record['code']] = record
+            elif part.startswith('def ') or part.startswith('scan '):
+                record = {'code': part.split()[1], 'ref': defaultdict(list)}
+            elif part.startswith('ref '):
+                key = (info := part[3:].split('='))[0].strip()[1:]
+                if block == 'GLOBAL':
+                    blocks[block][key] = info[1].strip()
+                else:
+                    record['ref'][key].append(info[1].strip())
+            elif '=' in part:
+                if (key := (info := part.split('='))[0].strip()) not in record:
+                    record[key] = []
+                record[key].append(info[1].strip().split(':'))
+    return blocks
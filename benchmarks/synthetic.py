@@ -0,0 +1,315 @@
+# Writers of synthetic vgosDB, schedule and spool files used by tests and benchmarks
+import shutil
+from pathlib import Path
+from datetime import datetime, timedelta
+
+import numpy as np
+from netCDF4 import Dataset
+
+
+# Write S1 variable from list of strings
+def add_string_var(nc, name, values, dims, length):
+    if f'Dim{length}' not in nc.dimensions:
+        nc.createDimension(f'Dim{length}', length)
+    var = nc.createVariable(name, 'S1', (*dims, f'Dim{length}'))
+    data = np.array(values, dtype=f'S{length}')
+    var[:] = data.view('S1').reshape(*data.shape, length)
+    return var
+
+
+# Create netCDF file with NumObs dimension
+def make_nc(path, nbr):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    nc = Dataset(path, 'w')
+    nc.createDimension('NumObs', nbr)
+    return nc
+
+
+# Random scans (name, start, source, durations by station name) with 2 to max_stations stations
+def make_scans(nbr_stations=20, nbr_sources=300, nbr_scans=5000, max_stations=None, seed=0):
+    rng = np.random.default_rng(seed)
+    stations = [f'STA{i:05d}' for i in range(nbr_stations)]
+    sources = [f'{i:04d}+{i % 100:03d}' for i in range(nbr_sources)]
+    start, scans = datetime(2023, 1, 1), []
+    for index in range(nbr_scans):
+        names = sorted(rng.choice(nbr_stations, rng.integers(2, (max_stations or nbr_stations) + 1),
+                                  replace=False).tolist())
+        scans.append((index, start + timedelta(seconds=index * 30), sources[rng.integers(nbr_sources)],
+                      {stations[i]: int(rng.integers(30, 300)) for i in names}))
+    return stations, sources, scans
+
+
+# Write a sked file using list of scans
+def make_skd(path, ses_id, stations, sources, scans):
+    keys = {name: (chr(65 + i), f'{chr(65 + i)}{chr(97 + i)}') for i, name in enumerate(stations)}
+    with open(path, 'w') as skd:
+        print(f'$EXPER {ses_id.upper()}', file=skd)
+        print('$PARAM', file=skd)
+        print(f'SCHEDULER NVI CORRELATOR WASH START {scans[0][1].strftime("%Y%j%H%M%S")} '
+              f'END {scans[-1][1].strftime("%Y%j%H%M%S")}', file=skd)
+        print('$SOURCES', file=skd)
+        for name in sources:
+            print(f'{name} $ 00 00 00.0 +00 00 00.0 2000.0 0.0', file=skd)
+        print('$STATIONS', file=skd)
+        for name, (key, code) in keys.items():
+            print(f'A {key} {name} AZEL 0 0 0 0 0 0 0 0 0 0 {code} 0', file=skd)
+        print('$SKED', file=skd)
+        for name, start, source, durations in scans:
+            ids = ''.join(f'{keys[sta][0]}-' for sta in durations)
+            filler = ' '.join(['1F000000'] * len(durations))
+            print(f'{source} 10 SX PREOB {start.strftime("%y%j%H%M%S")} 120 MIDOB 0 POSTOB {ids} 1F000000 {filler} '
+                  f'{" ".join(str(val) for val in durations.values())}', file=skd)
+    return path
+
+
+# Make a synthetic vgosDB with random observations and its sked file. Some scheduled observations are not correlated
+def make_vgosdb(folder, nbr_stations=20, nbr_sources=200, nbr_scans=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    db_name, ses_id = '20230101-r41000', 'r41000'
+    folder = Path(folder, db_name)
+    stations = [f'STA{i:05d}' for i in range(nbr_stations)]
+    sources = [f'{i:04d}+{i % 100:03d}' for i in range(nbr_sources)]
+
+    # Make scans with random stations
+    start, scans, obs = datetime(2023, 1, 1), [], []
+    for index in range(nbr_scans):
+        t = start + timedelta(seconds=int(index * 86400 / nbr_scans))
+        src = sources[rng.integers(nbr_sources)]
+        names = sorted(rng.choice(nbr_stations, size=rng.integers(2, min(nbr_stations, 8) + 1), replace=False))
+        durations = {stations[i]: int(rng.integers(30, 120)) for i in names}
+        scans.append((f'{t.strftime("%j-%H%M")}', t, src, durations))
+        for i, fr in enumerate(names):
+            for to in names[i + 1:]:
+                if rng.uniform() > 0.02:
+                    fr_name, to_name = stations[fr], stations[to]
+                    offset = float(rng.uniform(0, min(durations[fr_name], durations[to_name])))
+                    obs.append((fr_name, to_name, src, t + timedelta(seconds=offset)))
+    make_skd(Path(folder.parent, f'{ses_id}.skd'), ses_id, stations, sources, scans)
+    nbr = len(obs)
+
+    # Head.nc
+    with make_nc(Path(folder, 'Head.nc'), nbr) as nc:
+        nc.createDimension('DimUnity', 1)
+        add_string_var(nc, 'CreateTime', ['2023/01/02 10:00:00 UTC'], [], 23)
+        add_string_var(nc, 'Program', ['make_vgosdb'], [], 11)
+        add_string_var(nc, 'Correlator', ['WASH'], [], 4)
+        add_string_var(nc, 'CorrelatorType', ['DIFX'], [], 4)
+        nc.createVariable('NumObs', 'i4', ('DimUnity',))[:] = nbr
+        nc.createDimension('NumStation', nbr_stations)
+        add_string_var(nc, 'StationList', stations, ['NumStation'], 8)
+        nc.createDimension('NumSource', nbr_sources)
+        add_string_var(nc, 'SourceList', sources, ['NumSource'], 8)
+
+    # Observables
+    with make_nc(Path(folder, 'Observables', 'Baseline.nc'), nbr) as nc:
+        nc.createDimension('DimBaseline', 2)
+        add_string_var(nc, 'Baseline', [[fr, to] for fr, to, _, _ in obs], ['NumObs', 'DimBaseline'], 8)
+    with make_nc(Path(folder, 'Observables', 'Source.nc'), nbr) as nc:
+        add_string_var(nc, 'Source', [src for _, _, src, _ in obs], ['NumObs'], 8)
+    with make_nc(Path(folder, 'Observables', 'TimeUTC.nc'), nbr) as nc:
+        nc.createDimension('DimYMDHM', 5)
+        nc.createVariable('YMDHM', 'i2', ('NumObs', 'DimYMDHM'))[:] = \
+            [[t.year % 100, t.month, t.day, t.hour, t.minute] for *_, t in obs]
+        nc.createVariable('Second', 'f8', ('NumObs',))[:] = [t.second + t.microsecond / 1e6 for *_, t in obs]
+    for band, codes in [('X', b'0123456789'), ('S', b'056789')]:
+        with make_nc(Path(folder, 'Observables', f'QualityCode_b{band}.nc'), nbr) as nc:
+            qc = np.frombuffer(codes, dtype='S1')[rng.integers(len(codes), size=nbr)]
+            nc.createVariable('QualityCode', 'S1', ('NumObs',))[:] = qc
+        with make_nc(Path(folder, 'Observables', f'CorrInfo-difx_b{band}.nc'), nbr) as nc:
+            fc = np.frombuffer(b'  AB', dtype='S1')[rng.integers(4, size=nbr)]
+            nc.createVariable('FRNGERR', 'S1', ('NumObs',))[:] = fc
+    with make_nc(Path(folder, 'ObsEdit', 'Edit.nc'), nbr) as nc:
+        nc.createVariable('DelayFlag', 'i2', ('NumObs',))[:] = rng.choice([0, 0, 0, 1, 2], size=nbr)
+
+    # Scans
+    with make_nc(Path(folder, 'Scan', 'TimeUTC.nc'), nbr_scans) as nc:
+        nc.renameDimension('NumObs', 'NumScans')
+        nc.createDimension('DimYMDHM', 5)
+        nc.createVariable('YMDHM', 'i2', ('NumScans', 'DimYMDHM'))[:] = \
+            [[t.year % 100, t.month, t.day, t.hour, t.minute] for _, t, *_ in scans]
+        nc.createVariable('Second', 'f8', ('NumScans',))[:] = [t.second for _, t, *_ in scans]
+    with make_nc(Path(folder, 'Scan', 'ScanName.nc'), nbr_scans) as nc:
+        nc.renameDimension('NumObs', 'NumScans')
+        add_string_var(nc, 'ScanName', [name for name, *_ in scans], ['NumScans'], 8)
+        add_string_var(nc, 'ScanNameFull', [name for name, *_ in scans], ['NumScans'], 8)
+
+    # Wrapper
+    lines = ['VERSION 1.00', 'Begin History', 'Begin Process vgosDbMake', 'RunTimeTag 2023/01/02 10:00:00 UTC',
+             f'History {db_name}_V001_kall.hist', 'End Process vgosDbMake', 'End History',
+             'Begin Session', 'Head.nc', 'End Session',
+             'Begin Scan', 'Default_Dir Scan', 'TimeUTC.nc', 'ScanName.nc', 'End Scan',
+             'Begin Observation', 'Default_Dir Observables', 'Baseline.nc', 'Source.nc', 'TimeUTC.nc',
+             'QualityCode_bX.nc', 'QualityCode_bS.nc', 'CorrInfo-difx_bX.nc', 'CorrInfo-difx_bS.nc',
+             'Default_Dir ObsEdit', 'Edit.nc', 'End Observation']
+    for name in [f'{db_name}_V001_kall.wrp', f'{db_name}_V004_iGSFC_kall.wrp']:
+        Path(folder, name).write_text('\n'.join(lines) + '\n')
+    return folder
+
+
+# Copy wrappers of vgosDB in new folder and add versions for many agencies
+def copy_wrappers(folder, wrp_folder, nbr_wrappers):
+    wrp_folder = Path(wrp_folder, Path(folder).name)
+    wrp_folder.mkdir()
+    for path in Path(folder).glob('*.wrp'):
+        shutil.copy(path, wrp_folder)
+    text = path.read_text()
+    for index in range(nbr_wrappers):
+        agency, subset = ['GSFC', 'BKG', 'USNO'][index % 3], ['kall', 'kfixed'][index % 2]
+        tag = f'RunTimeTag 2023/01/{3 + index % 20:02d} 10:00:00 UTC'
+        Path(wrp_folder, f'{Path(folder).name}_V{5 + index // 4:03d}_i{agency}_{subset}.wrp')\
+            .write_text(text.replace('RunTimeTag 2023/01/02 10:00:00 UTC', tag))
+    return wrp_folder
+
+
+# Place fields at fixed columns of a line
+def fixed_line(*fields, width=120):
+    line = [' '] * width
+    for col, text in fields:
+        line[col:col + len(text)] = list(text)
+    return ''.join(line).rstrip()
+
+
+# Write a spool file with many runs (POST2005 format). Each run has statistics, parameters, EOP and nutation records
+def make_spool(path, nbr_runs=1000, nbr_stations=10, nbr_sources=50, seed=0):
+    rng = np.random.default_rng(seed)
+    stations = [f'STA{i:05d}' for i in range(nbr_stations)]
+    sources = [f'{i:04d}+{i % 100:03d}' for i in range(nbr_sources)]
+    eops = [('. X Wobble  0', 1.0), ('. X Wobble  1', 0.1), ('. Y Wobble  0', 1.0), ('. Y Wobble  1', 0.1),
+            ('. UT1-TAI   0', 1.0), ('. UT1-TAI   1', 0.1), ('. UT1-TAI   2', 0.01)]
+    with open(path, 'w') as spl:
+        print('1  APR  Earth orientation: apriori.erp', file=spl)
+        for run in range(nbr_runs):
+            t = datetime(2020, 1, 1) + timedelta(days=run)
+            db_name = f'{t.strftime("%Y%m%d")}-r4{run % 1000:03d}'
+            epoch = t.strftime('%Y.%m.%d-%H:%M:%S.000')
+            print(f'1Run {run + 1:05d}/1 {t.strftime("%Y.%m.%d-%H:%M:%S")}', file=spl)
+            print(f' Data base {db_name} <1>', file=spl)
+            print(f'{"Listing_Options:":18s}SEG_STYLE POST2005 BAS_STYLE OFF', file=spl)
+            print(f'{"Experiment code:":18s}r4{run % 1000:03d}', file=spl)
+            print('  Flyby Station Cals:    DB Station Cals:    Flyby Source Cals:', file=spl)
+            print(' Actual duration:  86400.000 sec', file=spl)
+            print(f'   Delay   {rng.integers(1000, 9999):6d}  {rng.uniform(10, 50):10.3f} ps  chi', file=spl)
+            print(f'   Rate    {rng.integers(1000, 9999):6d}  {rng.uniform(10, 50):10.3f} fs/s  chi', file=spl)
+            print(' Number of potentially recoverable observations', ' ' * 7, f'{rng.integers(9999):5d}',
+                  sep='', file=spl)
+            print(' Baseline Statistics', file=spl)
+            for i, fr in enumerate(stations):
+                for to in stations[i + 1:]:
+                    print(f' {fr}-{to}{rng.integers(999):5d}/{rng.integers(999, 9999):5d}  12.3', file=spl)
+            print('', file=spl)
+            print(' Source Statistics', file=spl)
+            for name in sources:
+                print(f'     {name} A   {rng.integers(99):5d} / {rng.integers(99, 999):5d}', file=spl)
+            print('', file=spl)
+            print(' Station Statistics', file=spl)
+            for name in stations:
+                print(f'     {name}     {rng.integers(999):5d}/{rng.integers(999, 9999):5d}', file=spl)
+            print('', file=spl)
+            index = 0
+            for name in stations:
+                for code in ['CL 0', 'CL 1', 'AT 0']:
+                    index += 1
+                    print(f'{index:5d}. {name} {code} {t.strftime("%y/%m/%d %H:%M")}   {rng.normal():10.3f}', file=spl)
+                for comp in 'XYZ':
+                    index += 1
+                    print(f'{index:5d}. {name}            {comp} Comp  {rng.normal() * 1e6:15.2f}', file=spl)
+            for name, scale in eops:
+                index += 1
+                print(fixed_line((0, f'{index:5d}{name}'), (21, epoch), (45, f'{rng.normal() * scale:12.4f}'),
+                                 (85, f'{rng.uniform(1, 100):10.2f}'), (105, f'{rng.uniform(1, 100):11.2f}')), file=spl)
+            for name in ['Nutation Dx   wrt   apriori model', 'Nutation Dy   wrt   apriori model']:
+                print(fixed_line((6, name), (41, epoch), (65, f'{rng.normal():9.3f}'),
+                                 (79, f'{rng.uniform(1, 100):10.3f}'), (100, f'{rng.uniform(1, 100):10.3f}')), file=spl)
+            print(' EOP Correlations:', file=spl)
+            for row in range(8):
+                print(' ' * 12 + ''.join(f'{val:8.4f}' for val in rng.uniform(-1, 1, row + 1)) + '  1.0000', file=spl)
+    return path
+
+
+# Write global section of a spool file with station positions, velocities and source coordinates
+def make_global_section(path, nbr_stations=5000, nbr_sources=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    with open(path, 'w') as spl:
+        index = 0
+        for i in range(nbr_stations):
+            for code in ('Comp', 'Velo'):
+                for comp in 'XYZ':
+                    index += 1
+                    print(fixed_line((0, f'{index:5d}. STA{i:05d}'), (27, f'{comp} {code}'),
+                                     (39, f'{rng.normal() * 1e6:14.5f}'), (83, f'{rng.uniform():10.5f}')), file=spl)
+        for i in range(nbr_sources):
+            name = f'{i:04d}+{i % 100:03d}'
+            ra = f'{rng.integers(24):02d} {rng.integers(60):02d} {rng.uniform(0, 60):11.8f}'
+            dec = f'{rng.integers(-89, 90):+03d} {rng.integers(60):02d} {rng.uniform(0, 60):10.7f}'
+            for code, angle in (('RT. ASC.', ra), ('DEC.', dec)):
+                index += 1
+                print(fixed_line((0, f'{index:5d}.  {name}'), (17, code), (34, angle),
+                                 (81, f'{rng.uniform():12.4f}')), file=spl)
+            print(fixed_line((8, name), (17, 'CORRELATION'), (32, f'{rng.uniform(-1, 1):7.4f}')), file=spl)
+    return path
+
+
+# Write the scans of a sked file (see make_skd) in a vex file with the used blocks only
+def make_skd_vex(path, ses_id, stations, sources, scans):
+    codes = {name: f'{chr(65 + i)}{chr(97 + i)}' for i, name in enumerate(stations)}
+    with open(path, 'w') as vex:
+        print('VEX_rev = 1.5;', '$EXPER;', f'def {ses_id.upper()};', f'    exper_name = {ses_id.upper()};',
+              '    target_correlator = WASH;', 'enddef;', sep='\n', file=vex)
+        print('$STATION;', *(f'def {code};\n    ref $SITE = {name};\nenddef;' for name, code in codes.items()),
+              sep='\n', file=vex)
+        print('$SITE;', *(f'def {name};\n    site_name = {name};\n    site_ID = {code};\nenddef;'
+                          for name, code in codes.items()), sep='\n', file=vex)
+        print('$SOURCE;', *(f'def {name};\n    source_name = {name};\nenddef;' for name in sources), sep='\n',
+              file=vex)
+        print('$SCHED;', file=vex)
+        for name, start, source, durations in scans:
+            print(f'scan No{name:04d};', f'    start = {start.strftime("%Yy%jd%Hh%Mm%Ss")};', f'    source = {source};',
+                  *(f'    station = {codes[sta]} : 0 sec : {duration} sec : 0.000 GB : : &ccw : 1;'
+                    for sta, duration in durations.items()), 'endscan;', sep='\n', file=vex)
+    return path
+
+
+# Write a VGOS vex file with frequency setup (64 channels) for each station and scans of 24 hours
+def make_vex(path, nbr_stations=10, nbr_sources=300, nbr_scans=1500, seed=0):
+    rng = np.random.default_rng(seed)
+    codes = [f'{chr(65 + i)}{chr(97 + i)}' for i in range(nbr_stations)]
+    sources = [f'{i:04d}+{i % 100:03d}' for i in range(nbr_sources)]
+    start = datetime(2023, 1, 1)
+    with open(path, 'w') as vex:
+        print('VEX_rev = 1.5;', '$GLOBAL;', '    ref $EXPER = VT3001;', '$EXPER;', 'def VT3001;',
+              '    exper_name = VT3001;', '    target_correlator = WACO;', 'enddef;', sep='\n', file=vex)
+        print('$MODE;', 'def VGOS;', *(f'    ref ${block} = {block}_{code}:{code};' for code in codes
+                                        for block in ('FREQ', 'BBC', 'IF', 'TRACKS', 'PHASE_CAL_DETECT')),
+              'enddef;', sep='\n', file=vex)
+        print('$STATION;', *(f'def {code};\n    ref $SITE = SITE{code};\n    ref $ANTENNA = ANT{code};\nenddef;'
+                             for code in codes), sep='\n', file=vex)
+        print('$SITE;', *(f'def SITE{code};\n    site_type = fixed;\n    site_name = SITE{code};\n'
+                          f'    site_ID = {code};\n    site_position = 1.0 m : 2.0 m : 3.0 m;\nenddef;'
+                          for code in codes), sep='\n', file=vex)
+        print('$SOURCE;', *(f'def {name};\n    source_name = {name};\n    ra = 00h00m00.0s;\n'
+                            f'    dec = 00d00\'00.0";\n    ref_coord_frame = J2000;\nenddef;' for name in sources),
+              sep='\n', file=vex)
+        for block, line in [('FREQ', 'chan_def = &X : {freq:.2f} MHz : U : 32.00 MHz : &CH{ch:02d} : &BBC{ch:02d} : &L_cal'),
+                            ('BBC', 'BBC_assign = &BBC{ch:02d} : {ch} : &IF_{ch}'),
+                            ('IF', 'if_def = &IF_{ch} : {ch} : X : 5000.00 MHz : U : 5 MHz : 0 Hz'),
+                            ('TRACKS', 'fanout_def = : &CH{ch:02d} : sign : 1 : {ch}'),
+                            ('PHASE_CAL_DETECT', 'phase_cal_detect = &PCD{ch:02d} : {ch} : 2 : 3')]:
+            print(f'${block};', file=vex)
+            for code in codes:
+                print(f'def {block}_{code};', file=vex)
+                for ch in range(64):
+                    print('    ' + line.format(freq=3000 + ch * 32, ch=ch) + ';', file=vex)
+                print('enddef;', file=vex)
+        print('$SCHEDULING_PARAMS;', 'start_literal(VieSched++);', *(f'scan {i} {code}' for i in range(2000)
+                                                                     for code in codes[:2]),
+              'end_literal(VieSched++);', sep='\n', file=vex)
+        print('$SCHED;', file=vex)
+        for index in range(nbr_scans):
+            t = start + timedelta(seconds=index * 57)
+            print(f'scan No{index + 1:04d};', f'    start = {t.strftime("%Yy%jd%Hh%Mm%Ss")};', '    mode = VGOS;',
+                  f'    source = {sources[rng.integers(nbr_sources)]};', sep='\n', file=vex)
+            for i in sorted(rng.choice(nbr_stations, rng.integers(2, nbr_stations + 1), replace=False).tolist()):
+                print(f'    station = {codes[i]} : 0 sec : {rng.integers(10, 60)} sec : 0.000 GB : : &ccw : 1;',
+                      file=vex)
+            print('endscan;', file=vex)
+    return path
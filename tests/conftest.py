@@ -0,0 +1,16 @@
+from argparse import Namespace
+
+import pytest
+
+from aps.utils import app
+
+
+# Application using an empty database and cache folder of the test session
+@pytest.fixture(scope='session', autouse=True)
+def config(tmp_path_factory):
+    folder = tmp_path_factory.mktemp('aps')
+    path = folder / 'aps.conf'
+    path.write_text(f'database = "{folder / "aps.db"}"\ncache_dir = "{folder / "cache"}"\n')
+    app.init(Namespace(config=str(path)))
+    return path
+
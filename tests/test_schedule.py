@@ -0,0 +1,169 @@
+from types import SimpleNamespace
+from datetime import datetime
+
+import pytest
+
+import aps.schedule
+from aps.utils import app
+from aps.ivsdb import models
+from aps.schedule import read_schedule, schedule_changed, get_schedule
+from aps.schedule.skd import SKD
+from aps.schedule.vex import VEX
+from benchmarks.legacy import legacy_schedule, loop_same_schedule, loop_vex_blocks
+from benchmarks.synthetic import make_scans, make_skd, make_skd_vex, make_vex
+
+
+@pytest.fixture
+def skd_path(tmp_path):
+    aps.schedule._parsed.clear()
+    return make_skd(tmp_path / 'r41000.skd', 'r41000', *make_scans(6, 10, 50))
+
+
+# Counts and scans of a schedule that can be compared
+def schedule_state(sched):
+    return sched.scheduled_obs, dict(sched.baselines), list(sched.scans), sched.durations.tolist(), \
+        {code: (sta['scheduled_obs'], sta['first_source'], list(sta['scans']))
+         for code, sta in sched.stations['codes'].items()}, \
+        {name: (src['scheduled_obs'], list(src['scans'])) for name, src in sched.sources.items()}
+
+
+def test_read_schedule_returns_independent_copies(skd_path):
+    first = read_schedule(SKD(skd_path))
+    expected = schedule_state(first)
+    first.remove_stations(['STA00000'])
+    first.stations['codes']['Bb']['correlated'] = 99
+    first.stations['removed'].append('Cc')
+    assert first.baselines['STA00000-STA00001'] == 0 and first.stations['codes']['Aa']['scheduled_obs'] == 0
+
+    second = read_schedule(SKD(skd_path))
+    assert schedule_state(second) == expected
+    assert second.stations['codes']['Bb']['correlated'] == 0 and second.stations['removed'] == []
+    assert second.stations['names']['STA00001'] is second.stations['codes']['Bb']
+
+
+def test_copy_views_use_copy_arrays(skd_path):
+    first, second = read_schedule(SKD(skd_path)), read_schedule(SKD(skd_path))
+    first.remove_stations(['STA00000'])
+    assert len(first.stations['codes']['Aa']['scans']) == 0
+    assert all('Aa' not in scan['station_codes'] for scan in first.stations['codes']['Bb']['scans'].values())
+    assert len(second.stations['codes']['Aa']['scans']) == (second.durations[:, 0] >= 0).sum() > 0
+
+
+def test_equal_schedules(skd_path):
+    first, second = read_schedule(SKD(skd_path)), read_schedule(SKD(skd_path))
+    baselines = first.baselines
+    assert first == second
+    second.remove_stations(['STA00000'])
+    assert first != second and first.baselines is baselines and second.baselines is not baselines
+
+
+def test_fingerprint_of_skd_and_vex(tmp_path):
+    stations, sources, scans = make_scans(6, 10, 50)
+    skd = read_schedule(SKD(make_skd(tmp_path / 'r41000.skd', 'r41000', stations, sources, scans)))
+    vex = read_schedule(VEX(make_skd_vex(tmp_path / 'r41000.vex', 'r41000', stations, sources, scans)))
+    assert len(skd.fingerprint) == 32 and skd == vex
+    scans[-1][3][stations[0]] = scans[-1][3].get(stations[0], 0) + 1
+    changed = read_schedule(SKD(make_skd(tmp_path / 'r41001.skd', 'r41000', stations, sources, scans)))
+    assert changed.fingerprint != skd.fingerprint
+
+
+def test_stored_fingerprint(skd_path):
+    sched, dbase = read_schedule(SKD(skd_path)), app.get_dbase()
+    assert schedule_changed(models.Session('r49999'), sched) is None
+    assert dbase.get(models.ScheduleFingerprint, session='r49999') is None
+
+    for cls, code in ((models.Correlator, 'WASH'), (models.OperationsCenter, 'NASA'), (models.AnalysisCenter, 'NASA')):
+        dbase.get(cls, code=code) or dbase.add(cls(code, code))
+    session = models.Session('r41000')
+    session.name, session.start, session.duration = 'R1', datetime(2023, 1, 1), 86400
+    dbase.add(session)
+    dbase.commit()
+    assert schedule_changed(session, sched) is True
+    updated = dbase.get(models.ScheduleFingerprint, session='r41000').updated
+    assert schedule_changed(session, sched) is False
+    assert dbase.get_schedule_fingerprint('R41000') == sched.fingerprint.hex()
+    assert dbase.get(models.ScheduleFingerprint, session='r41000').updated == updated
+
+
+# Read schedule file without cache
+def read_file(cls, path):
+    with cls(path) as sched:
+        sched.read()
+    return sched
+
+
+# Counts and scans that the dict model of the schedule also has
+def legacy_state(sched, sources=True):
+    return sched.scheduled_obs, dict(sched.baselines), list(sched.scans), \
+        {code: (sta['scheduled_obs'], list(sta['scans'])) for code, sta in sched.stations['codes'].items()}, \
+        {name: src['scheduled_obs'] for name, src in sched.sources.items()} if sources else None
+
+
+@pytest.fixture
+def network_path(tmp_path):
+    return make_skd(tmp_path / 'r41000.skd', 'r41000', *make_scans(9, 12, 120, max_stations=5))
+
+
+def test_arrays_match_dict_model(network_path):
+    old, new = read_file(legacy_schedule(SKD), network_path), read_file(SKD, network_path)
+    assert legacy_state(new) == legacy_state(old)
+    assert new.scans == old.scans and new.observations == old.observations and new.obs_list == old.obs_list
+    assert {code: sta['first_source'] for code, sta in new.stations['codes'].items()} == \
+        {code: sta['first_source'] for code, sta in old.stations['codes'].items()}
+
+
+def test_remove_stations_match_loops(network_path):
+    old, new = read_file(legacy_schedule(SKD), network_path), read_file(SKD, network_path)
+    removed = ['STA00000', 'STA00004', 'STA00007']
+    assert new.remove_stations(removed) == old.remove_stations(removed)
+    assert legacy_state(new, sources=False) == legacy_state(old, sources=False)
+    # Source counts of the loops are not updated when stations are removed. Count them with remaining scans
+    expected = {name: 0 for name in new.sources}
+    for scan in new.scans.values():
+        expected[scan['source']] += len(scan['station_codes']) * (len(scan['station_codes']) - 1) // 2
+    assert {name: src['scheduled_obs'] for name, src in new.sources.items()} == expected
+
+
+def test_fingerprint_matches_observations(tmp_path):
+    stations, sources, scans = make_scans(9, 12, 120)
+    skd = read_file(SKD, make_skd(tmp_path / 'r41000.skd', 'r41000', stations, sources, scans))
+    other = read_file(SKD, make_skd(tmp_path / 'r41001.skd', 'r41000', stations, sources, scans))
+    assert skd == other and loop_same_schedule(skd, other)
+    scans[-1][3][stations[-1]] = scans[-1][3].get(stations[-1], 0) + 1
+    changed = read_file(SKD, make_skd(tmp_path / 'r41002.skd', 'r41000', stations, sources, scans))
+    assert skd != changed and not loop_same_schedule(skd, changed)
+
+
+def test_vex_used_blocks(tmp_path):
+    path = make_vex(tmp_path / 'vt3001.vex', nbr_stations=4, nbr_sources=10, nbr_scans=40)
+
+    class OriginalVEX(VEX):
+        read_blocks = loop_vex_blocks
+
+    old, new = read_file(OriginalVEX, path), read_file(VEX, path)
+    assert len(new.scans) == 40 and len(new.stations['codes']) == 4
+    assert [new.session_code, new.correlator, new.start, new.end] == \
+        [old.session_code, old.correlator, old.start, old.end]
+    assert new == old and legacy_state(new) == legacy_state(old)
+
+
+def test_schedule_cache(tmp_path, monkeypatch):
+    path = make_skd(tmp_path / 'r41000.skd', 'r41000', *make_scans(9, 12, 120))
+    session = SimpleNamespace(file_path=lambda code: tmp_path / f'r41000.{code}', removed=['aa'])
+
+    def read(use_cache, memory):
+        monkeypatch.setattr(app, 'schedule_cache', use_cache, raising=False)
+        if not memory:
+            aps.schedule._parsed.clear()
+        return get_schedule(session)
+
+    parsed = read(False, False)
+    read(True, False)  # Store schedule in cache
+    disk, memory = read(True, False), read(True, True)
+    for sched in (disk, memory):
+        assert sched == parsed and legacy_state(sched) == legacy_state(parsed)
+        assert sched.missed == parsed.missed == ['STA00000']
+    assert memory is not read(True, True)
+    # Modified file is parsed again
+    path.write_text(path.read_text().replace('$EXPER R41000', '$EXPER R41001'))
+    assert read(True, True).session_code == 'r41001'
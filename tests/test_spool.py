@@ -0,0 +1,380 @@
+import os
+import shutil
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from aps.utils import app
+from aps.utils.files import open_text
+from aps.aps import spool as spool_module
+from aps.aps.spool import Spool, Section, SectionReader, StatsTable, ParameterTable, read_spool, decode_section, \
+    to_radians, EOB_FIELDS
+from aps.aps.standalone import STANDALONE
+from benchmarks import legacy
+from benchmarks.synthetic import make_spool, make_global_section
+
+
+@pytest.fixture
+def spool_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'spool_cache', False, raising=False)
+    return make_spool(tmp_path / 'SPLFXX', nbr_runs=20, nbr_stations=4, nbr_sources=6)
+
+
+# Runs decoded line by line from the whole file
+def read_all_runs(path):
+    return legacy.loop_spool(path).runs
+
+
+def section_state(section):
+    return dict(section.__getstate__(), parameters=list(section.parameters))
+
+
+def test_runs_are_decoded_when_accessed(spool_path):
+    spool = read_spool(spool_path)
+    assert len(spool.runs) == 20 and spool.runs._runs.count(None) == 19
+    assert spool.runs[5] is spool.runs[5] and spool.runs._runs.count(None) == 18
+    runs = list(spool.runs)
+    assert [section_state(run) for run in runs] == [section_state(run) for run in read_all_runs(spool_path)]
+    assert spool.runs.db_names == [run.DB_NAME for run in runs]
+
+
+def test_reader_is_released(spool_path, monkeypatch):
+    readers = []
+
+    class Reader(spool_module.SectionReader):
+        def __init__(self, data, encoding='UTF-8'):
+            super().__init__(data, encoding)
+            readers.append(self)
+
+    monkeypatch.setattr(spool_module, 'SectionReader', Reader)
+    runs = list(read_spool(spool_path).runs)
+    assert len(readers) == len(runs) and all(reader.file.closed for reader in readers)
+    assert all(run.spl is None for run in runs)
+    assert all(run.spl is None for run in read_all_runs(spool_path))
+
+
+# Bytes of first run of spool
+def first_run(path):
+    data = path.read_bytes()
+    start = data.index(b'1Run')
+    return data[start:data.index(b'\n1Run', start) + 1]
+
+
+def test_universal_newlines(spool_path):
+    first = first_run(spool_path)
+    assert section_state(decode_section(first.replace(b'\n', b'\r\n'), None)) == section_state(decode_section(first, None))
+
+
+# Process pool running tasks in this process and recording its number of workers
+class Pool:
+    workers = []
+
+    def __init__(self, max_workers):
+        self.workers.append(max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def map(self, fnc, *iterables):
+        return map(fnc, *iterables)
+
+
+@pytest.mark.parametrize('cpus, workers', [(1, []), (2, [2]), (8, [4])])
+def test_parallel_workers_limited_by_cpus(spool_path, monkeypatch, cpus, workers):
+    monkeypatch.setattr(app, 'spool_parallel_runs', 1, raising=False)
+    monkeypatch.setattr(app, 'spool_workers', 4, raising=False)
+    monkeypatch.setattr(spool_module, 'available_cpus', lambda: cpus)
+    monkeypatch.setattr(spool_module, 'ProcessPoolExecutor', Pool)
+    monkeypatch.setattr(Pool, 'workers', [])
+    runs = list(read_spool(spool_path).runs)
+    assert Pool.workers == workers
+    assert [section_state(run) for run in runs] == [section_state(run) for run in read_all_runs(spool_path)]
+
+
+baseline_table = """ Baseline Statistics
+ STA00000-STA00001  123/ 4567  12.3
+ STA00000-STA00002 1234/12345  10.1
+ STA00000-STA00003 1 23/  456   9.8
+ STA00001-STA00002     No Data
+ STA00001-STA00003   45/  678   7.0
+ Mean   1234
+"""
+station_table = """ Station Statistics
+     STA00000        12/  345   1.2
+     STA00001      1 2 /  678   2.1
+     STA00002     12345/12345   3.3
+
+"""
+source_table = """ Source Statistics
+     0000+000 A      5 /    77
+SRC_STAT:  0001+001   12/30   x
+     0002+002 B     8/9
+     0000+000 C     10 /   80
+     Total
+"""
+
+
+# Section reading statistics table from text. Reader is kept to test the line ending the table
+def read_stats(text, decode):
+    section = Section.__new__(Section)
+    section.spl = SectionReader(text.encode())
+    section.stats = {'baselines': StatsTable(), 'stations': StatsTable(), 'sources': StatsTable()}
+    decode(section)
+    return section
+
+
+def test_statistics_tables():
+    section = read_stats(baseline_table, Section.decode_baseline_stats)
+    assert dict(section.stats['baselines']) == {
+        'STA00000|STA00001': {'used': 123, 'recov': 4567}, 'STA00000|STA00002': {'used': 1234, 'recov': 12345},
+        'STA00000|STA00003': {'used': 0, 'recov': 456}, 'STA00001|STA00002': {'used': 0, 'recov': 0},
+        'STA00001|STA00003': {'used': 45, 'recov': 678}}
+    assert section.spl.line == ' Mean   1234'
+    section = read_stats(station_table, Section.decode_station_stats)
+    assert dict(section.stats['stations']) == {'STA00000': {'used': 12, 'recov': 345}, 'STA00001': {'used': 0, 'recov': 678},
+                                               'STA00002': {'used': 12345, 'recov': 12345}}
+    section = read_stats(source_table, Section.decode_source_stats)
+    assert list(section.stats['sources']) == ['0000+000', '0001+001', '0002+002']
+    assert section.stats['sources']['0000+000'] == {'used': 10, 'recov': 80}
+    assert section.stats['sources']['0001+001'] == {'used': 12, 'recov': 30}
+    assert section.spl.line == '     Total'
+
+
+# Block of rows is read in one search. Line after block is read
+def test_read_block():
+    rows = '     STA00000        12/  345   1.2\r\n     STA00001        13/  346   1.3\r\n'
+    reader = SectionReader(f' Station Statistics\r\n{rows} Next\n'.encode())
+    reader.has_next()
+    assert reader.read_block(spool_module.station_block) == rows.replace('\r', '')
+    assert reader.line == ' Next' and reader.line_nbr == 4
+    assert reader.read_block(spool_module.station_block) == '' and reader.line == ''
+    reader = SectionReader(rows.rstrip().encode())
+    assert reader.read_block(spool_module.station_block) == rows.replace('\r', '').rstrip()
+    assert not reader.has_next()
+
+
+# EOP correlations printed before nutation estimates do not end the reading of EOP values
+def test_eop_fields_after_correlations(spool_path):
+    lines = first_run(spool_path).splitlines(keepends=True)
+    start = next(index for index, line in enumerate(lines) if line.startswith(b' EOP Correlations:'))
+    nutation = [index for index, line in enumerate(lines) if b'Nutation D' in line]
+    data = b''.join(lines[:nutation[0]] + lines[start:] + lines[nutation[0]:start])
+    run = decode_section(data, EOB_FIELDS)
+    assert run.XNUT and run.YNUT and run.CORRELATION == decode_section(data, None).CORRELATION
+    assert run.make_eob_record({}) == decode_section(data, None).make_eob_record({})
+
+
+# Line ending a statistics table is not skipped when the next table follows without an empty line
+@pytest.mark.parametrize('fields', [None, {'stations'}, {'sources', 'stations'}])
+@pytest.mark.parametrize('end', [b'', b'     Total\n'])
+def test_table_after_source_table(spool_path, fields, end):
+    data = first_run(spool_path)
+    run = decode_section(data, None)
+    start = data.index(b' Station Statistics')
+    data = data[:start].rstrip(b'\n') + b'\n' + end + data[start:]
+    new = decode_section(data, fields)
+    assert len(new.stats['stations']) == 4 and new.stats['stations'] == run.stats['stations']
+    if not fields or 'sources' in fields:
+        assert new.stats['sources'] == run.stats['sources']
+
+
+def test_stored_spool_index_refreshed_once(tmp_path, monkeypatch):
+    monkeypatch.setenv('STORED_SPOOL', str(tmp_path))
+    monkeypatch.setattr(spool_module, 'indexed_roots', set())
+    (folder := tmp_path / '2024').mkdir()
+    (folder / '20240101-r41000.SFF').write_text('1Run')
+    calls = []
+    load = spool_module.loaders.load_stored_spool
+    monkeypatch.setattr(spool_module.loaders, 'load_stored_spool', lambda *args: calls.append(args) or load(*args))
+    assert spool_module.get_stored_spool('20240101-r41000') == folder / '20240101-r41000.SFF'
+    assert spool_module.get_stored_spool('20240102-r41001') is None
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize('compression', ['', 'gz', 'zst'])
+def test_store_spool_data(tmp_path, monkeypatch, compression):
+    monkeypatch.setenv('SPOOL_DIR', str(tmp_path))
+    (tmp_path / 'SPLFXX').write_text('1Run 00001/1\n Data base\nPROGRAM VERSIONS:\n SOLVE\n')
+    (folder := tmp_path / 'r41000').mkdir()
+    session = SimpleNamespace(file_path=lambda code: folder / f'r41000.{code}')
+    process, errors = SimpleNamespace(initials='XX', add_error=lambda text: errors.append(text)), []
+    (folder / 'r41000.spl.gz').write_text('old')
+    assert STANDALONE.store_spool_data(process, session, compression)
+    path = folder / f'r41000.spl{"." if compression else ""}{compression}'
+    assert [file.name for file in folder.iterdir()] == [path.name] and not errors
+    with open_text(path) as file:
+        assert file.read() == '1Run 00001/1\n Data base\n'
+    # Stored file is kept when new one cannot be written
+    (tmp_path / 'SPLFXX').unlink()
+    (tmp_path / 'SPLFXX').mkdir()
+    assert not STANDALONE.store_spool_data(process, session, 'gz' if compression else 'zst')
+    assert [file.name for file in folder.iterdir()] == [path.name] and len(errors) == 1
+
+
+def test_spool_cache(spool_path, monkeypatch):
+    (spool_path.parent / 'nuSolve_unused_observations_XX').write_text(
+        ''.join(f'u {i:5d} 12:00:00 0 0  A A  \n' for i in range(20)))
+
+    def read(use_cache):
+        monkeypatch.setattr(app, 'spool_cache', use_cache, raising=False)
+        spool = read_spool(spool_path, read_unused=True)
+        return section_state(spool.runs[3]), spool.unused
+
+    old = read(False)
+    assert old[1] and read(True) == old  # Spool is stored in cache
+    assert read(True) == old
+
+
+def test_classifier(spool_path):
+    lines = spool_path.read_text().splitlines()
+
+    def decode(get_data):
+        section = Section.__new__(Section)
+        section.parameters, section.POST2005 = ParameterTable(), True
+        for line in lines:
+            get_data(section, line)
+        return section
+
+    new = decode(Section.get_data)
+    assert len(new.parameters) > 0 and section_state(new) == section_state(decode(legacy.loop_get_data))
+
+
+def test_statistics_match_regex_loops(spool_path):
+    text = spool_path.read_text()
+    for key, table, loop, decode in [
+            ('baselines', baseline_table, legacy.loop_baseline_stats, Section.decode_baseline_stats),
+            ('stations', station_table, lambda section: legacy.loop_stats(section, legacy.station_data),
+             Section.decode_station_stats),
+            ('sources', source_table, lambda section: legacy.loop_stats(section, legacy.source_data),
+             Section.decode_source_stats)]:
+        for data in (table, text[text.index(f' {key[:-1].capitalize()} Statistics'):]):
+            old = loop(read_stats(data, lambda section: None))
+            new = read_stats(data, decode).stats[key]
+            assert len(new) > 0 and dict(new) == old and list(new) == list(old)
+
+
+def test_stored_spool_matches_glob(tmp_path, monkeypatch):
+    monkeypatch.setenv('STORED_SPOOL', str(tmp_path))
+    monkeypatch.setattr(spool_module, 'indexed_roots', set())
+    for index in range(6):
+        (folder := tmp_path / str(2020 + index % 2) / f'r4{index:04d}').mkdir(parents=True)
+        for version in range(3):
+            (folder / f'{20200101 + index:08d}-r4{index:04d}v{version}.SFF').write_text('1Run')
+            (folder / f'{20200101 + index:08d}-r4{index:04d}v{version}.log').write_text('1Run')
+    names = [f'{20200101 + index:08d}-r4{index:04d}v{version}' for index in range(6) for version in range(3)]
+    assert [spool_module.get_stored_spool(name) for name in names + ['20200101-r49999v0']] == \
+        [legacy.glob_stored_spool(name) for name in names] + [None]
+    # Newest copy in another folder is found when the index is refreshed by a new process
+    path = tmp_path / '2021' / 'r40001' / f'{names[0]}.SFF'
+    path.write_text('new')
+    os.utime(path, (path.stat().st_mtime + 10,) * 2)
+    spool_module.indexed_roots.clear()
+    assert spool_module.get_stored_spool(names[0]) == legacy.glob_stored_spool(names[0]) == path
+
+
+def test_eob_fields(spool_path):
+    stations = {f'STA{i:05d}': f'{i:02d}' for i in range(4)}
+
+    def eob_records(fields):
+        return [run.make_eob_record(stations, 'r4000', want_xy) for run in read_spool(spool_path, fields=fields).runs
+                for want_xy in (True, False)]
+
+    assert eob_records(EOB_FIELDS) == eob_records(None)
+
+
+# Compact sections have same parameters as sections keeping regex matches
+def test_parameter_table(spool_path):
+    legacy_cls, data = legacy.legacy_section(Section), spool_path.read_bytes()
+    runs = read_spool(spool_path).runs
+    for (start, end), run in zip(runs.ranges, runs):
+        reader = SectionReader(data[start:end])
+        reader.has_next()
+        old, table = legacy_cls(reader), ParameterTable()
+        for param in old.parameters:
+            table.add(param)
+        assert len(table) > 0 and table == run.parameters and old.run_id == run.run_id
+
+
+def test_process_pool(spool_path, monkeypatch):
+    monkeypatch.setattr(app, 'spool_parallel_runs', 1, raising=False)
+    monkeypatch.setattr(app, 'spool_workers', 2, raising=False)
+    monkeypatch.setattr(spool_module, 'available_cpus', lambda: 2)
+    runs = list(read_spool(spool_path).runs)
+    assert [section_state(run) for run in runs] == [section_state(run) for run in read_all_runs(spool_path)]
+
+
+def test_global_section(tmp_path):
+    path = make_global_section(tmp_path / 'SPLFGL', nbr_stations=20, nbr_sources=30)
+    stations, sources = legacy.loop_global_section(path.read_text().splitlines())
+    spool = Spool(path)
+    positions = np.hstack((spool.stations.positions()[0], spool.stations.velocities()[0]))
+    assert np.array_equal(positions, [[sta[comp][0] for comp in ('X', 'Y', 'Z', 'VX', 'VY', 'VZ')]
+                                      for sta in stations.values()])
+    assert np.array_equal(spool.sources.coordinates()[0],
+                          [[to_radians(' '.join(src['RT. ASC.'][0]), True), to_radians(' '.join(src['DEC.'][0]))]
+                           for src in sources.values()])
+
+
+@pytest.mark.parametrize('ext', ['.gz', '.zst'])
+@pytest.mark.parametrize('use_cache', [False, True])
+def test_compressed_spool(spool_path, monkeypatch, ext, use_cache):
+    with open_text(spool_path) as f_in, open_text(path := spool_path.with_name(spool_path.name + ext), 'w') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    monkeypatch.setattr(app, 'spool_cache', use_cache)
+    list(read_spool(path).runs)  # Spool is stored in cache when used
+    runs = list(read_spool(path).runs)
+    assert [section_state(run) for run in runs] == [section_state(run) for run in read_all_runs(spool_path)]
+
+
+# Spool file overwritten by solve after it was read. Runs are decoded from new file and cached spool is removed.
+@pytest.mark.parametrize('parallel', [False, True])
+def test_spool_file_changed(spool_path, tmp_path, monkeypatch, parallel):
+    monkeypatch.setattr(app, 'spool_cache', True, raising=False)
+    monkeypatch.setattr(app, 'spool_parallel_runs', 1 if parallel else 0, raising=False)
+    monkeypatch.setattr(app, 'spool_workers', 2, raising=False)
+    monkeypatch.setattr(spool_module, 'available_cpus', lambda: 2)
+    monkeypatch.setattr(spool_module, 'ProcessPoolExecutor', Pool)
+    spool = read_spool(spool_path)
+    assert spool_module.spool_cache_path(spool_path).exists()
+    new_path = make_spool(tmp_path / 'SPLFYY', nbr_runs=12, nbr_stations=5, nbr_sources=8, seed=1)
+    os.replace(new_path, spool_path)
+    os.utime(spool_path, ns=(1, 1))
+    runs = list(spool.runs)
+    assert [section_state(run) for run in runs] == [section_state(run) for run in read_all_runs(spool_path)]
+    assert len(spool.runs) == 12 and spool.runs.db_names == [run.DB_NAME for run in runs]
+    assert not spool_module.spool_cache_path(spool_path).exists()
+    assert section_state(read_spool(spool_path).runs[5]) == section_state(runs[5])
+
+
+# Reading of EOP values stops at the line after the nutation records of the forms found in the run
+@pytest.mark.parametrize('both_forms', [False, True])
+def test_eop_read_stops_after_nutation(spool_path, monkeypatch, both_forms):
+    readers = []
+
+    class Reader(spool_module.SectionReader):
+        def __init__(self, data, encoding='UTF-8'):
+            super().__init__(data, encoding)
+            readers.append(self)
+
+    lines = first_run(spool_path).splitlines(keepends=True)
+    nutation = [index for index, line in enumerate(lines) if b'Nutation D' in line]
+    if both_forms:  # DPSI/DEPS records before Dx/Dy records
+        old = [lines[index].replace(b'Nutation Dx   wrt   apriori model', b'Nutation DPSI'.ljust(33))
+               .replace(b'Nutation Dy   wrt   apriori model', b'Nutation DEPS'.ljust(33)) for index in nutation]
+        lines[nutation[0]:nutation[0]] = old
+        nutation.extend(index + len(old) for index in nutation[-len(old):])
+    data = b''.join(lines)
+    monkeypatch.setattr(spool_module, 'SectionReader', Reader)
+    run, full = decode_section(data, {'eop'}), decode_section(data, None)
+    assert readers[0].line_nbr == nutation[-1] + 2 < len(lines)
+    assert run.XNUT == full.XNUT and run.YNUT == full.YNUT
+    if both_forms:
+        assert run.PEOP == full.PEOP and run.EEOP == full.EEOP and run.PEOP != [0.0, 0.0, 0.0]
+    else:
+        assert not hasattr(run, 'PEOP') and not hasattr(run, 'EEOP')
+    for key in Section.eop_keys:
+        assert getattr(run, key) == getattr(full, key)
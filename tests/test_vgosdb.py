@@ -0,0 +1,239 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from netCDF4 import Dataset
+
+from aps.utils import app
+from aps.utils.utctime import utc2epoch
+from aps.vgosdb import VGOSdb
+from aps.vgosdb.cache import VariableCache
+from aps.vgosdb.matcher import CorrelationMatcher
+from aps.vgosdb.strings import decode_S1
+from aps.vgosdb.wrapper import WrapperIndex
+from aps.schedule.skd import SKD
+from benchmarks import legacy
+from benchmarks.synthetic import make_vgosdb, copy_wrappers
+
+
+@pytest.fixture
+def vgosdb(tmp_path):
+    return VGOSdb(str(tmp_path))
+
+
+# File with a masked variable and a string variable of stations repeated for each scan
+def write_repeated(path, size, repeat):
+    with Dataset(path, 'w') as nc:
+        nc.createDimension('NumStation', size)
+        nc.createDimension('Dim8', 8)
+        var = nc.createVariable('Cable', 'f8', ('NumStation',))
+        var[:] = np.ma.masked_array(np.arange(size) * 0.5, mask=np.arange(size) % 7 == 0)
+        var.setncattr('REPEAT', repeat)
+        var = nc.createVariable('Station', 'S1', ('NumStation', 'Dim8'))
+        var[:] = np.array([f'STA{i:05d}' for i in range(size)], dtype='S8').view('S1').reshape(size, 8)
+        var.setncattr('REPEAT', repeat)
+    return path
+
+
+def test_repeat_values(vgosdb, tmp_path):
+    path = write_repeated(tmp_path / 'Repeat.nc', 20, 50)
+    with Dataset(path, 'r') as nc:
+        cable = nc.variables['Cable'][:]
+    data = vgosdb.get_variable(path, 'Cable')
+    old = np.ma.MaskedArray([cable] * 50)
+    assert data.shape == old.shape and (data == old).all() and (data.mask == old.mask).all()
+    names = vgosdb.get_variable(path, 'Station', is_str=True)
+    assert names.shape == (50, 20) and names[49, 3] == 'STA00003' and (names == names[0]).all()
+    with Dataset(path, 'r') as nc:
+        rows = vgosdb.read_variable(nc, 'Cable', rows=slice(10, 15))
+    assert rows.shape == (5, 20) and (rows == old[10:15]).all()
+
+
+# Repeated rows are read-only views of the row stored in file. Memory does not depend on REPEAT
+def test_repeat_is_broadcast_view(vgosdb, tmp_path):
+    path = write_repeated(tmp_path / 'Repeat.nc', 1000, 10 ** 9)
+    data = vgosdb.get_variable(path, 'Cable')
+    assert data.shape == (10 ** 9, 1000)
+    for array in (np.ma.getdata(data), np.ma.getmask(data)):
+        assert array.strides[0] == 0 and not array.flags.writeable and array.base is not None
+    assert VariableCache.nbytes(data) == 1000 * 8 + 1000
+    assert data[123456789, 7] is np.ma.masked and data[987654321, 8] == 4.0
+
+
+# Small synthetic vgosDB with its sked file
+@pytest.fixture(scope='module')
+def folder(tmp_path_factory):
+    return make_vgosdb(tmp_path_factory.mktemp('vgosdb'), nbr_stations=6, nbr_sources=10, nbr_scans=100)
+
+
+@pytest.fixture
+def schedule(folder):
+    with SKD(Path(folder.parent, 'r41000.skd')) as sched:
+        sched.read()
+    return sched
+
+
+# Statistics compiled by original loop
+def loop_statistics(folder):
+    vgosdb = VGOSdb(str(folder))
+    if vgosdb.init_statistics():
+        legacy.loop_statistics(vgosdb)
+    return vgosdb.stats, vgosdb.used, vgosdb.recoverable
+
+
+def test_utctime(folder):
+    path = Path(folder, 'Observables', 'TimeUTC.nc')
+    old, new = legacy.loop_utctime(path), VGOSdb.get_utctime(path)
+    assert len(new) == len(old) > 0 and [utc2epoch(t) for t in old] == list(new)
+
+
+def test_decode_strings(folder):
+    for name in ('Baseline', 'Source'):
+        with Dataset(Path(folder, 'Observables', f'{name}.nc'), 'r') as nc:
+            data = nc.variables[name][:]
+        assert decode_S1(data).tolist() == legacy.loop_S1(data, data.ndim - 1)
+
+
+def test_statistics(folder):
+    vgosdb = VGOSdb(str(folder))
+    vgosdb.statistics()
+    assert (vgosdb.stats, vgosdb.used, vgosdb.recoverable) == loop_statistics(folder)
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_prefetch_statistics(folder, monkeypatch, workers):
+    monkeypatch.setattr(app, 'vgosdb_prefetch_workers', workers, raising=False)
+    vgosdb = VGOSdb(str(folder))
+    vgosdb.statistics()
+    assert (vgosdb.stats, vgosdb.used, vgosdb.recoverable) == loop_statistics(folder)
+
+
+def test_uncorrelated_observations(folder, schedule):
+    vgosdb = VGOSdb(str(folder))
+    vgosdb.get_all_obs()
+    not_corr = vgosdb.get_uncorrelated_observations(schedule)
+    assert not_corr and not_corr == legacy.loop_uncorrelated(vgosdb, schedule)
+
+
+@pytest.mark.parametrize('chunk', [0, 100, 7])
+def test_observations_read_in_chunks(folder, schedule, monkeypatch, chunk):
+    monkeypatch.setattr(app, 'max_obs_chunk', chunk, raising=False)
+    vgosdb = VGOSdb(str(folder))
+    vgosdb.statistics()
+    assert (vgosdb.stats, vgosdb.used, vgosdb.recoverable) == loop_statistics(folder)
+    assert vgosdb.get_uncorrelated_observations(schedule) == legacy.loop_uncorrelated(VGOSdb(str(folder)), schedule)
+
+
+def test_wrapper_index(folder, tmp_path):
+    wrp_folder = copy_wrappers(folder, tmp_path, 20)
+    oldest, v001, last, first = legacy.sorted_wrappers(wrp_folder)
+    for _ in range(2):  # Index read from files and from cache
+        index = WrapperIndex(str(wrp_folder))
+        index.read()
+        assert [str(index.oldest), str(index.v001)] == [str(oldest), str(v001)]
+        assert {agency: [str(wrp) for wrp in wrps] for agency, wrps in last.items()} == \
+            {agency: [str(index.last[agency])] if agency in index.last else [] for agency in last}
+        assert {agency: str(wrp) for agency, wrp in first.items()} == \
+            {agency: str(index.first.get(agency)) for agency in first}
+
+
+# Selections of the table of all observations: rejected observations, none and a selection of a selection
+def selections(table):
+    rejected = table[table.flag > 0]
+    return {'rejected': rejected, 'none': table[np.zeros(len(table), dtype=bool)], 'sub': rejected[::3]}
+
+
+@pytest.mark.parametrize('name', ['rejected', 'none', 'sub'])
+def test_observation_selections(folder, name):
+    vgosdb = VGOSdb(str(folder))
+    all_obs = legacy.loop_all_obs(vgosdb)
+    table = selections(vgosdb.get_all_obs())[name]
+    indexes = table.index.tolist()
+    assert len(table) == len(indexes) and (len(table) > 0) == (name != 'none')
+    assert all(all_obs[index][7] > 0 for index in indexes)
+    assert [tuple(obs[1:]) for obs in table] == [all_obs[index] for index in indexes]
+    assert [table[position] for position in range(len(table))] == list(table)
+    for key in ('source', 'station', 'baseline'):
+        groups = {frozenset(group) if key == 'baseline' else group: table.index[rows].tolist()
+                  for group, rows in table.group_by(key).items()}
+        assert groups == legacy.loop_group_by(all_obs, indexes, key)
+        counts = table.count_by(key, {'corr': np.ones(len(table), dtype=bool), 'recov': table.flag < 2})
+        assert {frozenset(group) if key == 'baseline' else group: values
+                for group, values in counts.items() if values['corr']} == \
+            {group: {'corr': len(rows), 'recov': sum(all_obs[index][7] < 2 for index in rows)}
+             for group, rows in groups.items()}
+
+
+def test_rejected_obs(folder):
+    vgosdb = VGOSdb(str(folder))
+    all_obs = legacy.loop_all_obs(vgosdb)
+    table = vgosdb.get_all_obs()
+    unusable = table[table.flag > 0].index.tolist()
+    excluded = {index: (index * 1.5, index / 4) for index in unusable[::-2]}
+    assert 1 in all_obs and len(table) in all_obs and unusable
+    for args in ([1, len(table)] + unusable, {1: (2.0, 3.0), len(table): (4.0, 5.0)} | excluded), ([], {}):
+        vgosdb.get_rejected_obs(*args)
+        assert (vgosdb.unusable, vgosdb.excluded) == legacy.loop_rejected_obs(all_obs, *args)
+
+
+# Reader returning a new array of 100 floats (800 bytes) for each call
+def counting_reader(calls):
+    def read(path):
+        calls.append(path)
+        return np.ma.MaskedArray(np.arange(100.0))
+    return read
+
+
+def test_cache_eviction(tmp_path):
+    cache, calls = VariableCache(max_mb=2400 / 1024 / 1024), []
+    for name in ('A', 'B', 'C', 'A'):
+        cache.get(str(tmp_path), 'Observables/Var.nc', name, False, counting_reader(calls))
+    assert (len(cache), cache.size, cache.hits, cache.misses, len(calls)) == (3, 2400, 1, 3, 3)
+    cache.get(str(tmp_path), 'Observables/Var.nc', 'D', False, counting_reader(calls))  # B is least recently used
+    assert [key[1] for key in cache.data] == ['C', 'A', 'D'] and cache.size == 2400
+    assert not cache.has('Observables/Var.nc', 'B', False) and cache.has('Observables/Var.nc', 'A', False)
+    cache.max_bytes = 700  # Too large to be stored
+    data = cache.get(str(tmp_path), 'Observables/Var.nc', 'E', False, counting_reader(calls))
+    assert not data.flags.writeable and not cache.has('Observables/Var.nc', 'E', False)
+
+
+def test_cache_hits_and_invalidate(tmp_path):
+    cache, calls = VariableCache(), []
+    first = cache.get(str(tmp_path), 'Observables/Var.nc', 'A', True, counting_reader(calls))
+    assert cache.get(str(tmp_path), 'Observables/Var.nc', 'A', True, counting_reader(calls)) is first
+    assert cache.get(str(tmp_path), 'Observables/Var.nc', 'A', False, counting_reader(calls)) is not first
+    assert (cache.hits, cache.misses, len(calls)) == (1, 2, 2) and not first.flags.writeable
+    cache.invalidate()
+    assert len(cache) == 0 and cache.size == 0
+    assert cache.get(str(tmp_path), 'Observables/Var.nc', 'A', True, counting_reader(calls)) is not first
+    assert (cache.hits, cache.misses, len(calls)) == (1, 3, 3)
+
+
+def test_cache_disabled(tmp_path):
+    cache, calls = VariableCache(max_mb=0), []
+    arrays = [cache.get(str(tmp_path), 'Observables/Var.nc', 'A', False, counting_reader(calls)) for _ in range(2)]
+    assert len(calls) == 2 and len(cache) == 0 and cache.size == 0
+    assert all(not data.flags.writeable for data in arrays) and calls[0] == str(tmp_path / 'Observables/Var.nc')
+
+
+# Chunk of correlated observations (fr, to, src, seconds) with shared station and source lists
+def matcher_chunk(observations, stations=('A', 'B', 'C'), sources=('S1', 'S2')):
+    fr, to, src, seconds = (np.array(values) for values in zip(*observations))
+    return SimpleNamespace(stations=list(stations), sources=list(sources), fr=fr, to=to, src=src,
+                           epoch=np.datetime64('2023-01-01T00:00:00', 'us') + seconds * np.timedelta64(1, 's'))
+
+
+# Matches do not depend on chunks. Direct orientation of baseline is used when it has correlated observations.
+@pytest.mark.parametrize('sizes', [[6], [1, 5], [2, 2, 2], [1] * 6])
+def test_matcher_chunks(sizes):
+    observations = [(0, 1, 0, 100), (0, 1, 0, 400), (1, 0, 0, 200), (0, 2, 1, 300), (1, 2, 0, 500), (1, 2, 1, 600)]
+    chunks = np.split(np.arange(len(observations)), np.cumsum(sizes)[:-1])
+    matcher = CorrelationMatcher([matcher_chunk([observations[i] for i in chunk]) for chunk in chunks])
+    windows = [(0, 1, 0, 90, 110), (0, 1, 0, 190, 210), (1, 0, 0, 190, 210), (2, 0, 1, 295, 305), (2, 1, 0, 495, 505),
+               (1, 2, 1, 590, 599), (0, 2, 0, 300, 300), (1, 2, 1, 600, 600)]
+    fr, to, src, first, last = (np.array(values) for values in zip(*windows))
+    t0 = np.datetime64('2023-01-01T00:00:00', 'us')
+    found = matcher.is_correlated(['A', 'B', 'C'], ['S1', 'S2'], fr, to, src, t0 + first * np.timedelta64(1, 's'),
+                                  t0 + last * np.timedelta64(1, 's'))
+    assert found.tolist() == [True, False, True, True, True, False, False, True]